@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import User, ApiKey, Strategy, Candle, StrategyExecution, Trade
+from .models import User, ApiKey, Strategy, CandleStream, CandleCoverage, StrategyExecution, Trade
 
 admin.site.register(User)
 admin.site.register(ApiKey)
 admin.site.register(Strategy)
 admin.site.register(StrategyExecution)
 admin.site.register(Trade)
-admin.site.register(Candle)
\ No newline at end of file
+admin.site.register(CandleStream)
+admin.site.register(CandleCoverage)
\ No newline at end of file
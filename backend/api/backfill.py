@@ -0,0 +1,79 @@
+import threading
+import time
+import ccxt
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .exchanges import clone_exchange, exchange_catalog
+
+DEFAULT_PAGE_SIZE = 1000
+
+class RateLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_request = 0.0
+
+    def wait(self, interval):
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_request)
+            self._next_request = scheduled + interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def rate_limiter(exchange_name):
+    with _rate_limiters_lock:
+        return _rate_limiters.setdefault(exchange_name, RateLimiter())
+
+def fetch_page(exchange, symbol, timeframe, timeframe_ms, page_start, page_end, page_size):
+    # Returns the rows and the end of the span known to be complete, before page_start when nothing was received
+    limiter = rate_limiter(exchange.name)
+    rows = []
+    since = page_start
+    while since <= page_end:
+        limit = min(int((page_end - since) // timeframe_ms) + 2, page_size)
+        for attempt in range(settings.BACKFILL_RETRIES + 1):
+            limiter.wait((exchange.rateLimit or 0) / 1000)
+            try:
+                response = exchange.fetch_ohlcv(symbol=symbol, timeframe=timeframe, since=since - 1, limit=limit)
+                break
+            except ccxt.NetworkError:
+                if attempt == settings.BACKFILL_RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+        page = [row for row in response if since <= row[0] <= page_end]
+        if not page:
+            break
+        rows.extend(page)
+        since = int(page[-1][0]) + 1
+    # An empty page may be an exchange ignoring since or a listing gap, so only the received candles count
+    return rows, min(int(rows[-1][0]) + timeframe_ms - 1, page_end) if rows else page_start - 1
+
+def fetch_pages(exchange, symbol, timeframe, timeframe_ms, pages, page_size):
+    # Each worker calls its own clone of the pooled instance
+    exchange = clone_exchange(exchange)
+    return [fetch_page(exchange, symbol, timeframe, timeframe_ms, page_start, page_end, page_size) for page_start, page_end in pages]
+
+def fetch_range(exchange, symbol, timeframe, timestamp_start, timestamp_end, timeframe_ms):
+    # Returns the rows and the (start, end) span each page actually received
+    page_size = exchange_catalog.capabilities(exchange.name).get('ohlcv_page_size') or DEFAULT_PAGE_SIZE
+    page_span = page_size * timeframe_ms
+    pages = [(page_start, min(page_start + page_span - 1, timestamp_end)) for page_start in range(timestamp_start, timestamp_end + 1, page_span)]
+    if len(pages) <= 1:
+        results = fetch_pages(exchange, symbol, timeframe, timeframe_ms, pages, page_size)
+    else:
+        workers = min(settings.BACKFILL_MAX_WORKERS, len(pages))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Worker k fetches pages k, k + workers, ...
+            futures = [executor.submit(fetch_pages, exchange, symbol, timeframe, timeframe_ms, pages[k::workers], page_size) for k in range(workers)]
+            shares = [future.result() for future in futures]
+        results = [shares[k % workers][k // workers] for k in range(len(pages))]
+    rows = []
+    # Pages are disjoint and ordered, so concatenating them keeps the series sorted
+    for page_rows, _ in results:
+        rows.extend(page_rows)
+    return rows, [(page_start, fetched_end) for (page_start, _), (_, fetched_end) in zip(pages, results) if fetched_end >= page_start]
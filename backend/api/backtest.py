@@ -0,0 +1,285 @@
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from .conditions import decimal_value
+
+QUANTUM = Decimal('1e-20')
+FLOAT_RESIDUE = 1e-9
+STATE_COLUMNS = ['position_amount', 'position_value', 'avg_entry_price', 'remaining_tradable_value', 'unrealized_total_value', 'realized_total_value']
+TRADE_COLUMNS = ['type', 'side', 'timestamp', 'price', 'amount', 'cost', 'avg_entry_price', 'abs_profit', 'rel_profit', 'abs_cum_profit', 'rel_cum_profit',
+                 'abs_hodling_profit', 'rel_hodling_profit', 'abs_runup', 'rel_runup', 'abs_drawdown', 'rel_drawdown']
+VALUE_COLUMNS = [column for column in TRADE_COLUMNS if column not in ('type', 'side', 'timestamp')]
+
+class DecimalNumbers:
+    # Exact accounting, stored amounts are rounded to QUANTUM
+    number = staticmethod(decimal_value)
+
+    @staticmethod
+    def quantize(value):
+        return Decimal(value).quantize(QUANTUM)
+
+    @staticmethod
+    def column(values, vector):
+        return values
+
+    @staticmethod
+    def decimal(value):
+        return value
+
+class FloatNumbers:
+    # Native float64 accounting, results agree with DecimalNumbers to about 1e-9 relative while the
+    # trade sequence is the same, a comparison landing within rounding of a threshold can differ
+    number = staticmethod(float)
+
+    @staticmethod
+    def quantize(value):
+        # Residues of amounts that cancel out are snapped to zero, as rounding to QUANTUM does for decimals
+        value = float(value)
+        return 0.0 if abs(value) < FLOAT_RESIDUE else value
+
+    @staticmethod
+    def column(values, vector):
+        return vector
+
+    @staticmethod
+    def decimal(value):
+        return Decimal(str(value)) if isinstance(value, float) else value
+
+NUMERIC_BACKENDS = {'decimal': DecimalNumbers, 'float': FloatNumbers}
+
+class TradeLedger:
+    # Trades are appended field by field and turned into a DataFrame once the run is over
+    def __init__(self):
+        self.columns = {column: [] for column in TRADE_COLUMNS}
+        self.abs_cum_profit = 0
+        self.rel_cum_profit = 0
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def append(self, **trade):
+        for column, values in self.columns.items():
+            values.append(trade[column])
+        self.abs_cum_profit = trade['abs_cum_profit']
+        self.rel_cum_profit = trade['rel_cum_profit']
+
+    def frame(self):
+        return pd.DataFrame(self.columns, columns=TRADE_COLUMNS)
+
+class OrderBook:
+    # Open limit orders in placement order, with each side's prices kept sorted for fill checks
+    def __init__(self):
+        self.orders = {}
+        self.levels = {'buy': [], 'sell': []}
+        self.sequence = 0
+        self.total = 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def committed(self):
+        # Running sum of the positive costs in placement order, refolded only after an order leaves the book
+        if self.total is None:
+            self.total = 0
+            for order in self.orders.values():
+                if order['cost'] > 0:
+                    self.total += order['cost']
+        return self.total
+
+    def add(self, order):
+        self.sequence += 1
+        self.orders[self.sequence] = order
+        insort(self.levels[order['side']], (order['price'], self.sequence))
+        if order['cost'] > 0 and self.total is not None:
+            self.total += order['cost']
+
+    def fills(self, low, high):
+        # Buys at or above the low and sells at or below the high, in placement order
+        buys, sells = self.levels['buy'], self.levels['sell']
+        sequences = [sequence for _, sequence in buys[bisect_left(buys, (low,)):]] + [sequence for _, sequence in sells[:bisect_right(sells, (high, self.sequence + 1))]]
+        return [(sequence, self.orders[sequence]) for sequence in sorted(sequences)]
+
+    def remove(self, sequences):
+        for sequence in sequences:
+            order = self.orders.pop(sequence)
+            levels = self.levels[order['side']]
+            del levels[bisect_left(levels, (order['price'], sequence))]
+        self.total = None
+
+    def clear(self):
+        self.orders = {}
+        self.levels = {'buy': [], 'sell': []}
+        self.total = 0
+
+class Backtest:
+    def __init__(self, columns, rules, initial_tradable_value, leverage, maker_fee, taker_fee, spot, should_stop=None, numeric='decimal'):
+        # columns maps candle and indicator names to arrays, account state is kept in scalars and recorded once per candle
+        self.numbers = NUMERIC_BACKENDS[numeric]
+        vectors = {column: np.asarray(values, dtype=np.float64) for column, values in columns.items()}
+        # Timestamps keep their int64 values whatever the backend
+        self.columns = {column: values if column == 'timestamp' else self.numbers.column(values, vectors[column]) for column, values in columns.items()}
+        self.length = len(self.columns['timestamp'])
+        self.state = set(STATE_COLUMNS)
+        for column in STATE_COLUMNS:
+            self.columns[column] = np.empty(self.length, dtype=object)
+        self.rules = rules.bind(vectors, self.read, self.length, self.numbers.number)
+        self.initial_tradable_value = self.numbers.number(initial_tradable_value)
+        self.margin = self.numbers.number(1 / leverage)
+        self.maker_fee = self.numbers.number(maker_fee)
+        self.taker_fee = self.numbers.number(taker_fee)
+        self.spot = spot
+        self.should_stop = should_stop
+        self.trades = TradeLedger()
+        self.open_orders = OrderBook()
+        self.i = 0
+        self.position_amount = 0
+        self.position_value = 0
+        self.avg_entry_price = 0
+        self.remaining_tradable_value = self.initial_tradable_value
+        self.realized_total_value = 0
+        self.unrealized_total_value = 0
+        self.max_ever_total_unrealized_value = 0
+        self.min_ever_total_unrealized_value = float('inf')
+        self.abs_max_runup = 0
+        self.rel_max_runup = 0
+        self.abs_max_drawdown = 0
+        self.rel_max_drawdown = 0
+
+    def read(self, column, i):
+        # The current candle reads the live account state
+        if i == self.i and column in self.state:
+            return getattr(self, column)
+        return self.columns[column][i]
+
+    def marked_value(self, price):
+        ratio = 2 - price / self.avg_entry_price if self.position_amount < 0 else price / self.avg_entry_price
+        return self.numbers.quantize(abs(self.position_amount) * self.avg_entry_price * (ratio - 1 + self.margin))
+
+    def update_totals(self):
+        committed = self.open_orders.committed()
+        self.realized_total_value = abs(self.position_amount) * self.avg_entry_price + self.remaining_tradable_value + committed
+        self.unrealized_total_value = self.position_value + self.remaining_tradable_value + committed
+
+    def track_extremes(self):
+        self.max_ever_total_unrealized_value = max(self.max_ever_total_unrealized_value, self.unrealized_total_value)
+        self.min_ever_total_unrealized_value = min(self.min_ever_total_unrealized_value, self.unrealized_total_value)
+        self.abs_max_runup = max(self.abs_max_runup, self.unrealized_total_value - self.min_ever_total_unrealized_value)
+        self.rel_max_runup = self.abs_max_runup / self.min_ever_total_unrealized_value * 100 if self.min_ever_total_unrealized_value != 0 else 0
+        self.abs_max_drawdown = min(self.abs_max_drawdown, self.unrealized_total_value - self.max_ever_total_unrealized_value)
+        self.rel_max_drawdown = self.abs_max_drawdown / self.max_ever_total_unrealized_value * 100 if self.max_ever_total_unrealized_value != 0 else 0
+
+    def trade_calculation(self, type, order):
+        i = self.i
+        fee = self.taker_fee if type == "market" else self.maker_fee
+        last_avg_entry_price = self.avg_entry_price
+        if self.position_amount * order['amount'] >= 0:
+            order_cost = abs(order['amount']) * order['price'] * (self.margin + fee)
+            if type == "market" and order_cost > self.remaining_tradable_value:
+                order['amount'] = self.remaining_tradable_value / order['price'] / (self.margin + fee) * order['amount'] / abs(order['amount'])
+                order_cost = self.remaining_tradable_value
+            self.avg_entry_price = (self.avg_entry_price * abs(self.position_amount) + order['price'] * abs(order['amount'])) / (abs(self.position_amount) + abs(order['amount']))
+        else:
+            order['amount'] = min(abs(order['amount']), abs(self.position_amount)) * order['amount'] / abs(order['amount'])
+            if type == 'limit':
+                self.position_value = self.marked_value(order['price'])
+            order_cost = self.position_value * order['amount'] / self.position_amount + abs(order['amount']) * self.numbers.number(2 * self.avg_entry_price - order['price'] if self.position_amount < 0 else order['price']) * fee
+            if self.numbers.quantize(self.position_amount + order['amount']) == 0:
+                self.avg_entry_price = 0
+        self.position_amount = self.numbers.quantize(self.position_amount + order['amount'])
+        self.position_value = self.marked_value(order['price']) if self.avg_entry_price > 0 else 0
+        if not (type == "limit" and order_cost > 0): self.remaining_tradable_value = self.numbers.quantize(self.remaining_tradable_value - order_cost)
+        self.update_totals()
+        abs_profit = -1 * abs(order['amount']) * last_avg_entry_price - order_cost if self.position_amount * order['amount'] <= 0 else -1 * abs(order['amount']) * self.numbers.number(order['price']) * fee
+        rel_profit = abs_profit / self.initial_tradable_value * 100
+        hodling = self.numbers.number(self.columns['close'][i] / self.columns['open'][1] - 1)
+        self.max_ever_total_unrealized_value = max(self.max_ever_total_unrealized_value, self.unrealized_total_value)
+        self.min_ever_total_unrealized_value = min(self.min_ever_total_unrealized_value, self.unrealized_total_value)
+        abs_runup = self.unrealized_total_value - self.min_ever_total_unrealized_value
+        abs_drawdown = self.unrealized_total_value - self.max_ever_total_unrealized_value
+        self.trades.append(
+            type=type, side=order['side'], timestamp=order['timestamp'], price=order['price'], amount=abs(order['amount']), cost=order_cost, avg_entry_price=self.avg_entry_price,
+            abs_profit=abs_profit, rel_profit=rel_profit, abs_cum_profit=self.trades.abs_cum_profit + abs_profit, rel_cum_profit=self.trades.rel_cum_profit + rel_profit,
+            abs_hodling_profit=self.initial_tradable_value * hodling, rel_hodling_profit=hodling * 100,
+            abs_runup=abs_runup, rel_runup=abs_runup / self.min_ever_total_unrealized_value * 100 if self.min_ever_total_unrealized_value != 0 else 0,
+            abs_drawdown=abs_drawdown, rel_drawdown=abs_drawdown / self.max_ever_total_unrealized_value * 100 if self.max_ever_total_unrealized_value != 0 else 0,
+        )
+        self.abs_max_runup = max(self.abs_max_runup, abs_runup)
+        self.rel_max_runup = self.abs_max_runup / self.min_ever_total_unrealized_value * 100 if self.min_ever_total_unrealized_value != 0 else 0
+        self.abs_max_drawdown = min(self.abs_max_drawdown, abs_drawdown)
+        self.rel_max_drawdown = self.abs_max_drawdown / self.max_ever_total_unrealized_value * 100 if self.max_ever_total_unrealized_value != 0 else 0
+
+    def make_order(self, type, side=None, amount=None, price=None):
+        i = self.i
+        if type == "cancel_all_open_orders":
+            self.remaining_tradable_value += self.numbers.quantize(self.open_orders.committed())
+            self.open_orders.clear()
+            self.update_totals()
+            return
+
+        if self.spot and side == 'sell' and self.position_amount == 0: return
+        if amount == 0: return
+        if type == 'market':
+            price = self.columns['close'][i]
+        elif price <= 0: return
+        amount = abs(amount)
+        order = {'timestamp': self.columns['timestamp'][i], 'side': side, 'amount': amount if side == 'buy' else -1 * amount, 'price': self.numbers.number(price)}
+        if self.position_amount * order['amount'] >= 0 and self.remaining_tradable_value == 0: return
+        if type == 'market':
+            self.trade_calculation(type, order)
+            return
+        if self.position_amount * order['amount'] >= 0:
+            order['cost'] = abs(order['amount']) * order['price'] * (self.margin + self.maker_fee)
+        else:
+            order['cost'] = self.position_value * order['amount'] / self.position_amount + abs(order['amount']) * self.numbers.number(2 * self.avg_entry_price - order['price'] if self.position_amount < 0 else order['price']) * self.maker_fee
+        if order['cost'] > 0:
+            if order['cost'] > self.remaining_tradable_value:
+                order['amount'] = self.remaining_tradable_value / order['price'] / (self.margin + self.maker_fee) * order['amount'] / abs(order['amount'])
+                order['cost'] = self.remaining_tradable_value
+            self.remaining_tradable_value = self.numbers.quantize(self.remaining_tradable_value - order['cost'])
+        self.open_orders.add(order)
+        self.update_totals()
+
+    def run(self):
+        # Returns False when stopped before the last candle
+        timestamp, low, high, close = self.columns['timestamp'], self.columns['low'], self.columns['high'], self.columns['close']
+        state = [self.columns[column] for column in STATE_COLUMNS]
+        for i in range(self.length):
+            if self.should_stop is not None and self.should_stop():
+                return False
+            self.i = i
+            if self.avg_entry_price > 0:
+                self.position_value = self.marked_value(close[i])
+            else:
+                self.position_value = 0
+            if self.position_value < 0:
+                self.position_value = 0
+                self.position_amount = 0
+                self.avg_entry_price = 0
+            self.update_totals()
+            self.track_extremes()
+            if i > 0:
+                filled = self.open_orders.fills(low[i], high[i])
+                for _, order in filled:
+                    self.trade_calculation('limit', {'timestamp': timestamp[i], 'side': order['side'], 'amount': order['amount'], 'price': self.numbers.number(order['price'])})
+                if filled:
+                    self.open_orders.remove([sequence for sequence, _ in filled])
+                for test, place in self.rules:
+                    try:
+                        if test(i):
+                            place(i, self.make_order)
+                    except Exception as e:
+                        raise ValueError("Error evaluating condition or order")
+            for values, column in zip(state, STATE_COLUMNS):
+                values[i] = getattr(self, column)
+        return True
+
+    def trades_frame(self):
+        trades = self.trades.frame()
+        trades[VALUE_COLUMNS] = trades[VALUE_COLUMNS].map(self.numbers.decimal)
+        return trades
+
+    def extremes(self):
+        return tuple(self.numbers.decimal(value) for value in (self.abs_max_runup, self.rel_max_runup, self.abs_max_drawdown, self.rel_max_drawdown))
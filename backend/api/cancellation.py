@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Events of the executions running in this process, set directly when a stop request lands on the same worker
+events = {}
+events_lock = threading.Lock()
+
+def cancel_key(execution_id):
+    return f"execution-cancel:{execution_id}"
+
+def cancel_execution(execution_id):
+    # Executions on other workers see the key on their next poll
+    cache.set(cancel_key(execution_id), 1, timeout=settings.EXECUTION_CANCEL_TIMEOUT)
+    with events_lock:
+        event = events.get(str(execution_id))
+    if event is not None:
+        event.set()
+
+class Cancellation:
+    # Called once per candle, the shared cache is only read when the poll interval has passed
+    def __init__(self, execution_id):
+        self.execution_id = str(execution_id)
+        self.event = threading.Event()
+        self.next_poll = 0
+
+    def __enter__(self):
+        with events_lock:
+            events[self.execution_id] = self.event
+        return self
+
+    def __exit__(self, *exc_info):
+        with events_lock:
+            events.pop(self.execution_id, None)
+
+    def __call__(self):
+        if self.event.is_set():
+            return True
+        now = time.monotonic()
+        if now >= self.next_poll:
+            self.next_poll = now + settings.EXECUTION_CANCEL_POLL_INTERVAL
+            if cache.get(cancel_key(self.execution_id)):
+                self.event.set()
+        return self.event.is_set()
+
+    def wait(self, seconds):
+        # Sleeps in poll interval steps, returns True as soon as the execution is cancelled
+        deadline = time.monotonic() + seconds
+        while not self():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.event.wait(min(remaining, max(self.next_poll - time.monotonic(), 0)))
+        return True
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class CandleArrayCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # (exchange, symbol, timeframe) -> (token, [(start, end, values)]), least recently used first
+        # values holds one contiguous row per OHLCV column
+        self._streams = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, timestamp_start, timestamp_end, token):
+        with self._lock:
+            entry = self._streams.get(key)
+            if entry is not None and entry[0] != token:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                for segment_start, segment_end, values in entry[1]:
+                    if segment_start <= timestamp_start and timestamp_end <= segment_end:
+                        self._streams.move_to_end(key)
+                        self.hits += 1
+                        timestamps = values[0]
+                        return values[:, np.searchsorted(timestamps, timestamp_start, 'left'):np.searchsorted(timestamps, timestamp_end, 'right')]
+            self.misses += 1
+            return None
+
+    def put(self, key, timestamp_start, timestamp_end, values, token):
+        if values.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._streams.get(key)
+            segments = entry[1] if entry is not None and entry[0] == token else []
+            self._drop(key)
+            # Overlapping or adjacent segments are merged into a single sorted array
+            merged, kept = [], []
+            for segment in segments:
+                (merged if segment[0] <= timestamp_end + 1 and segment[1] >= timestamp_start - 1 else kept).append(segment)
+            if merged:
+                combined = np.concatenate([values] + [segment for _, _, segment in merged], axis=1)
+                _, unique = np.unique(combined[0], return_index=True)
+                values = combined[:, unique]
+                timestamp_start = min([timestamp_start] + [segment_start for segment_start, _, _ in merged])
+                timestamp_end = max([timestamp_end] + [segment_end for _, segment_end, _ in merged])
+            # Slices handed out by get are views, so cached arrays are made read only
+            values.setflags(write=False)
+            segments = sorted(kept + [(timestamp_start, timestamp_end, values)], key=lambda segment: segment[0])
+            self._streams[key] = (token, segments)
+            self._bytes += sum(segment.nbytes for _, _, segment in segments)
+            while self._bytes > self.max_bytes and len(self._streams) > 1:
+                self._drop(next(iter(self._streams)))
+                self.evictions += 1
+
+    def invalidate(self, key, timestamp_start=None, timestamp_end=None):
+        with self._lock:
+            entry = self._streams.get(key)
+            if entry is None:
+                return
+            self._drop(key)
+            if timestamp_start is None:
+                return
+            segments = [segment for segment in entry[1] if segment[0] > timestamp_end or segment[1] < timestamp_start]
+            if segments:
+                self._streams[key] = (entry[0], segments)
+                self._bytes += sum(segment.nbytes for _, _, segment in segments)
+
+    def clear(self):
+        with self._lock:
+            self._streams.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'streams': len(self._streams),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _drop(self, key):
+        entry = self._streams.pop(key, None)
+        if entry is not None:
+            self._bytes -= sum(segment.nbytes for _, _, segment in entry[1])
@@ -0,0 +1,328 @@
+import io
+import itertools
+import math
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .backfill import fetch_range
+from .candlecache import CandleArrayCache
+from .indicatorcache import invalidate_indicator_tail
+from .models import Candle, CandleCoverage, CandleStream
+from .singleflight import single_flight
+from .timeframes import closed_until, timeframe_to_ms
+
+CANDLE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+candle_cache = CandleArrayCache(max_bytes=settings.CANDLE_CACHE_MAX_BYTES)
+
+_stream_ids = {}
+_stream_ids_lock = threading.Lock()
+
+def stream_id(exchange_name, symbol, timeframe):
+    key = (exchange_name, symbol, timeframe)
+    with _stream_ids_lock:
+        if key in _stream_ids:
+            return _stream_ids[key]
+    stream, _ = CandleStream.objects.get_or_create(exchange=exchange_name, symbol=symbol, timeframe=timeframe)
+    with _stream_ids_lock:
+        _stream_ids[key] = stream.id
+    return stream.id
+
+def missing_ranges(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+    intervals = CandleCoverage.objects.filter(
+        exchange=exchange_name,
+        symbol=symbol,
+        timeframe=timeframe,
+        timestamp_start__lte=timestamp_end,
+        timestamp_end__gte=timestamp_start
+    ).order_by('timestamp_start').values_list('timestamp_start', 'timestamp_end')
+    missing = []
+    cursor = timestamp_start
+    for interval_start, interval_end in intervals:
+        if interval_start > cursor:
+            missing.append((cursor, interval_start - 1))
+        cursor = max(cursor, interval_end + 1)
+    if cursor <= timestamp_end:
+        missing.append((cursor, timestamp_end))
+    return missing
+
+def record_coverage(exchange_name, symbol, timeframe, timestamp_start, timestamp_end, source_timeframe=None):
+    with transaction.atomic():
+        # Intervals are only merged with others built from the same source
+        touching = list(CandleCoverage.objects.select_for_update().filter(
+            exchange=exchange_name,
+            symbol=symbol,
+            timeframe=timeframe,
+            source_timeframe=source_timeframe,
+            timestamp_start__lte=timestamp_end + 1,
+            timestamp_end__gte=timestamp_start - 1
+        ))
+        CandleCoverage.objects.filter(id__in=[interval.id for interval in touching]).delete()
+        CandleCoverage.objects.create(
+            exchange=exchange_name,
+            symbol=symbol,
+            timeframe=timeframe,
+            timestamp_start=min([timestamp_start] + [interval.timestamp_start for interval in touching]),
+            timestamp_end=max([timestamp_end] + [interval.timestamp_end for interval in touching]),
+            source_timeframe=source_timeframe
+        )
+
+def contiguous_ranges(timestamps, timeframe_ms):
+    # Coverage spans of sorted candle timestamps, a gap longer than one and a half candles starts a new span
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if not len(timestamps):
+        return []
+    breaks = np.flatnonzero(np.diff(timestamps) > timeframe_ms * 3 // 2) + 1
+    starts = timestamps[np.r_[0, breaks]]
+    ends = timestamps[np.r_[breaks - 1, len(timestamps) - 1]]
+    return [(int(start), int(end) + timeframe_ms - 1) for start, end in zip(starts, ends)]
+
+def coverage_token_key(exchange_name, symbol, timeframe):
+    return f"coverage-token:{exchange_name}:{symbol}:{timeframe}"
+
+def coverage_token(exchange_name, symbol, timeframe):
+    # Coverage only ever grows for closed candles, so the token changes only when stored candles are dropped
+    return cache.get_or_set(coverage_token_key(exchange_name, symbol, timeframe), lambda: uuid.uuid4().hex, timeout=None)
+
+def clear_coverage(exchange_name, symbol, timeframe, before):
+    cache.delete(coverage_token_key(exchange_name, symbol, timeframe))
+    intervals = CandleCoverage.objects.filter(exchange=exchange_name, symbol=symbol, timeframe=timeframe)
+    intervals.filter(timestamp_end__lt=before).delete()
+    intervals.filter(timestamp_start__lt=before).update(timestamp_start=before)
+
+def bulk_create_candles(exchange_name, symbol, timeframe, rows):
+    stream = stream_id(exchange_name, symbol, timeframe)
+    Candle.objects.bulk_create([
+        Candle(
+            stream_id=stream,
+            timestamp=int(row[0]),
+            open=float(row[1]),
+            high=float(row[2]),
+            low=float(row[3]),
+            close=float(row[4]),
+            volume=float(row[5] or 0)
+        ) for row in rows if None not in row[1:5]
+    ], ignore_conflicts=True)
+
+def copy_candles(exchange_name, symbol, timeframe, rows):
+    stream = stream_id(exchange_name, symbol, timeframe)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join([str(int(row[0]))] + ['\\N' if x is None or (isinstance(x, float) and math.isnan(x)) else repr(float(x)) for x in row[1:6]]) + '\n')
+    buffer.seek(0)
+    table = connection.ops.quote_name(Candle._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("CREATE TEMP TABLE candle_staging (timestamp bigint, open double precision, high double precision, low double precision, close double precision, volume double precision) ON COMMIT DROP")
+        cursor.copy_expert("COPY candle_staging (timestamp, open, high, low, close, volume) FROM STDIN", buffer)
+        cursor.execute(
+            f"INSERT INTO {table} (stream_id, timestamp, open, high, low, close, volume) "
+            "SELECT %s, timestamp, open, high, low, close, COALESCE(volume, 0) FROM candle_staging "
+            "WHERE open IS NOT NULL AND high IS NOT NULL AND low IS NOT NULL AND close IS NOT NULL "
+            "ON CONFLICT DO NOTHING",
+            [stream]
+        )
+        # ON COMMIT DROP only fires with the outermost transaction, a second copy in it would find the table
+        cursor.execute("DROP TABLE candle_staging")
+
+def store_candles(exchange_name, symbol, timeframe, rows):
+    if not rows:
+        return
+    candle_cache.invalidate((exchange_name, symbol, timeframe), min(row[0] for row in rows), max(row[0] for row in rows))
+    invalidate_indicator_tail(exchange_name, symbol, timeframe, min(row[0] for row in rows))
+    if connection.vendor == 'postgresql':
+        copy_candles(exchange_name, symbol, timeframe, rows)
+    else:
+        bulk_create_candles(exchange_name, symbol, timeframe, rows)
+
+RESAMPLE_TIMEFRAMES = ['1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '8h', '12h', '1d']
+
+def resample_sources(timeframe):
+    if timeframe not in RESAMPLE_TIMEFRAMES:
+        return []
+    timeframe_ms = timeframe_to_ms(timeframe)
+    # Coarsest first, so the fewest rows are read for each bucket
+    return [source for source in reversed(RESAMPLE_TIMEFRAMES) if timeframe_to_ms(source) < timeframe_ms and timeframe_ms % timeframe_to_ms(source) == 0]
+
+def resample_blocks(exchange_name, symbol, timeframe, timestamp_start, timestamp_end, now):
+    timeframe_ms = timeframe_to_ms(timeframe)
+    first_bucket = -(-timestamp_start // timeframe_ms) * timeframe_ms
+    last_bucket = min(timestamp_end, now - timeframe_ms) // timeframe_ms * timeframe_ms
+    pending = [(first_bucket, last_bucket + timeframe_ms - 1)] if first_bucket <= last_bucket else []
+    blocks = []
+    for source in resample_sources(timeframe):
+        if not pending:
+            break
+        remaining = []
+        for span_start, span_end in pending:
+            cursor = span_start
+            intervals = CandleCoverage.objects.filter(
+                exchange=exchange_name,
+                symbol=symbol,
+                timeframe=source,
+                timestamp_start__lte=span_end,
+                timestamp_end__gte=span_start
+            ).order_by('timestamp_start').values_list('timestamp_start', 'timestamp_end')
+            for interval_start, interval_end in intervals:
+                # Only whole buckets whose every source candle is covered can be built
+                block_start = max(-(-interval_start // timeframe_ms) * timeframe_ms, cursor)
+                block_end = (min(interval_end, span_end) + 1) // timeframe_ms * timeframe_ms - 1
+                if block_end < block_start:
+                    continue
+                if block_start > cursor:
+                    remaining.append((cursor, block_start - 1))
+                blocks.append((source, block_start, block_end))
+                cursor = block_end + 1
+            if cursor <= span_end:
+                remaining.append((cursor, span_end))
+        pending = remaining
+    return sorted(blocks, key=lambda block: block[1])
+
+def resample_ohlcv(values, timeframe_ms):
+    if not values.shape[1]:
+        return values
+    buckets = values[0] // timeframe_ms * timeframe_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], values.shape[1]] - 1
+    return np.vstack([
+        buckets[starts],
+        values[1, starts],
+        np.maximum.reduceat(values[2], starts),
+        np.minimum.reduceat(values[3], starts),
+        values[4, ends],
+        np.add.reduceat(values[5], starts)
+    ])
+
+def resample_candles(exchange_name, symbol, source_timeframe, timeframe_ms, timestamp_start, timestamp_end):
+    values = candle_values(exchange_name, symbol, source_timeframe, timestamp_start, timestamp_end)
+    return [[int(row[0]), *row[1:]] for row in resample_ohlcv(values, timeframe_ms).T.tolist()]
+
+def fetch_candles(exchange, symbol, timeframe, timeframe_ms, range_start, range_end, now):
+    rows, fetched = fetch_range(exchange, symbol, timeframe, range_start, range_end, timeframe_ms)
+    # Only closed candles are persisted, the forming one is returned as is
+    closed_end = closed_until(timeframe, now)
+    store_candles(exchange.name, symbol, timeframe, [row for row in rows if row[0] <= closed_end])
+    for fetched_start, fetched_end in fetched:
+        covered_end = min(fetched_end, range_end, closed_end)
+        if covered_end >= fetched_start:
+            record_coverage(exchange.name, symbol, timeframe, fetched_start, covered_end)
+    return [row for row in rows if row[0] > closed_end]
+
+def sync_range(exchange, symbol, timeframe, timeframe_ms, range_start, range_end, now):
+    transient_rows = []
+    cursor = range_start
+    for source, block_start, block_end in resample_blocks(exchange.name, symbol, timeframe, range_start, range_end, now):
+        # Only whole buckets are built, the edge before the first one comes from the exchange
+        if block_start > cursor:
+            transient_rows.extend(fetch_candles(exchange, symbol, timeframe, timeframe_ms, cursor, block_start - 1, now))
+        rows = resample_candles(exchange.name, symbol, source, timeframe_ms, block_start, block_end)
+        if settings.RESAMPLE_MATERIALIZE:
+            store_candles(exchange.name, symbol, timeframe, rows)
+            record_coverage(exchange.name, symbol, timeframe, block_start, min(block_end, range_end), source_timeframe=source)
+        else:
+            transient_rows.extend(rows)
+        cursor = block_end + 1
+    if cursor <= range_end:
+        transient_rows.extend(fetch_candles(exchange, symbol, timeframe, timeframe_ms, cursor, range_end, now))
+    return transient_rows
+
+def sync_missing(exchange, symbol, timeframe, timeframe_ms, timestamp_start, timestamp_end, now):
+    transient_rows = []
+    for range_start, range_end in missing_ranges(exchange.name, symbol, timeframe, timestamp_start, timestamp_end):
+        transient_rows.extend(sync_range(exchange, symbol, timeframe, timeframe_ms, range_start, range_end, now))
+    return transient_rows
+
+def sync_candles(exchange, symbol, timeframe, timestamp_start, timestamp_end):
+    timeframe_ms = timeframe_to_ms(timeframe)
+    now = int(time.time() * 1000)
+    transient_rows = []
+    for range_start, range_end in missing_ranges(exchange.name, symbol, timeframe, timestamp_start, timestamp_end):
+        # The leader re-checks coverage, a previous flight may have stored the range in the meantime
+        transient_rows.extend(single_flight(
+            f"{exchange.name}:{symbol}:{timeframe}:{range_start}:{range_end}",
+            lambda range_start=range_start, range_end=range_end: sync_missing(exchange, symbol, timeframe, timeframe_ms, range_start, range_end, now)
+        ))
+    return transient_rows
+
+class CandleSeries:
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, values):
+        self.timestamp = values[0].astype(np.int64)
+        self.open, self.high, self.low, self.close, self.volume = values[1:]
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(np.array(rows, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS)).T)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def values(self):
+        return np.vstack([self.timestamp, self.open, self.high, self.low, self.close, self.volume]).astype(np.float64)
+
+    def since(self, timestamp):
+        return CandleSeries(self.values()[:, np.searchsorted(self.timestamp, timestamp):])
+
+    def merge_rows(self, rows):
+        # Stored candles win over transient rows with the same timestamp
+        values = np.concatenate([self.values(), CandleSeries.from_rows(rows).values()], axis=1)
+        _, unique = np.unique(values[0], return_index=True)
+        return CandleSeries(values[:, unique])
+
+    def records(self):
+        return [dict(zip(CANDLE_COLUMNS, row)) for row in zip(self.timestamp.tolist(), self.open.tolist(), self.high.tolist(), self.low.tolist(), self.close.tolist(), self.volume.tolist())]
+
+    def to_frame(self):
+        return pd.DataFrame({column: getattr(self, column) for column in CANDLE_COLUMNS})
+
+def fetch_candle_values(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+    chunk_size = settings.CANDLE_READ_CHUNK_SIZE
+    rows = Candle.objects.filter(
+        stream_id=stream_id(exchange_name, symbol, timeframe),
+        timestamp__gte=timestamp_start,
+        timestamp__lte=timestamp_end
+    ).order_by('timestamp').values_list(*CANDLE_COLUMNS).iterator(chunk_size=chunk_size)
+    values = np.empty((len(CANDLE_COLUMNS), max(int((timestamp_end - timestamp_start) // timeframe_to_ms(timeframe)) + 1, 0)), dtype=np.float64)
+    size = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return values[:, :size]
+        if size + len(chunk) > values.shape[1]:
+            # Month and year lengths are approximated, so the estimate can fall a few rows short
+            values = np.concatenate([values[:, :size], np.empty((len(CANDLE_COLUMNS), size + 2 * len(chunk)), dtype=np.float64)], axis=1)
+        values[:, size:size + len(chunk)] = np.array(chunk, dtype=np.float64).T
+        size += len(chunk)
+
+def candle_values(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+    key = (exchange_name, symbol, timeframe)
+    token = coverage_token(exchange_name, symbol, timeframe)
+    values = candle_cache.get(key, timestamp_start, timestamp_end, token)
+    if values is not None:
+        return values
+    # Only the closed and fully covered part of the range can never change. Coverage is checked before the read,
+    # so a gap filled by a concurrent writer in between cannot make an incomplete read look complete
+    closed_end = min(timestamp_end, closed_until(timeframe, int(time.time() * 1000)))
+    covered = closed_end >= timestamp_start and not missing_ranges(exchange_name, symbol, timeframe, timestamp_start, closed_end)
+    values = fetch_candle_values(exchange_name, symbol, timeframe, timestamp_start, timestamp_end)
+    if covered:
+        candle_cache.put(key, timestamp_start, closed_end, values[:, values[0] <= closed_end], token)
+    return values
+
+def read_candle_series(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+    return CandleSeries(candle_values(exchange_name, symbol, timeframe, timestamp_start, timestamp_end))
+
+def read_candles(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+    return read_candle_series(exchange_name, symbol, timeframe, timestamp_start, timestamp_end).to_frame()
+
+def delete_candles(exchange_name, symbol, timeframe, before):
+    candle_cache.invalidate((exchange_name, symbol, timeframe))
+    Candle.objects.filter(stream_id=stream_id(exchange_name, symbol, timeframe), timestamp__lt=before).delete()
+    clear_coverage(exchange_name, symbol, timeframe, before)
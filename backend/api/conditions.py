@@ -0,0 +1,201 @@
+import ast
+import operator
+import re
+from decimal import Decimal
+from functools import reduce
+
+import numpy as np
+
+COMPARISONS = {'>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le, '==': operator.eq, '!=': operator.ne}
+# Previous and current candle comparisons of each cross
+CROSSES = {'crossabove': (operator.lt, operator.gt), 'crossunder': (operator.gt, operator.lt)}
+ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv, ast.Mod: operator.mod, ast.Pow: operator.pow}
+FUNCTIONS = {'min': (min, np.minimum), 'max': (max, np.maximum), 'abs': (abs, np.abs)}
+LOGICAL_OPERATORS = {'and': 'and', 'or': 'or', 'xor': '^'}
+ORDER_TYPES = ['market', 'limit', 'cancel_all_open_orders']
+ORDER_SIDES = ['buy', 'sell']
+
+def decimal_value(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(int(value)) if isinstance(value, (int, np.integer)) else Decimal(value)
+
+def compare(function, left, right):
+    # NaN never equals itself, for both Decimal and float operands
+    return left == left and right == right and function(left, right)
+
+class OrderRules:
+    # Order conditions are parsed and validated once, then bound to the candle arrays of a run.
+    # Operands only reading candle and indicator columns become NumPy vectors over the whole series,
+    # operands reading the account state are evaluated per candle with the number type of the run.
+    def __init__(self, order_conditions, columns, state_columns=()):
+        self.state_columns = set(state_columns)
+        names = sorted(columns, key=len, reverse=True)
+        self.columns = {f"_column{k}_": column for k, column in enumerate(names)}
+        placeholders = {column: placeholder for placeholder, column in self.columns.items()}
+        # Longest names first and no partial matches, so SMA_9 never rewrites part of SMA_99 or CCI_20_100_-100
+        pattern = re.compile(r'(?<![\w.])(' + '|'.join(re.escape(name) for name in names) + r')(?![\w.])') if names else None
+        self.substitute = (lambda source: pattern.sub(lambda match: placeholders[match.group(1)], source)) if pattern else (lambda source: source)
+        self.rules = [(self.parse_conditions(order_condition['conditions']), self.parse_orders(order_condition['orders'])) for order_condition in order_conditions]
+
+    def parse_expression(self, source, error):
+        try:
+            node = ast.parse(self.substitute(str(source)).strip(), mode='eval').body
+        except SyntaxError:
+            raise ValueError(error)
+        if not self.valid_expression(node):
+            raise ValueError(error)
+        return node
+
+    def valid_expression(self, node):
+        if isinstance(node, ast.Constant):
+            return type(node.value) in (int, float)
+        if isinstance(node, ast.Name):
+            return node.id in self.columns
+        if isinstance(node, ast.BinOp):
+            return type(node.op) in ARITHMETIC and self.valid_expression(node.left) and self.valid_expression(node.right)
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, (ast.USub, ast.UAdd)) and self.valid_expression(node.operand)
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                return False
+            if len(node.args) != 1 if node.func.id == 'abs' else len(node.args) < 2:
+                return False
+            return all(self.valid_expression(arg) for arg in node.args)
+        return False
+
+    def parse_conditions(self, conditions):
+        units = []
+        logic = ""
+        for k, condition in enumerate(conditions):
+            if condition['operator'] not in COMPARISONS and condition['operator'] not in CROSSES:
+                raise ValueError("Invalid condition syntax in conditions")
+            left = self.parse_expression(condition['left_operand'], "Invalid condition syntax in conditions")
+            right = self.parse_expression(condition['right_operand'], "Invalid condition syntax in conditions")
+            units.append((left, condition['operator'], right))
+            logic += ("(" if condition['start_parenthesis'] else "") + f"_unit{k}_" + (")" if condition['end_parenthesis'] else "")
+            if k < len(conditions) - 1:
+                logical_operator = condition.get('logical_operator', '')
+                if not logical_operator:
+                    raise ValueError("Logical operator is required between conditions")
+                if logical_operator not in LOGICAL_OPERATORS:
+                    raise ValueError("Invalid condition syntax in conditions")
+                logic += f" {LOGICAL_OPERATORS[logical_operator]} "
+        if logic.count('(') != logic.count(')'):
+            raise ValueError("Unmatched parentheses in conditions")
+        try:
+            tree = ast.parse(logic, mode='eval').body
+        except SyntaxError:
+            raise ValueError("Unmatched parentheses in conditions")
+        return units, tree
+
+    def parse_orders(self, orders):
+        parsed = []
+        for order in orders:
+            if order['type'] not in ORDER_TYPES:
+                raise ValueError("Invalid condition syntax in orders")
+            if order['type'] == 'cancel_all_open_orders':
+                parsed.append((order['type'], None, None, None))
+                continue
+            if order['side'] not in ORDER_SIDES:
+                raise ValueError("Invalid condition syntax in orders")
+            amount = self.parse_expression(order['amount'], "Invalid condition syntax in orders")
+            price = self.parse_expression(order['price'], "Invalid condition syntax in orders") if order['type'] != 'market' else None
+            parsed.append((order['type'], order['side'], amount, price))
+        return parsed
+
+    def is_static(self, node):
+        return all(self.columns[name.id] not in self.state_columns for name in ast.walk(node) if isinstance(name, ast.Name) and name.id in self.columns)
+
+    def vector(self, node, vectors):
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return vectors[self.columns[node.id]]
+        if isinstance(node, ast.BinOp):
+            return ARITHMETIC[type(node.op)](self.vector(node.left, vectors), self.vector(node.right, vectors))
+        if isinstance(node, ast.UnaryOp):
+            value = self.vector(node.operand, vectors)
+            return -value if isinstance(node.op, ast.USub) else value
+        return reduce(FUNCTIONS[node.func.id][1], [self.vector(arg, vectors) for arg in node.args]) if node.func.id != 'abs' else np.abs(self.vector(node.args[0], vectors))
+
+    def scalar(self, node, read, number):
+        # read(column, i) returns the value of a column at candle i, number converts it to the run's number type
+        if isinstance(node, ast.Constant):
+            value = number(str(node.value))
+            return lambda i: value
+        if isinstance(node, ast.Name):
+            column = self.columns[node.id]
+            return lambda i: number(read(column, i))
+        if isinstance(node, ast.BinOp):
+            function, left, right = ARITHMETIC[type(node.op)], self.scalar(node.left, read, number), self.scalar(node.right, read, number)
+            return lambda i: function(left(i), right(i))
+        if isinstance(node, ast.UnaryOp):
+            operand = self.scalar(node.operand, read, number)
+            return (lambda i: -operand(i)) if isinstance(node.op, ast.USub) else operand
+        function, args = FUNCTIONS[node.func.id][0], [self.scalar(arg, read, number) for arg in node.args]
+        return lambda i: function(*[arg(i) for arg in args])
+
+    def bind_unit(self, unit, vectors, read, length, number):
+        # Returns the mask of a unit over the whole series, or None with a per candle test
+        left, operator, right = unit
+        if self.is_static(left) and self.is_static(right):
+            with np.errstate(all='ignore'):
+                left_values = np.broadcast_to(self.vector(left, vectors), (length,))
+                right_values = np.broadcast_to(self.vector(right, vectors), (length,))
+                valid = ~(np.isnan(left_values) | np.isnan(right_values))
+                if operator in CROSSES:
+                    before, after = CROSSES[operator]
+                    mask = np.zeros(length, dtype=bool)
+                    mask[1:] = before(left_values[:-1], right_values[:-1]) & valid[:-1] & after(left_values[1:], right_values[1:]) & valid[1:]
+                else:
+                    mask = COMPARISONS[operator](left_values, right_values) & valid
+            return mask, None
+        left, right = self.scalar(left, read, number), self.scalar(right, read, number)
+        if operator in CROSSES:
+            before, after = CROSSES[operator]
+            return None, lambda i: compare(before, left(i - 1), right(i - 1)) and compare(after, left(i), right(i))
+        function = COMPARISONS[operator]
+        return None, lambda i: compare(function, left(i), right(i))
+
+    def bind_logic(self, node, units):
+        if isinstance(node, ast.Name):
+            return units[int(node.id[5:-1])]
+        if isinstance(node, ast.BoolOp):
+            parts = [self.bind_logic(value, units) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            test = all if isinstance(node.op, ast.And) else any
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitXor):
+            parts = [self.bind_logic(node.left, units), self.bind_logic(node.right, units)]
+            combine = np.logical_xor
+            test = lambda values: sum(bool(value) for value in values) == 1
+        else:
+            raise ValueError("Invalid condition syntax in conditions")
+        if all(mask is not None for mask, _ in parts):
+            return reduce(combine, [mask for mask, _ in parts]), None
+        tests = [test_part if mask is None else mask.__getitem__ for mask, test_part in parts]
+        return None, lambda i: test(part(i) for part in tests)
+
+    def bind_orders(self, orders, read, number):
+        bound = [(type, side, self.scalar(amount, read, number) if amount is not None else None, self.scalar(price, read, number) if price is not None else None) for type, side, amount, price in orders]
+
+        def place(i, make_order):
+            for type, side, amount, price in bound:
+                if type == 'cancel_all_open_orders':
+                    make_order(type)
+                    continue
+                amount_value = amount(i)
+                price_value = price(i) if price is not None else None
+                # Orders sized or priced from an unsettled indicator are skipped
+                if amount_value != amount_value or price_value is not None and price_value != price_value:
+                    continue
+                make_order(type, side, amount_value, price_value)
+        return place
+
+    def bind(self, vectors, read, length, number=decimal_value):
+        # vectors maps candle and indicator columns to float arrays, returns (test(i), place(i, make_order)) per rule
+        rules = []
+        for (units, logic), orders in self.rules:
+            mask, test = self.bind_logic(logic, [self.bind_unit(unit, vectors, read, length, number) for unit in units])
+            rules.append((mask.__getitem__ if mask is not None else test, self.bind_orders(orders, read, number)))
+        return rules
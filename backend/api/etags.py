@@ -0,0 +1,56 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .candles import coverage_token, missing_ranges
+from .timeframes import closed_until
+
+def strategy_token_key(strategy_id):
+    return f"indicator-etag:{strategy_id}"
+
+def remember_strategy(strategy):
+    cache.add(strategy_token_key(strategy.id), (uuid.uuid4().hex, (strategy.exchange, strategy.symbol, strategy.timeframe)), timeout=None)
+
+def bump_strategy_token(strategy_id):
+    cache.delete(strategy_token_key(strategy_id))
+
+def is_closed_range(timestamp_end, timeframe):
+    return timestamp_end <= closed_until(timeframe, int(time.time() * 1000))
+
+def is_complete_range(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+    # Only closed ranges whose every candle is stored can never change, gaps left by a short page or transient candles can
+    return is_closed_range(timestamp_end, timeframe) and not missing_ranges(exchange_name, symbol, timeframe, timestamp_start, timestamp_end)
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha256(':'.join(map(str, parts)).encode()).hexdigest()[:32])
+
+def candles_etag(exchange_name, symbol, timeframe, timestamp_start, timestamp_end, renderer_format):
+    if not is_complete_range(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+        return None
+    return make_etag('candles', coverage_token(exchange_name, symbol, timeframe), timestamp_start, timestamp_end, renderer_format)
+
+def indicator_etag(strategy_id, indicator_id, timestamp_start, timestamp_end, renderer_format):
+    entry = cache.get(strategy_token_key(strategy_id))
+    if entry is None:
+        return None
+    token, (exchange_name, symbol, timeframe) = entry
+    if not is_complete_range(exchange_name, symbol, timeframe, timestamp_start, timestamp_end):
+        return None
+    return make_etag('indicator', token, coverage_token(exchange_name, symbol, timeframe), indicator_id, timestamp_start, timestamp_end, renderer_format)
+
+def etag_matches(request, etag):
+    return etag is not None and etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+def set_cache_headers(response, etag=None):
+    patch_vary_headers(response, ['Accept', 'Cookie'])
+    if etag is not None:
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=settings.CLOSED_RANGE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
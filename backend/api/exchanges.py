@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import ccxt
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ApiKey
+
+def credentials_hash(credentials):
+    return hashlib.sha256(json.dumps(credentials, sort_keys=True).encode()).hexdigest()
+
+class ExchangePool:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._build_locks = {}
+        self._owners = {}
+
+    def get(self, exchange_name, credentials, owner=None):
+        key = (exchange_name, credentials_hash(credentials))
+        if owner is not None:
+            with self._lock:
+                self._owners[(exchange_name, owner)] = key
+        exchange = self._lookup(key)
+        if exchange is not None:
+            return exchange
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            exchange = self._lookup(key)
+            if exchange is None:
+                exchange = self._build(exchange_name, credentials)
+                with self._lock:
+                    self._entries[key] = (exchange, time.monotonic() + self.ttl)
+        return exchange
+
+    def invalidate(self, exchange_name, owner):
+        with self._lock:
+            key = self._owners.pop((exchange_name, owner), None)
+            if key is not None:
+                self._entries.pop(key, None)
+                self._build_locks.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._build_locks.clear()
+            self._owners.clear()
+
+    def _lookup(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for k in expired:
+                del self._entries[k]
+                self._build_locks.pop(k, None)
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def _build(self, exchange_name, credentials):
+        exchange = getattr(ccxt, exchange_name)(credentials)
+        if exchange.has.get('fetchStatus'):
+            status_response = exchange.fetch_status()
+            if status_response.get('status') != 'ok':
+                raise Exception('Exchange service unavailable')
+        hydrate_markets(exchange, exchange_name)
+        exchange.precisionMode = ccxt.TICK_SIZE
+        exchange.roundingMode = ccxt.TRUNCATE
+        exchange.name = exchange_name
+        exchange.pool_credentials = credentials
+        return exchange
+
+# Filled by set_markets and only read afterwards, so clones share them instead of rebuilding them
+MARKET_ATTRIBUTES = ['markets', 'markets_by_id', 'symbols', 'ids', 'currencies', 'currencies_by_id', 'codes', 'baseCurrencies', 'quoteCurrencies']
+
+def clone_exchange(exchange):
+    # Synchronous ccxt instances mutate their nonce, throttle and last response state on every call, so threads
+    # calling at the same time each need their own. Instances not built by the pool belong to their caller.
+    credentials = getattr(exchange, 'pool_credentials', None)
+    if credentials is None:
+        return exchange
+    clone = type(exchange)(credentials)
+    for attribute in MARKET_ATTRIBUTES:
+        setattr(clone, attribute, getattr(exchange, attribute))
+    if exchange.options.get('unavailableContracts'):
+        clone.options['unavailableContracts'] = exchange.options['unavailableContracts']
+    clone.precisionMode = exchange.precisionMode
+    clone.roundingMode = exchange.roundingMode
+    clone.name = exchange.name
+    clone.pool_credentials = credentials
+    return clone
+
+def markets_cache_key(exchange_name):
+    return f"markets:{exchange_name}"
+
+def store_markets(exchange, exchange_name):
+    metadata = {
+        'markets': exchange.markets,
+        'currencies': exchange.currencies,
+        'timeframes': {k: v for k, v in (exchange.timeframes or {}).items() if v},
+        'unavailable_contracts': exchange.options.get('unavailableContracts', {}),
+        'updated_at': time.time(),
+    }
+    cache.set(markets_cache_key(exchange_name), metadata, timeout=settings.MARKETS_CACHE_TIMEOUT)
+    return metadata
+
+def refresh_markets(exchange_name):
+    exchange = getattr(ccxt, exchange_name)()
+    exchange.load_markets(reload=True)
+    return store_markets(exchange, exchange_name)
+
+def market_metadata(exchange_name):
+    if exchange_name not in ccxt.exchanges:
+        raise ValueError(f"Exchange {exchange_name} is not supported")
+    metadata = cache.get(markets_cache_key(exchange_name))
+    if metadata is None:
+        metadata = refresh_markets(exchange_name)
+    # Only exchanges whose markets loaded are refreshed in the background
+    markets_refresher.track(exchange_name)
+    return metadata
+
+def hydrate_markets(exchange, exchange_name):
+    metadata = cache.get(markets_cache_key(exchange_name))
+    if metadata is None:
+        exchange.load_markets()
+        metadata = store_markets(exchange, exchange_name)
+    else:
+        exchange.set_markets(metadata['markets'], metadata['currencies'])
+        if metadata['unavailable_contracts']:
+            exchange.options['unavailableContracts'] = metadata['unavailable_contracts']
+    markets_refresher.track(exchange_name)
+    return metadata
+
+class MarketsRefresher:
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._tracked = set()
+        self._thread = None
+
+    def track(self, exchange_name):
+        with self._lock:
+            self._tracked.add(exchange_name)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def refresh_stale(self):
+        with self._lock:
+            tracked = list(self._tracked)
+        for exchange_name in tracked:
+            metadata = cache.get(markets_cache_key(exchange_name))
+            if metadata and time.time() - metadata['updated_at'] < self.interval:
+                continue
+            # Only one worker downloads each exchange per interval
+            if not cache.add(f"{markets_cache_key(exchange_name)}:lock", 1, timeout=self.interval):
+                continue
+            try:
+                refresh_markets(exchange_name)
+            except Exception:
+                cache.delete(f"{markets_cache_key(exchange_name)}:lock")
+
+    def _run(self):
+        while True:
+            time.sleep(min(self.interval, 60))
+            self.refresh_stale()
+
+UNSUPPORTED_EXCHANGES = {'alpaca','apex','bequant','bitmart','bitso','coinex','coinlist','coinsph','lbank','oceanex','onetrading','paradex','phemex','woofipro'}
+REQUIRED_CAPABILITIES = ['fetchOHLCV','fetchBalance','cancelAllOrders','createOrder','fetchOrder']
+
+def ohlcv_page_size(features):
+    limits = []
+    for value in (features or {}).values():
+        if isinstance(value, dict):
+            fetch_ohlcv = value.get('fetchOHLCV')
+            if isinstance(fetch_ohlcv, dict) and fetch_ohlcv.get('limit'):
+                limits.append(fetch_ohlcv['limit'])
+            else:
+                nested = ohlcv_page_size(value)
+                if nested:
+                    limits.append(nested)
+    return max(limits) if limits else None
+
+def exchange_capabilities(exchange_name):
+    exchange = getattr(ccxt, exchange_name)()
+    has = exchange.has
+    return {
+        'supported': exchange_name not in UNSUPPORTED_EXCHANGES and all(has.get(m) for m in REQUIRED_CAPABILITIES),
+        'ohlcv': bool(has.get('fetchOHLCV')),
+        'balance': bool(has.get('fetchBalance')),
+        'post_only': bool(has.get('createPostOnlyOrder')),
+        'leverage': bool(has.get('setLeverage')),
+        'margin_mode': bool(has.get('setMarginMode')),
+        'ohlcv_page_size': ohlcv_page_size(exchange.features),
+        'rate_limit': exchange.rateLimit,
+    }
+
+class ExchangeCatalog:
+    def __init__(self, path):
+        self.path = path
+        self.cache_key = f"exchange-catalog:{ccxt.__version__}"
+        self._lock = threading.Lock()
+        self._capabilities = None
+        self._supported = None
+
+    def build(self):
+        capabilities = {}
+        for exchange_name in ccxt.exchanges:
+            try:
+                capabilities[exchange_name] = exchange_capabilities(exchange_name)
+            except Exception:
+                continue
+        catalog = {'ccxt_version': ccxt.__version__, 'exchanges': capabilities}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(catalog, f)
+        cache.set(self.cache_key, catalog, timeout=None)
+        self._load(catalog)
+        return catalog
+
+    def capabilities(self, exchange_name):
+        self._ensure_loaded()
+        return self._capabilities.get(exchange_name, {})
+
+    def supported(self):
+        self._ensure_loaded()
+        return self._supported
+
+    def _ensure_loaded(self):
+        if self._capabilities is not None:
+            return
+        with self._lock:
+            if self._capabilities is not None:
+                return
+            catalog = cache.get(self.cache_key)
+            if catalog is None and os.path.exists(self.path):
+                with open(self.path) as f:
+                    catalog = json.load(f)
+                if catalog.get('ccxt_version') != ccxt.__version__:
+                    catalog = None
+                else:
+                    cache.set(self.cache_key, catalog, timeout=None)
+            if catalog is not None:
+                self._load(catalog)
+        if self._capabilities is None:
+            self.build()
+
+    def _load(self, catalog):
+        self._supported = [e for e, c in catalog['exchanges'].items() if c['supported']]
+        self._capabilities = catalog['exchanges']
+
+exchange_catalog = ExchangeCatalog(path=settings.EXCHANGE_CATALOG_PATH)
+
+markets_refresher = MarketsRefresher(interval=settings.MARKETS_REFRESH_INTERVAL)
+
+exchange_pool = ExchangePool(ttl=settings.EXCHANGE_POOL_TTL)
+
+class Exchange:
+    def __new__(cls, exchange_name, user):
+        try:
+            api_key_instance = list(ApiKey.objects.filter(user=user, exchange=exchange_name).values('api_key', 'secret', 'password', 'uid'))
+            return exchange_pool.get(exchange_name, api_key_instance[0] if api_key_instance else {}, owner=user.pk if api_key_instance else None)
+        except Exception:
+            raise Exception('Unable to initialize exchange')
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import time
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .timeframes import closed_until
+
+def indicator_cache_key(exchange_name, symbol, timeframe, short_name, parameters):
+    # Keyed by the TA-Lib arguments, so display only params (e.g. RSI limits) share an entry
+    digest = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:32]
+    return f"indicator:{exchange_name}:{symbol}:{timeframe}:{short_name}:{digest}"
+
+def revision_key(exchange_name, symbol, timeframe):
+    return f"indicator-revision:{exchange_name}:{symbol}:{timeframe}"
+
+def tail_key(exchange_name, symbol, timeframe, revision):
+    return f"indicator-tail:{exchange_name}:{symbol}:{timeframe}:{revision}"
+
+def stream_revision(exchange_name, symbol, timeframe):
+    return cache.get(revision_key(exchange_name, symbol, timeframe)) or 0
+
+def invalidate_indicator_tail(exchange_name, symbol, timeframe, timestamp):
+    # Each candle write is logged once per stream, entries drop their tail from it lazily when read
+    key = revision_key(exchange_name, symbol, timeframe)
+    cache.add(key, 0, timeout=None)
+    revision = cache.incr(key)
+    cache.set(tail_key(exchange_name, symbol, timeframe, revision), timestamp, timeout=settings.INDICATOR_CACHE_TIMEOUT)
+
+def tail_cut(exchange_name, symbol, timeframe, since_revision, revision):
+    # Earliest timestamp written after since_revision, None when part of the log has expired
+    tails = cache.get_many([tail_key(exchange_name, symbol, timeframe, r) for r in range(since_revision + 1, revision + 1)])
+    if len(tails) < revision - since_revision:
+        return None
+    return min(tails.values(), default=float('inf'))
+
+def cached_entry(exchange_name, symbol, timeframe, key, token, revision):
+    entry = cache.get(key)
+    if entry is None or entry[0] != token or not 0 <= revision - entry[1] <= settings.INDICATOR_CACHE_MAX_REVISIONS:
+        return None
+    _, entry_revision, timestamp_start, timestamp_end, values = entry
+    if entry_revision < revision:
+        cut = tail_cut(exchange_name, symbol, timeframe, entry_revision, revision)
+        if cut is None:
+            return None
+        if cut <= timestamp_end:
+            timestamp_end = cut - 1
+            values = values[:, values[0] < cut]
+            if timestamp_end < timestamp_start:
+                cache.delete(key)
+                return None
+        cache.set(key, (token, revision, timestamp_start, timestamp_end, values), timeout=settings.INDICATOR_CACHE_TIMEOUT)
+    return timestamp_start, timestamp_end, values
+
+def indicator_series(exchange_name, symbol, timeframe, timeframe_ms, token, indicators, timestamp_start, timestamp_end, load_candles):
+    # indicators holds (short_name, spec, params), one (timestamps, outputs) pair is returned per indicator
+    closed_end = closed_until(timeframe, int(time.time() * 1000))
+    revision = stream_revision(exchange_name, symbol, timeframe)
+    plans = []
+    for short_name, spec, params in indicators:
+        key = indicator_cache_key(exchange_name, symbol, timeframe, short_name, spec.talib_parameters(params))
+        entry = cached_entry(exchange_name, symbol, timeframe, key, token, revision)
+        # An entry holding the start of the range only needs the candles after its end
+        entry = entry if entry is not None and entry[0] <= timestamp_start <= entry[1] + 1 else None
+        compute_start = entry[1] + 1 if entry is not None else timestamp_start
+        # Cumulative outputs restart at the last cached candle and are shifted back onto its cached value
+        anchor = entry[2][:, -1] if entry is not None and spec.cumulative and entry[2].shape[1] else None
+        if anchor is not None:
+            candles_start = int(anchor[0])
+        elif entry is None or spec.windowed:
+            candles_start = compute_start - spec.lookback(params) * timeframe_ms
+        elif spec.smoothed:
+            # Smoothed outputs settle to their full history values within a bounded warm-up before the tail
+            candles_start = compute_start - spec.warmup(params) * timeframe_ms
+        else:
+            # Path dependent outputs (e.g. SAR) are recomputed from the start of their entry
+            candles_start = entry[0] - spec.lookback(params) * timeframe_ms
+        plans.append((key, spec, params, entry, compute_start, candles_start, anchor))
+    pending = [plan for plan in plans if plan[4] <= timestamp_end]
+    if pending:
+        candles = load_candles(min(plan[5] for plan in pending))
+        # Loading stores the missing candles and bumps the revision, the loaded window already holds them so entries
+        # are written under the revision after the load. Cached parts overlapping those writes are not stored again.
+        loaded_revision = stream_revision(exchange_name, symbol, timeframe)
+        cut = tail_cut(exchange_name, symbol, timeframe, revision, loaded_revision)
+    series = []
+    for key, spec, params, entry, compute_start, candles_start, anchor in plans:
+        parts = [entry[2]] if entry is not None else []
+        if compute_start <= timestamp_end:
+            window = candles.since(candles_start)
+            values = np.vstack([window.timestamp, *spec.compute(params, window).values()])
+            if anchor is not None and len(window) and values[0, 0] == anchor[0]:
+                values[1:] += (anchor[1:] - values[1:, 0])[:, None]
+            values = values[:, values[0] >= compute_start]
+            # Only closed candles are cached, the open one is recomputed on every request
+            cached_end = min(timestamp_end, closed_end)
+            if cached_end >= compute_start and (entry is None or (cut is not None and cut > entry[1])):
+                cached = np.concatenate(parts + [values[:, values[0] <= closed_end]], axis=1)
+                cache.set(key, (token, loaded_revision, entry[0] if entry is not None else compute_start, cached_end, cached), timeout=settings.INDICATOR_CACHE_TIMEOUT)
+            parts.append(values)
+        values = np.concatenate(parts, axis=1) if parts else np.empty((len(spec.outputs) + 1, 0))
+        values = values[:, (values[0] >= timestamp_start) & (values[0] <= timestamp_end)]
+        series.append((values[0].astype(np.int64), dict(zip(spec.outputs, values[1:]))))
+    return series
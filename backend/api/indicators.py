@@ -0,0 +1,125 @@
+import numpy as np
+from talib import abstract
+
+from . import streaming
+
+UNSTABLE_FLAG = 'Function has an unstable period'
+SMOOTHING_WARMUP = 20 # Lookbacks after which a smoothed output no longer depends on older candles within float precision
+
+class IndicatorParam:
+    def __init__(self, key, default, cast=int, talib=()):
+        self.key = key
+        self.default = default
+        self.cast = cast
+        # Display only params (e.g. RSI limits) map to no TA-Lib argument
+        self.talib = talib
+
+class IndicatorSpec:
+    def __init__(self, function, outputs, params=(), fixed=None, windowed=False, smoothed=False, cumulative=False, stream=None):
+        self.function = function
+        self.outputs = outputs
+        self.params = params
+        self.fixed = fixed or {}
+        # Each value only depends on the candles of its lookback window, unlike smoothed or cumulative outputs
+        self.windowed = windowed
+        # Smoothed outputs forget old candles exponentially, cumulative ones only differ by a constant when started later
+        self.smoothed = smoothed
+        self.cumulative = cumulative
+        # Incremental implementation for live trading, None when only full recomputation is available
+        self.stream = stream
+
+    def default_params(self):
+        return [{'key': param.key, 'value': param.default} for param in self.params]
+
+    def talib_parameters(self, params):
+        values = {p['key']: p['value'] for p in params}
+        parameters = dict(self.fixed)
+        for param in self.params:
+            for name in param.talib:
+                parameters[name] = param.cast(values.get(param.key, param.default))
+        return parameters
+
+    def lookback(self, params):
+        function = abstract.Function(self.function, **self.talib_parameters(params))
+        # Smoothed functions need extra history before their first value settles
+        return function.lookback * (2 if UNSTABLE_FLAG in function.function_flags else 1)
+
+    def warmup(self, params):
+        return self.lookback(params) * SMOOTHING_WARMUP
+
+    def start_stream(self, params):
+        return self.stream(**self.talib_parameters(params)) if self.stream else None
+
+    def compute(self, params, candles):
+        function = abstract.Function(self.function, **self.talib_parameters(params))
+        outputs = function({'open': candles.open, 'high': candles.high, 'low': candles.low, 'close': candles.close, 'volume': candles.volume})
+        return dict(zip(self.outputs, outputs if isinstance(outputs, list) else [outputs]))
+
+def length(default):
+    return IndicatorParam('length', default, talib=('timeperiod',))
+
+def limit(key, default):
+    return IndicatorParam(key, default, cast=float)
+
+INDICATORS = {
+    'RSI': IndicatorSpec('RSI', ['rsi'], [length(14), limit('upper_limit', 70), limit('middle_limit', 50), limit('lower_limit', 30)], smoothed=True, stream=streaming.RSI),
+    'SMA': IndicatorSpec('SMA', ['sma'], [length(9)], windowed=True, stream=streaming.SMAIndicator),
+    'EMA': IndicatorSpec('EMA', ['ema'], [length(9)], smoothed=True, stream=streaming.EMAIndicator),
+    'BBANDS': IndicatorSpec('BBANDS', ['upperband', 'middleband', 'lowerband'], [
+        length(20),
+        IndicatorParam('multiplier', 2, cast=float, talib=('nbdevup', 'nbdevdn')),
+    ], fixed={'matype': 0}, windowed=True, stream=streaming.BBANDS),
+    'MACD': IndicatorSpec('MACD', ['macd', 'macdsignal', 'macdhist'], [
+        IndicatorParam('fast_period', 12, talib=('fastperiod',)),
+        IndicatorParam('slow_period', 26, talib=('slowperiod',)),
+        IndicatorParam('signal_period', 9, talib=('signalperiod',)),
+    ], smoothed=True, stream=streaming.MACD),
+    'AROON': IndicatorSpec('AROON', ['aroondown', 'aroonup'], [length(14)], windowed=True, stream=streaming.AROON),
+    'ADX': IndicatorSpec('ADX', ['adx'], [length(14)], smoothed=True),
+    'CCI': IndicatorSpec('CCI', ['cci'], [length(20), limit('upper_limit', 100), limit('lower_limit', -100)], windowed=True),
+    'MFI': IndicatorSpec('MFI', ['mfi'], [length(14), limit('upper_limit', 80), limit('lower_limit', 20)], windowed=True, stream=streaming.MFI),
+    'MOM': IndicatorSpec('MOM', ['momentum'], [length(10)], windowed=True, stream=streaming.MOM),
+    'ROC': IndicatorSpec('ROC', ['roc'], [length(9)], windowed=True, stream=streaming.ROC),
+    'STOCH': IndicatorSpec('STOCH', ['slowk', 'slowd'], [
+        IndicatorParam('k_length', 14, talib=('fastk_period',)),
+        IndicatorParam('k_smoothing', 1, talib=('slowk_period',)),
+        IndicatorParam('d_smoothing', 3, talib=('slowd_period',)),
+        limit('upper_limit', 80),
+        limit('lower_limit', 20),
+    ], fixed={'slowk_matype': 0, 'slowd_matype': 0}, windowed=True, stream=streaming.STOCH),
+    'STOCHRSI': IndicatorSpec('STOCHRSI', ['fastk', 'fastd'], [
+        IndicatorParam('rsi_length', 14, talib=('timeperiod',)),
+        IndicatorParam('k_smoothing', 3, talib=('fastk_period',)),
+        IndicatorParam('d_smoothing', 3, talib=('fastd_period',)),
+        limit('upper_limit', 80),
+        limit('lower_limit', 20),
+    ], fixed={'fastd_matype': 0}, smoothed=True),
+    'TRIX': IndicatorSpec('TRIX', ['trix'], [length(18)], smoothed=True, stream=streaming.TRIX),
+    'ULTOSC': IndicatorSpec('ULTOSC', ['ultosc'], [
+        IndicatorParam('length1', 7, talib=('timeperiod1',)),
+        IndicatorParam('length2', 14, talib=('timeperiod2',)),
+        IndicatorParam('length3', 28, talib=('timeperiod3',)),
+    ], windowed=True),
+    'WILLR': IndicatorSpec('WILLR', ['willr'], [length(14), limit('upper_limit', -20), limit('lower_limit', -80)], windowed=True, stream=streaming.WILLR),
+    'OBV': IndicatorSpec('OBV', ['obv'], cumulative=True, stream=streaming.OBV),
+    'SAR': IndicatorSpec('SAR', ['sar'], [
+        IndicatorParam('increment', 0.02, cast=float, talib=('acceleration',)),
+        IndicatorParam('maximum', 0.2, cast=float, talib=('maximum',)),
+    ]),
+    'ATR': IndicatorSpec('ATR', ['atr'], [length(14)], smoothed=True, stream=streaming.ATR),
+    'AD': IndicatorSpec('AD', ['ad'], cumulative=True, stream=streaming.AD),
+}
+
+def indicator_spec(short_name):
+    spec = INDICATORS.get(short_name)
+    if spec is None:
+        raise NotImplementedError("Indicator type not implemented")
+    return spec
+
+def indicator_records(timestamps, outputs, timestamp_start, timestamp_end):
+    # Only candles in range where every output has settled are emitted
+    mask = (timestamps >= timestamp_start) & (timestamps <= timestamp_end)
+    for values in outputs.values():
+        mask &= ~np.isnan(values)
+    columns = {'time': timestamps[mask].tolist(), **{key: values[mask].tolist() for key, values in outputs.items()}}
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
@@ -0,0 +1,116 @@
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .candles import stream_id, sync_candles, timeframe_to_ms
+from .exchanges import exchange_pool
+from .models import Candle, Strategy, StrategyExecution
+from .partitions import ensure_month_partitions, partitioned_table
+
+INGEST_METRICS_KEY = 'ingest:metrics'
+
+def tracked_streams():
+    streams = set(Strategy.objects.values_list('exchange', 'symbol', 'timeframe').distinct())
+    streams.update(StrategyExecution.objects.filter(running=True).values_list('exchange', 'symbol', 'timeframe').distinct())
+    return streams
+
+def ingest_metrics():
+    return cache.get(INGEST_METRICS_KEY) or {'streams': {}, 'updated_at': None}
+
+class CandleIngestor:
+    def __init__(self, history_candles, max_workers, exchange_concurrency):
+        self.history_candles = history_candles
+        self.max_workers = max_workers
+        self.exchange_concurrency = exchange_concurrency
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._in_flight = set()
+        self._next_due = {}
+        self._metrics = {}
+        self._partitions_error = None
+
+    def semaphore(self, exchange_name):
+        with self._lock:
+            return self._semaphores.setdefault(exchange_name, threading.BoundedSemaphore(self.exchange_concurrency))
+
+    def ingest(self, exchange_name, symbol, timeframe):
+        timeframe_ms = timeframe_to_ms(timeframe)
+        now = int(time.time() * 1000)
+        last_closed = now // timeframe_ms * timeframe_ms - timeframe_ms
+        exchange = exchange_pool.get(exchange_name, {})
+        with self.semaphore(exchange_name):
+            # The newest bars first, so live strategies are never stuck behind a deep backfill
+            sync_candles(exchange, symbol, timeframe, last_closed - timeframe_ms, last_closed)
+            sync_candles(exchange, symbol, timeframe, last_closed - self.history_candles * timeframe_ms, last_closed)
+        latest = Candle.objects.filter(stream_id=stream_id(exchange_name, symbol, timeframe)).order_by('-timestamp').values_list('timestamp', flat=True).first()
+        # How far the newest stored bar trails the last closed one
+        return None if latest is None else last_closed - latest
+
+    def run_stream(self, stream):
+        exchange_name, symbol, timeframe = stream
+        started = time.time()
+        try:
+            lag_ms = self.ingest(exchange_name, symbol, timeframe)
+            timeframe_ms = timeframe_to_ms(timeframe)
+            next_due = (int(time.time() * 1000) // timeframe_ms + 1) * timeframe_ms / 1000 + settings.INGEST_CLOSE_DELAY
+            metrics = {'lag_ms': lag_ms, 'duration': time.time() - started, 'last_run': started, 'error': None}
+        except Exception as e:
+            next_due = time.time() + settings.INGEST_RETRY_DELAY
+            metrics = {**self._metrics.get(stream, {}), 'last_run': started, 'error': str(e)}
+        finally:
+            close_old_connections()
+        with self._lock:
+            self._next_due[stream] = next_due
+            self._metrics[stream] = metrics
+            self._in_flight.discard(stream)
+
+    def due_streams(self, streams):
+        now = time.time()
+        with self._lock:
+            for stream in set(self._next_due) - streams:
+                self._next_due.pop(stream, None)
+                self._metrics.pop(stream, None)
+            due = [stream for stream in streams if stream not in self._in_flight and self._next_due.get(stream, 0) <= now]
+            self._in_flight.update(due)
+        return due
+
+    def maintain_partitions(self):
+        # Upcoming monthly partitions are created before any candle of their month is ingested
+        try:
+            table = partitioned_table()
+            if table is not None:
+                now = datetime.now(timezone.utc)
+                ensure_month_partitions(table, now.year, now.month, settings.CANDLE_PARTITION_MONTHS_AHEAD)
+            self._partitions_error = None
+        except Exception as e:
+            self._partitions_error = str(e)
+        finally:
+            close_old_connections()
+
+    def publish_metrics(self):
+        with self._lock:
+            streams = {' '.join(stream): metrics for stream, metrics in self._metrics.items()}
+        cache.set(INGEST_METRICS_KEY, {'streams': streams, 'partitions_error': self._partitions_error, 'updated_at': time.time()}, timeout=None)
+
+    def run(self, once=False):
+        streams, streams_loaded_at, partitions_checked_at = set(), 0, 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                if time.time() - partitions_checked_at >= settings.CANDLE_PARTITION_INTERVAL:
+                    self.maintain_partitions()
+                    partitions_checked_at = time.time()
+                if time.time() - streams_loaded_at >= settings.INGEST_TRACK_INTERVAL:
+                    streams, streams_loaded_at = tracked_streams(), time.time()
+                futures = [executor.submit(self.run_stream, stream) for stream in self.due_streams(streams)]
+                if once:
+                    for future in futures:
+                        future.result()
+                    self.publish_metrics()
+                    return
+                self.publish_metrics()
+                time.sleep(settings.INGEST_POLL_INTERVAL)
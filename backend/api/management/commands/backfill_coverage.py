@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.candles import contiguous_ranges, record_coverage, timeframe_to_ms
+from api.models import Candle, CandleStream
+
+class Command(BaseCommand):
+    help = "Record coverage intervals for candles stored before coverage was tracked, so they are not fetched again"
+
+    def handle(self, *args, **options):
+        for stream in CandleStream.objects.order_by('id'):
+            timestamps = Candle.objects.filter(stream_id=stream.id).order_by('timestamp').values_list('timestamp', flat=True)
+            ranges = contiguous_ranges(list(timestamps.iterator(chunk_size=50000)), timeframe_to_ms(stream.timeframe))
+            for timestamp_start, timestamp_end in ranges:
+                record_coverage(stream.exchange, stream.symbol, stream.timeframe, timestamp_start, timestamp_end)
+            self.stdout.write(f"{stream}: {len(ranges)} covered ranges")
@@ -0,0 +1,219 @@
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from decimal import Decimal, DefaultContext, localcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.backtest import STATE_COLUMNS, Backtest
+from api.conditions import OrderRules
+from api.candles import CANDLE_COLUMNS, CandleSeries, bulk_create_candles, copy_candles, fetch_candle_values, stream_id
+from api.indicators import INDICATORS, indicator_records
+from api.models import Candle
+from api.testing import BACKTEST_CONDITIONS, CROSS_CONDITIONS, backtest_frame, legacy_backtest, legacy_indicator_records, legacy_order_condition_sources, numeric_difference, synthetic_ohlcv
+
+BENCHMARK_EXCHANGE = '__benchmark__'
+
+STORAGE_LAYOUTS = {
+    'legacy (uuid, numeric)': (
+        "CREATE TEMP TABLE bench_candles (id uuid PRIMARY KEY DEFAULT gen_random_uuid(), exchange varchar(50), symbol varchar(20), timeframe varchar(5), timestamp bigint, "
+        "open numeric(38,18), high numeric(38,18), low numeric(38,18), close numeric(38,18), volume numeric(38,18), UNIQUE (exchange, symbol, timeframe, timestamp))",
+        "INSERT INTO bench_candles (exchange, symbol, timeframe, timestamp, open, high, low, close, volume) "
+        "SELECT 'bench', 'BENCH/USDT', '1m', i::bigint * 60000, 100 + random(), 101 + random(), 99 + random(), 100 + random(), random() * 1000 FROM generate_series(0, %s - 1) i",
+        "SELECT timestamp, open, high, low, close, volume FROM bench_candles WHERE exchange = 'bench' AND symbol = 'BENCH/USDT' AND timeframe = '1m' "
+        "AND timestamp BETWEEN %s AND %s ORDER BY timestamp",
+    ),
+    'compact (stream, float8)': (
+        "CREATE TEMP TABLE bench_candles (stream_id integer, timestamp bigint, open float8, high float8, low float8, close float8, volume float8, PRIMARY KEY (stream_id, timestamp))",
+        "INSERT INTO bench_candles SELECT 1, i::bigint * 60000, 100 + random(), 101 + random(), 99 + random(), 100 + random(), random() * 1000 FROM generate_series(0, %s - 1) i",
+        "SELECT timestamp, open, high, low, close, volume FROM bench_candles WHERE stream_id = 1 AND timestamp BETWEEN %s AND %s ORDER BY timestamp",
+    ),
+}
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+class Command(BaseCommand):
+    help = "Benchmark candle and backtest hot paths"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        ingest = subparsers.add_parser('ingest', help="Decimal + bulk_create ingest vs COPY staging ingest")
+        ingest.add_argument('--rows', type=int, default=50000)
+        storage = subparsers.add_parser('storage', help="Table/index size and range-scan time of the legacy and compact candle layouts")
+        storage.add_argument('--rows', type=int, default=500000)
+        storage.add_argument('--scan-rows', type=int, default=50000)
+        read = subparsers.add_parser('read', help="DataFrame vs NumPy candle read path")
+        read.add_argument('--rows', type=int, default=50000)
+        indicators = subparsers.add_parser('indicators', help="iterrows vs vectorized indicator output per indicator type")
+        indicators.add_argument('--rows', type=int, default=50000)
+        backtest = subparsers.add_parser('backtest', help="DataFrame vs array backtest engine, checked trade by trade on the legacy prefix")
+        backtest.add_argument('--rows', type=int, default=50000)
+        backtest.add_argument('--legacy-rows', type=int, default=2000)
+        numeric = subparsers.add_parser('numeric', help="Decimal vs float64 backtest accounting, checked within tolerance")
+        numeric.add_argument('--rows', type=int, default=50000)
+        numeric.add_argument('--tolerance', type=float, default=1e-9)
+        conditions = subparsers.add_parser('conditions', help="Per candle eval vs compiled order condition masks")
+        conditions.add_argument('--rows', type=int, default=50000)
+        streaming = subparsers.add_parser('streaming', help="Streaming indicator parity and per-bar update vs full recomputation")
+        streaming.add_argument('--rows', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        getattr(self, f"benchmark_{options['benchmark']}")(options)
+
+    def report(self, name, seconds, rows):
+        self.stdout.write(f"{name:<32} {seconds * 1000:>10.1f} ms {rows / seconds:>14,.0f} rows/s")
+
+    def benchmark_ingest(self, options):
+        rows = synthetic_ohlcv(options['rows'])
+        for name, func in [('bulk_create', bulk_create_candles), ('copy', copy_candles)]:
+            Candle.objects.filter(stream__exchange=BENCHMARK_EXCHANGE).delete()
+            seconds, _ = timed(func, BENCHMARK_EXCHANGE, 'BENCH/USDT', '1m', rows)
+            self.report(name, seconds, len(rows))
+        Candle.objects.filter(stream__exchange=BENCHMARK_EXCHANGE).delete()
+
+    def benchmark_storage(self, options):
+        scan_start = (options['rows'] - options['scan_rows']) // 2 * 60000
+        scan_end = scan_start + (options['scan_rows'] - 1) * 60000
+        for name, (create_sql, fill_sql, scan_sql) in STORAGE_LAYOUTS.items():
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(create_sql)
+                cursor.execute(fill_sql, [options['rows']])
+                cursor.execute("ANALYZE bench_candles")
+                cursor.execute("SELECT pg_relation_size('bench_candles'), pg_indexes_size('bench_candles')")
+                table_size, index_size = cursor.fetchone()
+                cursor.execute(scan_sql, [scan_start, scan_end])
+                cursor.fetchall()
+                start = time.perf_counter()
+                cursor.execute(scan_sql, [scan_start, scan_end])
+                rows = cursor.fetchall()
+                seconds = time.perf_counter() - start
+                cursor.execute("DROP TABLE bench_candles")
+            self.stdout.write(f"{name:<32} table {table_size / 2**20:>8.1f} MiB  indexes {index_size / 2**20:>8.1f} MiB  scan {len(rows)} rows {seconds * 1000:>8.1f} ms")
+
+    def benchmark_read(self, options):
+        rows = synthetic_ohlcv(options['rows'])
+        Candle.objects.filter(stream__exchange=BENCHMARK_EXCHANGE).delete()
+        copy_candles(BENCHMARK_EXCHANGE, 'BENCH/USDT', '1m', rows)
+        queryset = Candle.objects.filter(stream_id=stream_id(BENCHMARK_EXCHANGE, 'BENCH/USDT', '1m')).order_by('timestamp')
+        readers = [
+            ('dataframe (values)', lambda: pd.DataFrame(list(queryset.values(*CANDLE_COLUMNS)))[CANDLE_COLUMNS[1:]].astype(float).values),
+            ('dataframe (values_list)', lambda: pd.DataFrame.from_records(queryset.values_list(*CANDLE_COLUMNS), columns=CANDLE_COLUMNS)),
+            ('numpy (iterator)', lambda: fetch_candle_values(BENCHMARK_EXCHANGE, 'BENCH/USDT', '1m', rows[0][0], rows[-1][0])),
+        ]
+        for name, reader in readers:
+            reader()
+            seconds, _ = timed(reader)
+            # Memory is traced in a separate run, tracing slows every allocation down
+            tracemalloc.start()
+            reader()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.report(name, seconds, len(rows))
+            self.stdout.write(f"{'':<32} peak {peak / 2**20:>8.1f} MiB")
+        Candle.objects.filter(stream__exchange=BENCHMARK_EXCHANGE).delete()
+
+    def benchmark_indicators(self, options):
+        candles = CandleSeries.from_rows(synthetic_ohlcv(options['rows']))
+        timestamp_start, timestamp_end = int(candles.timestamp[0]), int(candles.timestamp[-1])
+        for short_name, spec in INDICATORS.items():
+            params = spec.default_params()
+            outputs = spec.compute(params, candles)
+            legacy_seconds, legacy = timed(legacy_indicator_records, candles, outputs, timestamp_start, timestamp_end)
+            seconds, records = timed(indicator_records, candles.timestamp, outputs, timestamp_start, timestamp_end)
+            if records != legacy:
+                raise CommandError(f"{short_name} output differs from the iterrows output")
+            self.stdout.write(f"{short_name:<10} iterrows {legacy_seconds * 1000:>10.1f} ms  vectorized {seconds * 1000:>8.1f} ms  {legacy_seconds / seconds:>6.1f}x")
+
+    def benchmark_streaming(self, options):
+        candles = CandleSeries.from_rows(synthetic_ohlcv(options['rows']))
+        bars = list(zip(candles.open.tolist(), candles.high.tolist(), candles.low.tolist(), candles.close.tolist(), candles.volume.tolist()))
+        for short_name, spec in INDICATORS.items():
+            if spec.stream is None:
+                continue
+            params = spec.default_params()
+            full_seconds, outputs = timed(spec.compute, params, candles)
+            stream = spec.start_stream(params)
+            start = time.perf_counter()
+            streamed = np.array([stream.update(*bar) for bar in bars]).T
+            update_seconds = (time.perf_counter() - start) / len(bars)
+            for key, values in zip(spec.outputs, streamed):
+                expected = outputs[key]
+                if not np.array_equal(np.isnan(values), np.isnan(expected)) or not np.allclose(values, expected, rtol=1e-9, atol=1e-9, equal_nan=True):
+                    raise CommandError(f"{short_name} {key} stream differs from the full recomputation")
+            self.stdout.write(f"{short_name:<10} full {full_seconds * 1000:>10.3f} ms  per bar {update_seconds * 1e6:>8.2f} us  {full_seconds / update_seconds:>8.1f}x")
+
+    def benchmark_backtest(self, options):
+        c = backtest_frame(options['rows'])
+        columns = c.columns.difference(['timestamp']).tolist()
+        sources = legacy_order_condition_sources(BACKTEST_CONDITIONS, columns)
+        rules = OrderRules(BACKTEST_CONDITIONS, columns, STATE_COLUMNS)
+        arguments = (Decimal('1000'), 2, Decimal('0.001'), Decimal('0.002'))
+
+        def run(rows):
+            backtest = Backtest({column: c[column].to_numpy()[:rows] for column in columns + ['timestamp'] if column not in STATE_COLUMNS}, rules, *arguments, spot=False)
+            backtest.run()
+            return backtest
+
+        # Executions run in their own thread, which starts from the default decimal context
+        with localcontext(DefaultContext):
+            legacy_rows = min(options['legacy_rows'], len(c))
+            legacy_seconds, (legacy_trades, legacy_extremes) = timed(legacy_backtest, c.iloc[:legacy_rows].copy(), sources, *arguments, 'BENCH/USDT:USDT')
+            seconds, backtest = timed(run, legacy_rows)
+            extremes = backtest.extremes()
+            if legacy_trades.to_dict(orient='records') != backtest.trades_frame().to_dict(orient='records') or legacy_extremes != extremes:
+                raise CommandError("Array engine results differ from the DataFrame engine")
+            self.report(f"dataframe ({len(legacy_trades)} trades)", legacy_seconds, legacy_rows)
+            self.report(f"array ({len(backtest.trades)} trades)", seconds, legacy_rows)
+            seconds, backtest = timed(run, len(c))
+            self.report(f"array ({len(backtest.trades)} trades)", seconds, len(c))
+
+    def benchmark_conditions(self, options):
+        c = backtest_frame(options['rows'])
+        columns = c.columns.difference(['timestamp']).tolist()
+        # Only conditions over candles and indicators, the account state columns are empty outside a run
+        order_conditions = [rule for rule in BACKTEST_CONDITIONS if not any(STATE_COLUMNS[0] in condition['left_operand'] for condition in rule['conditions'])] + CROSS_CONDITIONS
+        sources = legacy_order_condition_sources(order_conditions, columns)
+
+        def evaluate_sources():
+            return [[bool(eval(condition, {'c': c, 'i': i})) for i in range(1, len(c))] for condition, _ in sources]
+
+        def evaluate_rules():
+            vectors = {column: c[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in columns + ['timestamp'] if column not in STATE_COLUMNS}
+            rules = OrderRules(order_conditions, columns, STATE_COLUMNS).bind(vectors, lambda column, row: c.at[row, column], len(c))
+            return [[bool(test(i)) for i in range(1, len(c))] for test, _ in rules]
+
+        with localcontext(DefaultContext):
+            legacy_seconds, legacy = timed(evaluate_sources)
+            seconds, compiled = timed(evaluate_rules)
+        if legacy != compiled:
+            raise CommandError("Compiled conditions differ from the eval conditions")
+        self.report(f"eval ({len(sources)} rules)", legacy_seconds, len(c))
+        self.report(f"compiled ({len(sources)} rules)", seconds, len(c))
+
+    def benchmark_numeric(self, options):
+        c = backtest_frame(options['rows'])
+        columns = c.columns.difference(['timestamp']).tolist()
+        rules = OrderRules(BACKTEST_CONDITIONS, columns, STATE_COLUMNS)
+
+        def run(numeric):
+            backtest = Backtest({column: c[column].to_numpy() for column in columns + ['timestamp'] if column not in STATE_COLUMNS}, rules, Decimal('1000'), 2, Decimal('0.001'), Decimal('0.002'), spot=False, numeric=numeric)
+            backtest.run()
+            return backtest
+
+        with localcontext(DefaultContext):
+            results = {numeric: timed(run, numeric) for numeric in ['decimal', 'float']}
+        (_, exact), (_, native) = results['decimal'], results['float']
+        exact_trades, native_trades = exact.trades_frame(), native.trades_frame()
+        if exact_trades[['type', 'side', 'timestamp']].to_dict('records') != native_trades[['type', 'side', 'timestamp']].to_dict('records'):
+            raise CommandError("Float accounting placed a different trade sequence")
+        error = numeric_difference(exact, native)
+        if error > options['tolerance']:
+            raise CommandError(f"Float accounting differs by {error:.3g}, above the {options['tolerance']:.3g} tolerance")
+        for numeric, (seconds, backtest) in results.items():
+            self.report(f"{numeric} ({len(backtest.trades)} trades)", seconds, len(c))
+        self.stdout.write(f"{'':<32} max relative difference {error:.3g}")
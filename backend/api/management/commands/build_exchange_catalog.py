@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.exchanges import exchange_catalog
+
+class Command(BaseCommand):
+    help = "Precompute the exchange capability catalog served by /v1/exchanges/"
+
+    def handle(self, *args, **options):
+        catalog = exchange_catalog.build()
+        supported = sum(1 for c in catalog['exchanges'].values() if c['supported'])
+        self.stdout.write(f"{len(catalog['exchanges'])} exchanges catalogued, {supported} supported ({exchange_catalog.path})")
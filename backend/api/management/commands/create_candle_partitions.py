@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.models import Candle, CandleStream
+from api.partitions import ensure_month_partitions, month_start, scanned_partitions, to_ms
+
+class Command(BaseCommand):
+    help = "Create the timestamp-partitioned candle table, its BRIN index and monthly partitions up to N months ahead"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='2017-01', help="First monthly partition (YYYY-MM), older candles go to the default partition")
+        parser.add_argument('--months-ahead', type=int, default=settings.CANDLE_PARTITION_MONTHS_AHEAD)
+        parser.add_argument('--verify', action='store_true', help="EXPLAIN a one-month range query and check that only one partition is scanned")
+
+    def handle(self, *args, **options):
+        table = Candle._meta.db_table
+        year, month = (int(x) for x in options['since'].split('-'))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.relname = %s AND n.nspname = current_schema()", [table])
+            relkind = cursor.fetchone()
+            if relkind and relkind[0] == 'r':
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+                cursor.execute(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {table}_pkey TO {table}_unpartitioned_pkey")
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                f"stream_id integer NOT NULL REFERENCES {CandleStream._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED, "
+                "timestamp bigint NOT NULL, open double precision NOT NULL, high double precision NOT NULL, "
+                "low double precision NOT NULL, close double precision NOT NULL, volume double precision NOT NULL, "
+                "PRIMARY KEY (stream_id, timestamp)) PARTITION BY RANGE (timestamp)"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp_brin ON {table} USING brin (timestamp)")
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+            created, last = ensure_month_partitions(table, year, month, options['months_ahead'])
+            if relkind and relkind[0] == 'r':
+                cursor.execute(f"INSERT INTO {table} SELECT stream_id, timestamp, open, high, low, close, volume FROM {table}_unpartitioned ON CONFLICT DO NOTHING")
+                cursor.execute(f"DROP TABLE {table}_unpartitioned")
+                self.stdout.write(f"Moved existing candles into the partitioned {table}")
+        self.stdout.write(f"{created} monthly partitions created up to {last:%Y-%m}")
+        if options['verify']:
+            self.verify(table)
+
+    def verify(self, table):
+        now = datetime.now(timezone.utc)
+        start = month_start(now.year, now.month)
+        scanned = scanned_partitions(table, to_ms(start), to_ms(month_start(now.year, now.month + 1)))
+        if scanned != {f"{table}_p{start:%Y_%m}"}:
+            raise CommandError(f"Partition pruning failed, scanned: {', '.join(sorted(scanned)) or 'none'}")
+        self.stdout.write(f"Partition pruning verified: only {table}_p{start:%Y_%m} scanned")
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.ingest import CandleIngestor, ingest_metrics
+
+class Command(BaseCommand):
+    help = "Keep candles of every symbol used by a strategy or a running execution stored, appending each bar as it closes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run a single ingestion pass and exit")
+        parser.add_argument('--history', type=int, default=settings.INGEST_HISTORY_CANDLES, help="Number of closed candles to backfill per stream")
+
+    def handle(self, *args, **options):
+        ingestor = CandleIngestor(
+            history_candles=options['history'],
+            max_workers=settings.INGEST_MAX_WORKERS,
+            exchange_concurrency=settings.INGEST_EXCHANGE_CONCURRENCY
+        )
+        ingestor.run(once=options['once'])
+        if options['once']:
+            for stream, metrics in ingest_metrics()['streams'].items():
+                self.stdout.write(f"{stream}: lag {metrics.get('lag_ms')} ms{' error: ' + metrics['error'] if metrics.get('error') else ''}")
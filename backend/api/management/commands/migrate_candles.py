@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.candles import contiguous_ranges, copy_candles, record_coverage, timeframe_to_ms
+
+LEGACY_TABLE = 'api_candle'
+
+class Command(BaseCommand):
+    help = "Move rows from the legacy UUID/numeric candle table into the compact api_ohlcv table in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--drop', action='store_true', help="Drop the legacy table once every row has been copied")
+
+    def handle(self, *args, **options):
+        if LEGACY_TABLE not in connection.introspection.table_names():
+            self.stdout.write("No legacy candle table found")
+            return
+        batch_size = options['batch_size']
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT DISTINCT exchange, symbol, timeframe FROM {LEGACY_TABLE}")
+            streams = cursor.fetchall()
+        total = 0
+        for exchange_name, symbol, timeframe in streams:
+            last_timestamp = -1
+            while True:
+                # Keyset pagination over the legacy (exchange, symbol, timeframe, timestamp) unique index
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT timestamp, open::float8, high::float8, low::float8, close::float8, volume::float8 FROM {LEGACY_TABLE} "
+                        "WHERE exchange = %s AND symbol = %s AND timeframe = %s AND timestamp > %s ORDER BY timestamp LIMIT %s",
+                        [exchange_name, symbol, timeframe, last_timestamp, batch_size]
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                copy_candles(exchange_name, symbol, timeframe, rows)
+                # Spans split across batches touch and are merged by record_coverage
+                for timestamp_start, timestamp_end in contiguous_ranges([row[0] for row in rows], timeframe_to_ms(timeframe)):
+                    record_coverage(exchange_name, symbol, timeframe, timestamp_start, timestamp_end)
+                last_timestamp = rows[-1][0]
+                total += len(rows)
+            self.stdout.write(f"{exchange_name} {symbol} {timeframe}: migrated up to {last_timestamp}")
+        self.stdout.write(f"{total} candles migrated")
+        if options['drop']:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+            self.stdout.write(f"Dropped {LEGACY_TABLE}")
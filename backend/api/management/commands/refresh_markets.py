@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.exchanges import refresh_markets
+from api.models import Strategy
+
+class Command(BaseCommand):
+    help = "Download market metadata into the shared cache (defaults to every exchange used by a strategy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('exchanges', nargs='*')
+
+    def handle(self, *args, **options):
+        exchanges = options['exchanges'] or Strategy.objects.values_list('exchange', flat=True).distinct()
+        for exchange_name in exchanges:
+            try:
+                metadata = refresh_markets(exchange_name)
+                self.stdout.write(f"{exchange_name}: {len(metadata['markets'])} markets")
+            except Exception as e:
+                self.stderr.write(f"{exchange_name}: {e}")
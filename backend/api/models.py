@@ -104,20 +104,47 @@ class Trade(models.Model):
     def __str__(self):
         return f"Trade {self.id} - {self.side} {self.amount} @ {self.price}"
 
+class CandleStream(models.Model):
+    id = models.AutoField(primary_key=True)
+    exchange = models.CharField(max_length=50)
+    symbol = models.CharField(max_length=20)
+    timeframe = models.CharField(max_length=5)
+
+    class Meta:
+        unique_together = ('exchange', 'symbol', 'timeframe')
+
+    def __str__(self):
+        return f"{self.exchange} {self.symbol} {self.timeframe}"
+
 class Candle(models.Model):
+    pk = models.CompositePrimaryKey('stream', 'timestamp')
+    stream = models.ForeignKey(CandleStream, on_delete=models.CASCADE, db_index=False)
+    timestamp = models.BigIntegerField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.FloatField()
+
+    class Meta:
+        # Range-partitioned by timestamp, the table and its partitions are managed by create_candle_partitions
+        managed = False
+        db_table = 'api_ohlcv'
+
+    def __str__(self):
+        return f"{self.stream} @ {self.timestamp}"
+
+class CandleCoverage(models.Model):
     id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True)
     exchange = models.CharField(max_length=50)
     symbol = models.CharField(max_length=20)
     timeframe = models.CharField(max_length=5)
-    timestamp = models.BigIntegerField()
-    open = models.DecimalField(max_digits=38, decimal_places=18)
-    high = models.DecimalField(max_digits=38, decimal_places=18)
-    low = models.DecimalField(max_digits=38, decimal_places=18)
-    close = models.DecimalField(max_digits=38, decimal_places=18)
-    volume = models.DecimalField(max_digits=38, decimal_places=18)
+    timestamp_start = models.BigIntegerField()
+    timestamp_end = models.BigIntegerField()
+    source_timeframe = models.CharField(max_length=5, null=True, blank=True)
 
     class Meta:
-        unique_together = ('exchange', 'symbol', 'timeframe', 'timestamp')
+        indexes = [models.Index(fields=['exchange', 'symbol', 'timeframe', 'timestamp_start'])]
 
     def __str__(self):
-        return f"{self.exchange} {self.symbol} {self.timeframe} @ {self.timestamp}"
\ No newline at end of file
+        return f"{self.exchange} {self.symbol} {self.timeframe} [{self.timestamp_start}, {self.timestamp_end}]"
\ No newline at end of file
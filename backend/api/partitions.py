@@ -0,0 +1,62 @@
+import json
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+from .models import Candle
+
+def month_start(year, month):
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1, tzinfo=timezone.utc)
+
+def to_ms(moment):
+    return int(moment.timestamp() * 1000)
+
+def partitioned_table():
+    # The candle table, when it exists and is range partitioned
+    table = Candle._meta.db_table
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.relname = %s AND n.nspname = current_schema()", [table])
+        relkind = cursor.fetchone()
+    return table if relkind and relkind[0] == 'p' else None
+
+def create_month_partition(table, start, end):
+    partition = f"{table}_p{start:%Y_%m}"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [partition])
+        if cursor.fetchone()[0] is not None:
+            return False
+        # Rows of this month that reached the default partition are moved before attaching, or the attach would fail
+        cursor.execute(f"CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE timestamp >= %s AND timestamp < %s RETURNING *) INSERT INTO {partition} SELECT * FROM moved",
+            [to_ms(start), to_ms(end)]
+        )
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM ({to_ms(start)}) TO ({to_ms(end)})")
+    return True
+
+def ensure_month_partitions(table, year, month, months_ahead):
+    # Monthly partitions from year-month up to months_ahead past the current month, each in its own transaction
+    now = datetime.now(timezone.utc)
+    last = month_start(now.year, now.month + months_ahead)
+    created = 0
+    while month_start(year, month) <= last:
+        created += create_month_partition(table, month_start(year, month), month_start(year, month + 1))
+        month += 1
+    return created, last
+
+def scanned_partitions(table, timestamp_start, timestamp_end):
+    # Partitions the planner keeps for a range query on one stream
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT * FROM {table} WHERE stream_id = 1 AND timestamp >= %s AND timestamp < %s", [timestamp_start, timestamp_end])
+        plan = cursor.fetchone()[0]
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    scanned = set()
+    def walk(node):
+        if node.get('Relation Name', '').startswith(table):
+            scanned.add(node['Relation Name'])
+        for child in node.get('Plans', []):
+            walk(child)
+    walk(plan[0]['Plan'])
+    return scanned
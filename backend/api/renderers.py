@@ -0,0 +1,30 @@
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+def to_columns(data):
+    if isinstance(data, list):
+        if not data or not isinstance(data[0], dict):
+            return data
+        return {key: [row[key] for row in data] for key in data[0]}
+    if isinstance(data, dict) and isinstance(data.get('data'), list):
+        return {**data, 'data': to_columns(data['data'])}
+    return data
+
+class ColumnarJSONRenderer(JSONRenderer):
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columns(data), accepted_media_type, renderer_context)
+
+class MsgPackRenderer(BaseRenderer):
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(to_columns(data), use_bin_type=True)
+
+COLUMNAR_FORMATS = {ColumnarJSONRenderer.format, MsgPackRenderer.format}
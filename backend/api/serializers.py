@@ -177,6 +177,12 @@ class StrategySerializer(serializers.ModelSerializer):
 
 class CandleSerializer(serializers.ModelSerializer):
     time = serializers.IntegerField(source='timestamp')
+    # Prices are stored as float8 but keep the decimal string format of the JSON API
+    open = serializers.DecimalField(max_digits=38, decimal_places=18)
+    high = serializers.DecimalField(max_digits=38, decimal_places=18)
+    low = serializers.DecimalField(max_digits=38, decimal_places=18)
+    close = serializers.DecimalField(max_digits=38, decimal_places=18)
+    volume = serializers.DecimalField(max_digits=38, decimal_places=18)
     
     class Meta:
         model = Candle
@@ -1,2 +1,16 @@
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
\ No newline at end of file
+from django.dispatch import receiver
+
+from .etags import bump_strategy_token
+from .exchanges import exchange_pool
+from .models import ApiKey, Strategy
+
+@receiver(post_save, sender=ApiKey)
+@receiver(post_delete, sender=ApiKey)
+def invalidate_pooled_exchange(sender, instance, **kwargs):
+    exchange_pool.invalidate(instance.exchange, instance.user_id)
+
+@receiver(post_save, sender=Strategy)
+@receiver(post_delete, sender=Strategy)
+def invalidate_indicator_etags(sender, instance, **kwargs):
+    bump_strategy_token(instance.id)
@@ -0,0 +1,68 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+def redis_connection():
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        return None
+
+def hold_lease(lock_key, token, stop):
+    # Extends the leader's lease while it runs, only for as long as the lock is still its own
+    while not stop.wait(settings.SINGLE_FLIGHT_LOCK_TIMEOUT / 3):
+        if cache.get(lock_key) != token:
+            return
+        cache.touch(lock_key, settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+
+def single_flight(key, func):
+    lock_key = f"singleflight:{key}:lock"
+    result_key = f"singleflight:{key}:result"
+    channel = f"singleflight:{key}"
+    connection = redis_connection()
+    pubsub = None
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+    try:
+        while True:
+            token = uuid.uuid4().hex
+            if cache.add(lock_key, token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+                stop = threading.Event()
+                threading.Thread(target=hold_lease, args=(lock_key, token, stop), daemon=True).start()
+                try:
+                    result = func()
+                    cache.set(result_key, (token, result), timeout=settings.SINGLE_FLIGHT_RESULT_TIMEOUT)
+                    if connection is not None:
+                        connection.publish(channel, token)
+                    return result
+                finally:
+                    stop.set()
+                    if cache.get(lock_key) == token:
+                        cache.delete(lock_key)
+            leader = cache.get(lock_key)
+            if leader is None:
+                continue
+            if pubsub is None and connection is not None:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+            # A dead leader is detected when its lock expires without a published result
+            while cache.get(lock_key) == leader and time.monotonic() < deadline:
+                result = cache.get(result_key)
+                if result is not None and result[0] == leader:
+                    return result[1]
+                if pubsub is not None:
+                    pubsub.get_message(timeout=settings.SINGLE_FLIGHT_POLL_INTERVAL)
+                else:
+                    time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+            result = cache.get(result_key)
+            if result is not None and result[0] == leader:
+                return result[1]
+            if time.monotonic() >= deadline:
+                # Leader is too slow, fetching again is safe since stores ignore conflicts
+                return func()
+    finally:
+        if pubsub is not None:
+            pubsub.close()
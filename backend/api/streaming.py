@@ -0,0 +1,323 @@
+import math
+from collections import deque
+
+# Each indicator follows the TA-Lib algorithm step by step, so replaying a series matches a full recomputation up to
+# rounding. update takes one closed candle and returns one value per output, NaN until the lookback is filled.
+
+NAN = math.nan
+EPSILON = 1e-14
+
+def is_zero(value):
+    return -EPSILON < value < EPSILON
+
+class SMA:
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+
+    def update(self, value):
+        self.window.append(value)
+        self.total += value
+        if len(self.window) < self.period:
+            return NAN
+        result = self.total / self.period
+        self.total -= self.window.popleft()
+        return result
+
+class EMA:
+    def __init__(self, period):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = NAN
+
+    def update(self, value):
+        # Seeded with the simple average of the first period values
+        if self.count < self.period:
+            self.count += 1
+            self.total += value
+            if self.count == self.period:
+                self.value = self.total / self.period
+            return self.value
+        self.value = ((value - self.value) * self.k) + self.value
+        return self.value
+
+class RollingMax:
+    def __init__(self, period):
+        self.period = period
+        self.index = -1
+        # (index, value) pairs with decreasing values, the front is the maximum and the latest one on ties
+        self.window = deque()
+
+    def update(self, value):
+        self.index += 1
+        while self.window and self.window[-1][1] <= value:
+            self.window.pop()
+        self.window.append((self.index, value))
+        if self.window[0][0] <= self.index - self.period:
+            self.window.popleft()
+        return self.window[0]
+
+    def ready(self):
+        return self.index + 1 >= self.period
+
+def true_range(high, low, previous_close):
+    greatest = high - low
+    greatest = max(greatest, abs(previous_close - high))
+    return max(greatest, abs(previous_close - low))
+
+class SMAIndicator:
+    def __init__(self, timeperiod):
+        self.sma = SMA(timeperiod)
+
+    def update(self, open, high, low, close, volume):
+        return (self.sma.update(close),)
+
+class EMAIndicator:
+    def __init__(self, timeperiod):
+        self.ema = EMA(timeperiod)
+
+    def update(self, open, high, low, close, volume):
+        return (self.ema.update(close),)
+
+class RSI:
+    def __init__(self, timeperiod):
+        self.period = timeperiod
+        self.previous = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, open, high, low, close, volume):
+        if self.previous is None:
+            self.previous = close
+            return (NAN,)
+        change = close - self.previous
+        self.previous = close
+        self.count += 1
+        if self.count > self.period:
+            self.gain *= self.period - 1
+            self.loss *= self.period - 1
+        if change < 0:
+            self.loss -= change
+        else:
+            self.gain += change
+        if self.count < self.period:
+            return (NAN,)
+        self.gain /= self.period
+        self.loss /= self.period
+        total = self.gain + self.loss
+        return (0.0 if is_zero(total) else 100.0 * (self.gain / total),)
+
+class MACD:
+    def __init__(self, fastperiod, slowperiod, signalperiod):
+        if slowperiod < fastperiod:
+            fastperiod, slowperiod = slowperiod, fastperiod
+        # TA-Lib seeds the fast average so that both averages start on the same candle
+        self.skip = slowperiod - fastperiod
+        self.fast = EMA(fastperiod)
+        self.slow = EMA(slowperiod)
+        self.signal = EMA(signalperiod)
+
+    def update(self, open, high, low, close, volume):
+        slow = self.slow.update(close)
+        if self.skip:
+            self.skip -= 1
+            return (NAN, NAN, NAN)
+        fast = self.fast.update(close)
+        if math.isnan(slow):
+            return (NAN, NAN, NAN)
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        if math.isnan(signal):
+            return (NAN, NAN, NAN)
+        return (macd, signal, macd - signal)
+
+class BBANDS:
+    def __init__(self, timeperiod, nbdevup, nbdevdn, matype=0):
+        self.period = timeperiod
+        self.up = nbdevup
+        self.down = nbdevdn
+        self.window = deque()
+        self.total = 0.0
+
+    def update(self, open, high, low, close, volume):
+        self.window.append(close)
+        self.total += close
+        if len(self.window) < self.period:
+            return (NAN, NAN, NAN)
+        middle = self.total / self.period
+        # Deviations are summed over the window, running sums of squares lose precision on flat prices
+        variance = sum((value - middle) * (value - middle) for value in self.window) / self.period
+        self.total -= self.window.popleft()
+        deviation = math.sqrt(variance) if variance >= EPSILON else 0.0
+        return (middle + deviation * self.up, middle, middle - deviation * self.down)
+
+class ATR:
+    def __init__(self, timeperiod):
+        self.period = timeperiod
+        self.previous_close = None
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, open, high, low, close, volume):
+        if self.previous_close is None:
+            self.previous_close = close
+            return (NAN,)
+        tr = true_range(high, low, self.previous_close)
+        self.previous_close = close
+        if self.period <= 1:
+            return (tr,)
+        self.count += 1
+        if self.count > self.period:
+            self.value *= self.period - 1
+            self.value += tr
+            self.value /= self.period
+            return (self.value,)
+        self.value += tr
+        if self.count < self.period:
+            return (NAN,)
+        self.value /= self.period
+        return (self.value,)
+
+class OBV:
+    def __init__(self):
+        self.previous = None
+        self.value = 0.0
+
+    def update(self, open, high, low, close, volume):
+        if self.previous is None:
+            self.value = volume
+        elif close > self.previous:
+            self.value += volume
+        elif close < self.previous:
+            self.value -= volume
+        self.previous = close
+        return (self.value,)
+
+class AD:
+    def __init__(self):
+        self.value = 0.0
+
+    def update(self, open, high, low, close, volume):
+        spread = high - low
+        if spread > 0.0:
+            self.value += (((close - low) - (high - close)) / spread) * volume
+        return (self.value,)
+
+class MOM:
+    def __init__(self, timeperiod):
+        self.window = deque(maxlen=timeperiod + 1)
+
+    def update(self, open, high, low, close, volume):
+        self.window.append(close)
+        if len(self.window) < self.window.maxlen:
+            return (NAN,)
+        return (close - self.window[0],)
+
+class ROC:
+    def __init__(self, timeperiod):
+        self.window = deque(maxlen=timeperiod + 1)
+
+    def update(self, open, high, low, close, volume):
+        self.window.append(close)
+        if len(self.window) < self.window.maxlen:
+            return (NAN,)
+        return (((close / self.window[0]) - 1.0) * 100.0 if self.window[0] != 0.0 else 0.0,)
+
+class WILLR:
+    def __init__(self, timeperiod):
+        self.highest = RollingMax(timeperiod)
+        # Lows are negated so that the rolling maximum tracks the lowest low
+        self.lowest = RollingMax(timeperiod)
+
+    def update(self, open, high, low, close, volume):
+        highest = self.highest.update(high)[1]
+        lowest = -self.lowest.update(-low)[1]
+        if not self.highest.ready():
+            return (NAN,)
+        diff = (highest - lowest) / (-100.0)
+        return ((highest - close) / diff if diff != 0.0 else 0.0,)
+
+class STOCH:
+    def __init__(self, fastk_period, slowk_period, slowd_period, slowk_matype=0, slowd_matype=0):
+        self.highest = RollingMax(fastk_period)
+        self.lowest = RollingMax(fastk_period)
+        self.slowk = SMA(slowk_period)
+        self.slowd = SMA(slowd_period)
+
+    def update(self, open, high, low, close, volume):
+        highest = self.highest.update(high)[1]
+        lowest = -self.lowest.update(-low)[1]
+        if not self.highest.ready():
+            return (NAN, NAN)
+        diff = (highest - lowest) / 100.0
+        slowk = self.slowk.update((close - lowest) / diff if diff != 0.0 else 0.0)
+        if math.isnan(slowk):
+            return (NAN, NAN)
+        slowd = self.slowd.update(slowk)
+        if math.isnan(slowd):
+            return (NAN, NAN)
+        return (slowk, slowd)
+
+class MFI:
+    def __init__(self, timeperiod):
+        self.period = timeperiod
+        self.previous = None
+        self.flows = deque()
+        self.positive = 0.0
+        self.negative = 0.0
+
+    def update(self, open, high, low, close, volume):
+        typical = (high + low + close) / 3.0
+        if self.previous is None:
+            self.previous = typical
+            return (NAN,)
+        change = typical - self.previous
+        self.previous = typical
+        if len(self.flows) == self.period:
+            positive, negative = self.flows.popleft()
+            self.positive -= positive
+            self.negative -= negative
+        flow = typical * volume
+        flow = (0.0, flow) if change < 0 else (flow, 0.0) if change > 0 else (0.0, 0.0)
+        self.positive += flow[0]
+        self.negative += flow[1]
+        self.flows.append(flow)
+        if len(self.flows) < self.period:
+            return (NAN,)
+        total = self.positive + self.negative
+        return (0.0 if total < 1.0 else 100.0 * (self.positive / total),)
+
+class TRIX:
+    def __init__(self, timeperiod):
+        self.emas = [EMA(timeperiod) for _ in range(3)]
+        self.previous = NAN
+
+    def update(self, open, high, low, close, volume):
+        value = close
+        for ema in self.emas:
+            value = ema.update(value)
+            if math.isnan(value):
+                return (NAN,)
+        previous, self.previous = self.previous, value
+        if math.isnan(previous):
+            return (NAN,)
+        return (((value / previous) - 1.0) * 100.0 if previous != 0.0 else 0.0,)
+
+class AROON:
+    def __init__(self, timeperiod):
+        self.period = timeperiod
+        self.factor = 100.0 / timeperiod
+        self.highest = RollingMax(timeperiod + 1)
+        self.lowest = RollingMax(timeperiod + 1)
+
+    def update(self, open, high, low, close, volume):
+        highest_index = self.highest.update(high)[0]
+        lowest_index = self.lowest.update(-low)[0]
+        if not self.highest.ready():
+            return (NAN, NAN)
+        today = self.highest.index
+        return (self.factor * (self.period - (today - lowest_index)), self.factor * (self.period - (today - highest_index)))
@@ -0,0 +1,269 @@
+# Fixtures and the legacy reference loops shared by the tests and the benchmark command
+import json
+import re
+import secrets
+import string
+import numpy as np
+import pandas as pd
+from decimal import Decimal
+
+from .backtest import STATE_COLUMNS, TRADE_COLUMNS, VALUE_COLUMNS
+from .candles import CandleSeries
+from .indicators import INDICATORS
+
+def synthetic_ohlcv(rows, timeframe_ms=60000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, rows))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) + rng.random(rows)
+    low = np.minimum(open_, close) - rng.random(rows)
+    volume = rng.random(rows) * 1000
+    timestamps = np.arange(rows, dtype=np.int64) * timeframe_ms
+    return [[int(t), float(o), float(h), float(l), float(c), float(v)] for t, o, h, l, c, v in zip(timestamps, open_, high, low, close, volume)]
+
+def legacy_indicator_records(candles, outputs, timestamp_start, timestamp_end):
+    candles_df = candles.to_frame()
+    for column, values in outputs.items():
+        candles_df[column] = values
+    cols_map = {'timestamp': ('time', int), **{col: (col, None) for col in outputs}}
+    return [
+        {out_key: (func(row[col]) if func else row[col]) for col, (out_key, func) in cols_map.items()}
+        for _, row in candles_df.iterrows()
+        if timestamp_start <= row['timestamp'] <= timestamp_end
+        and not any(pd.isna(row[col_name]) for col_name in cols_map.keys())
+    ]
+
+BACKTEST_CONDITIONS = json.loads("""[
+    {"conditions": [{"start_parenthesis": false, "left_operand": "close", "operator": ">", "right_operand": "SMA_9", "end_parenthesis": false, "logical_operator": "and"},
+                    {"start_parenthesis": false, "left_operand": "MOM_10", "operator": ">", "right_operand": "0", "end_parenthesis": false, "logical_operator": ""}],
+     "orders": [{"type": "market", "side": "buy", "amount": "close / close"}]},
+    {"conditions": [{"start_parenthesis": false, "left_operand": "close", "operator": "<", "right_operand": "SMA_9", "end_parenthesis": false, "logical_operator": ""}],
+     "orders": [{"type": "market", "side": "sell", "amount": "close / close * 2"}]},
+    {"conditions": [{"start_parenthesis": true, "left_operand": "MOM_10", "operator": "<", "right_operand": "-1", "end_parenthesis": false, "logical_operator": "or"},
+                    {"start_parenthesis": false, "left_operand": "position_amount", "operator": "<", "right_operand": "0", "end_parenthesis": true, "logical_operator": "and"},
+                    {"start_parenthesis": false, "left_operand": "close", "operator": "<", "right_operand": "SMA_9", "end_parenthesis": false, "logical_operator": ""}],
+     "orders": [{"type": "limit", "side": "buy", "amount": "close / close / 2", "price": "low - (high - low) / 4"}]},
+    {"conditions": [{"start_parenthesis": false, "left_operand": "MOM_10", "operator": ">", "right_operand": "1.5", "end_parenthesis": false, "logical_operator": ""}],
+     "orders": [{"type": "limit", "side": "sell", "amount": "close / close * 3 / 4", "price": "high + (high - low) / 5"}]},
+    {"conditions": [{"start_parenthesis": false, "left_operand": "position_amount", "operator": ">", "right_operand": "2", "end_parenthesis": false, "logical_operator": ""}],
+     "orders": [{"type": "market", "side": "sell", "amount": "position_amount / 2"}]}
+]""")
+
+CROSS_CONDITIONS = json.loads("""[
+    {"conditions": [{"start_parenthesis": false, "left_operand": "close", "operator": "crossabove", "right_operand": "SMA_9", "end_parenthesis": false, "logical_operator": "or"},
+                    {"start_parenthesis": false, "left_operand": "MOM_10 * 2", "operator": "crossunder", "right_operand": "high - low", "end_parenthesis": false, "logical_operator": ""}],
+     "orders": []}
+]""")
+
+def backtest_frame(rows, warmup=10):
+    candles = CandleSeries.from_rows(synthetic_ohlcv(rows + warmup))
+    c = candles.to_frame()
+    c[['open', 'high', 'low', 'close', 'volume']] = c[['open', 'high', 'low', 'close', 'volume']].map(lambda x: Decimal(str(x)))
+    c['SMA_9'] = INDICATORS['SMA'].compute([{'key': 'length', 'value': 9}], candles)['sma']
+    c['MOM_10'] = INDICATORS['MOM'].compute([{'key': 'length', 'value': 10}], candles)['momentum']
+    c = c.iloc[warmup:].reset_index(drop=True)
+    c[STATE_COLUMNS] = None
+    return c
+
+def legacy_order_condition_sources(order_conditions, columns):
+    # The eval/exec sources order conditions compiled to before OrderRules
+    replacements = [(col, f"c.at[i, '{col}']") for col in columns]
+    sources = []
+    for order_condition in order_conditions:
+        condition_result = ""
+        curr_conditions = order_condition['conditions']
+        total_conditions = len(curr_conditions)
+        for i, condition in enumerate(curr_conditions):
+            if condition['start_parenthesis']:
+                condition_result += "("
+            left_operand  = condition['left_operand']
+            right_operand = condition['right_operand']
+            for old, new in replacements:
+                left_operand  = left_operand.replace(old, new)
+                right_operand = right_operand.replace(old, new)
+            operator = condition['operator']
+            if operator == 'crossunder':
+                condition_result += f"(({left_operand.replace('c.at[i, ', 'c.at[i-1, ')}) > ({right_operand.replace('c.at[i, ', 'c.at[i-1, ')}) and ({left_operand}) < ({right_operand}))"
+            elif operator == 'crossabove':
+                condition_result += f"(({left_operand.replace('c.at[i, ', 'c.at[i-1, ')}) < ({right_operand.replace('c.at[i, ', 'c.at[i-1, ')}) and ({left_operand}) > ({right_operand}))"
+            else:
+                condition_result += f"({left_operand}) {operator} ({right_operand})"
+            if condition['end_parenthesis']:
+                condition_result += ")"
+            logical_operator = condition.get('logical_operator', '')
+            if i < total_conditions - 1:
+                if logical_operator:
+                    condition_result += f" {logical_operator.replace('xor', '^')} "
+                else:
+                    raise ValueError("Logical operator is required between conditions")
+        if condition_result.count(':') or [w for w in re.findall(r'\b[a-zA-Z][a-zA-Z0-9_]*\b', condition_result) if w not in set(columns + ['min', 'max', 'abs', 'crossunder', 'crossabove', 'and', 'or', 'c', 'at', 'i'])]:
+            raise ValueError("Invalid condition syntax in conditions")
+        if condition_result.count('(') != condition_result.count(')'):
+            raise ValueError("Unmatched parentheses in conditions")
+
+        orders_result = ""
+        for order in order_condition['orders']:
+            orders_result += f"make_order('{order['type']}'"
+            if order['type'] != "cancel_all_open_orders":
+                orders_result += f", '{order['side']}', {order['amount']}"
+                if order['type'] != "market":
+                    orders_result += f", {order['price']}"
+            orders_result += ")\n"
+        for old, new in replacements:
+            orders_result = orders_result.replace(old, new)
+        if ':' in orders_result or [w for w in re.findall(r'\b[a-zA-Z][a-zA-Z0-9_]*\b', orders_result) if w not in set(columns + ['min', 'max', 'abs', 'make_order', 'market', 'limit', 'buy', 'sell', 'c', 'at', 'i'])]:
+            raise ValueError(f"Invalid condition syntax in orders")
+        sources.append((condition_result, orders_result))
+    return sources
+
+def legacy_backtest(c, sources, initial_tradable_value, leverage, maker_fee, taker_fee, symbol):
+    # The DataFrame backtest loop of execute_strategy before the array engine, kept as the golden reference
+    trades_df = pd.DataFrame(columns=TRADE_COLUMNS)
+    open_orders_df = pd.DataFrame(columns=['id', 'timestamp', 'side', 'price', 'amount', 'cost'])
+    max_ever_total_unrealized_value = 0
+    min_ever_total_unrealized_value = float('inf')
+    abs_max_runup = 0
+    rel_max_runup = 0
+    abs_max_drawdown = 0
+    rel_max_drawdown = 0
+
+    def trade_calculation(type, order):
+        nonlocal open_orders_df
+        nonlocal trades_df
+        nonlocal abs_max_runup
+        nonlocal rel_max_runup
+        nonlocal abs_max_drawdown
+        nonlocal rel_max_drawdown
+        nonlocal max_ever_total_unrealized_value
+        nonlocal min_ever_total_unrealized_value
+
+        fee = taker_fee if type == "market" else maker_fee
+        last_avg_entry_price = c.at[i, 'avg_entry_price']
+        if c.at[i, 'position_amount'] * order['amount'] >= 0:
+            order_cost = abs(order['amount']) * order['price'] * (Decimal(1 / leverage) + fee)
+            if type == "market" and order_cost > c.at[i, 'remaining_tradable_value']:
+                order['amount'] = c.at[i, 'remaining_tradable_value'] / order['price'] / (Decimal(1 / leverage) + fee) * order['amount'] / abs(order['amount'])
+                order_cost = c.at[i, 'remaining_tradable_value']
+            c.at[i, 'avg_entry_price'] = (c.at[i, 'avg_entry_price'] * abs(c.at[i, 'position_amount']) + order['price'] * abs(order['amount'])) / (abs(c.at[i, 'position_amount']) + abs(order['amount']))
+        else:
+            order['amount'] = min(abs(order['amount']), abs(c.at[i, 'position_amount'])) * order['amount'] / abs(order['amount'])
+            if type == 'limit':
+                c.at[i, 'position_value'] = Decimal(abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] * ((2 - order['price'] / c.at[i, 'avg_entry_price'] if c.at[i, 'position_amount'] < 0 else order['price'] / c.at[i, 'avg_entry_price']) - 1 + Decimal(1 / leverage))).quantize(Decimal('1e-20'))
+            order_cost = c.at[i, 'position_value'] * order['amount'] / c.at[i, 'position_amount'] + abs(order['amount']) * Decimal(2 * c.at[i, 'avg_entry_price'] - order['price'] if c.at[i, 'position_amount'] < 0 else order['price']) * fee
+            if Decimal(c.at[i, 'position_amount'] + order['amount']).quantize(Decimal('1e-20')) == 0:
+                c.at[i, 'avg_entry_price'] = 0
+        c.at[i, 'position_amount'] = Decimal(c.at[i, 'position_amount'] + order['amount']).quantize(Decimal('1e-20'))
+        if c.at[i, 'avg_entry_price'] > 0:
+            c.at[i, 'position_value'] = Decimal(abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] * ((2 - order['price'] / c.at[i, 'avg_entry_price'] if c.at[i, 'position_amount'] < 0 else order['price'] / c.at[i, 'avg_entry_price']) - 1 + Decimal(1 / leverage))).quantize(Decimal('1e-20'))
+        else:
+            c.at[i, 'position_value'] = 0
+        if not (type == "limit" and order_cost > 0): c.at[i, 'remaining_tradable_value'] = Decimal(c.at[i, 'remaining_tradable_value'] - order_cost).quantize(Decimal('1e-20'))
+        c.at[i, 'realized_total_value'] = abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
+        c.at[i, 'unrealized_total_value'] = c.at[i, 'position_value'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
+        abs_profit = -1 * abs(order['amount']) * last_avg_entry_price - order_cost if c.at[i, 'position_amount'] * order['amount'] <= 0 else -1 * abs(order['amount']) * Decimal(order['price']) * fee
+        rel_profit = abs_profit / initial_tradable_value * 100
+        abs_cum_profit = (trades_df['abs_cum_profit'].iloc[-1] if not trades_df.empty else 0) + abs_profit
+        rel_cum_profit = (trades_df['rel_cum_profit'].iloc[-1] if not trades_df.empty else 0) + rel_profit
+        abs_hodling_profit = initial_tradable_value * Decimal(c.at[i, 'close'] / c.at[1, 'open'] - 1)
+        rel_hodling_profit = Decimal(c.at[i, 'close'] / c.at[1, 'open'] - 1) * 100
+        max_ever_total_unrealized_value = max(max_ever_total_unrealized_value, c.at[i, 'unrealized_total_value'])
+        min_ever_total_unrealized_value = min(min_ever_total_unrealized_value, c.at[i, 'unrealized_total_value'])
+        abs_runup = c.at[i, 'unrealized_total_value'] - min_ever_total_unrealized_value
+        rel_runup = abs_runup / min_ever_total_unrealized_value * 100 if min_ever_total_unrealized_value != 0 else 0
+        abs_drawdown = c.at[i, 'unrealized_total_value'] - max_ever_total_unrealized_value
+        rel_drawdown = abs_drawdown / max_ever_total_unrealized_value * 100 if max_ever_total_unrealized_value != 0 else 0
+        new_trade = {'type': type, 'side': order['side'], 'timestamp': order['timestamp'], 'price': order['price'], 'amount': abs(order['amount']), 'cost': order_cost, 'avg_entry_price': c.at[i, 'avg_entry_price'],
+                     'abs_profit': abs_profit, 'rel_profit': rel_profit, 'abs_cum_profit': abs_cum_profit, 'rel_cum_profit': rel_cum_profit, 'abs_hodling_profit': abs_hodling_profit, 'rel_hodling_profit': rel_hodling_profit, 'abs_runup': abs_runup, 'rel_runup': rel_runup, 'abs_drawdown': abs_drawdown, 'rel_drawdown': rel_drawdown}
+        trades_df = pd.concat([trades_df, pd.DataFrame([new_trade])], ignore_index=True)
+        abs_max_runup = max(abs_max_runup, c.at[i, 'unrealized_total_value'] - min_ever_total_unrealized_value)
+        rel_max_runup = abs_max_runup / min_ever_total_unrealized_value * 100 if min_ever_total_unrealized_value != 0 else 0
+        abs_max_drawdown = min(abs_max_drawdown, c.at[i, 'unrealized_total_value'] - max_ever_total_unrealized_value)
+        rel_max_drawdown = abs_max_drawdown / max_ever_total_unrealized_value * 100 if max_ever_total_unrealized_value != 0 else 0
+
+    def make_order(type, side=None, amount=None, price=None):
+        nonlocal open_orders_df
+        nonlocal trades_df
+
+        if type == "cancel_all_open_orders":
+            c.at[i, 'remaining_tradable_value'] += Decimal(open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()).quantize(Decimal('1e-20'))
+            open_orders_df = open_orders_df.iloc[0:0]
+            c.at[i, 'realized_total_value'] = abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] + c.at[i, 'remaining_tradable_value']
+            c.at[i, 'unrealized_total_value'] = c.at[i, 'position_value'] + c.at[i, 'remaining_tradable_value']
+            return
+
+        if ':' not in symbol and side == 'sell' and c.at[i, 'position_amount'] == 0: return
+        if amount == 0: return
+        if type == 'market':
+            price = c.at[i, 'close']
+            fee = taker_fee
+        else:
+            fee = maker_fee
+            if price <= 0: return
+        order_id = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(15))
+        order_timestamp = c.at[i, 'timestamp']
+        amount = abs(amount)
+        order_amount = amount if side == 'buy' else -1 * amount
+        order_price = price
+
+        order = {'id': order_id, 'timestamp': order_timestamp, 'side': side, 'amount': order_amount, 'price': Decimal(order_price)}
+        if c.at[i, 'position_amount'] * order['amount'] >= 0 and c.at[i, 'remaining_tradable_value'] == 0: return
+        if type == 'market':
+            trade_calculation(type, order)
+        else:
+            order['cost'] = abs(order['amount']) * order['price'] * (Decimal(1 / leverage) + maker_fee) if c.at[i, 'position_amount'] * order['amount'] >= 0 else c.at[i, 'position_value'] * order['amount'] / c.at[i, 'position_amount'] + abs(order['amount']) * Decimal(2 * c.at[i, 'avg_entry_price'] - order['price'] if c.at[i, 'position_amount'] < 0 else order['price']) * maker_fee
+            if order['cost'] > 0:
+                if order['cost'] > c.at[i, 'remaining_tradable_value']:
+                    order['amount'] = c.at[i, 'remaining_tradable_value'] / order['price'] / (Decimal(1 / leverage) + maker_fee) * order['amount'] / abs(order['amount'])
+                    order['cost'] = c.at[i, 'remaining_tradable_value']
+                c.at[i, 'remaining_tradable_value'] = Decimal(c.at[i, 'remaining_tradable_value'] - order['cost']).quantize(Decimal('1e-20'))
+            open_orders_df = pd.concat([open_orders_df, pd.DataFrame([order])], ignore_index=True)
+            c.at[i, 'realized_total_value'] = abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
+            c.at[i, 'unrealized_total_value'] = c.at[i, 'position_value'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
+
+    for i in c.index:
+        if i == 0:
+            c.at[i, 'position_amount'] = 0
+            c.at[i, 'avg_entry_price'] = 0
+            c.at[i, 'remaining_tradable_value'] = initial_tradable_value
+        else:
+            c.at[i, 'position_amount'] = c.at[i-1, 'position_amount']
+            c.at[i, 'avg_entry_price'] = c.at[i-1, 'avg_entry_price']
+            c.at[i, 'remaining_tradable_value'] = c.at[i-1, 'remaining_tradable_value']
+        if c.at[i, 'avg_entry_price'] > 0:
+            c.at[i, 'position_value'] = Decimal(abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] * Decimal((2 - c.at[i, 'close'] / c.at[i, 'avg_entry_price'] if c.at[i, 'position_amount'] < 0 else Decimal(c.at[i, 'close']) / c.at[i, 'avg_entry_price']) - 1 + Decimal(1 / leverage))).quantize(Decimal('1e-20'))
+        else:
+            c.at[i, 'position_value'] = 0
+        if c.at[i, 'position_value'] < 0:
+            c.at[i, 'position_value'] = 0
+            c.at[i, 'position_amount'] = 0
+            c.at[i, 'avg_entry_price'] = 0
+        c.at[i, 'realized_total_value'] = abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
+        c.at[i, 'unrealized_total_value'] = c.at[i, 'position_value'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
+        max_ever_total_unrealized_value = max(max_ever_total_unrealized_value, c.at[i, 'unrealized_total_value'])
+        min_ever_total_unrealized_value = min(min_ever_total_unrealized_value, c.at[i, 'unrealized_total_value'])
+        abs_max_runup = max(abs_max_runup, c.at[i, 'unrealized_total_value'] - min_ever_total_unrealized_value)
+        rel_max_runup = abs_max_runup / min_ever_total_unrealized_value * 100 if min_ever_total_unrealized_value != 0 else 0
+        abs_max_drawdown = min(abs_max_drawdown, c.at[i, 'unrealized_total_value'] - max_ever_total_unrealized_value)
+        rel_max_drawdown = abs_max_drawdown / max_ever_total_unrealized_value * 100 if max_ever_total_unrealized_value != 0 else 0
+        if i == 0:
+            continue
+        orders_to_drop = []
+        for open_order in open_orders_df.itertuples():
+            if open_order.side == 'buy' and c.at[i, 'low'] <= open_order.price or open_order.side == 'sell' and c.at[i, 'high'] >= open_order.price:
+                trade_calculation('limit', {'id': open_order.id, 'timestamp': c.at[i, 'timestamp'], 'side': open_order.side, 'amount': open_order.amount, 'price': Decimal(open_order.price)})
+                orders_to_drop.append(open_order.Index)
+        open_orders_df = open_orders_df.drop(orders_to_drop).reset_index(drop=True)
+        for condition_result, orders_result in sources:
+            try:
+                if eval(condition_result):
+                    exec(orders_result)
+            except Exception as e:
+                raise ValueError("Error evaluating condition or order")
+    return trades_df, (abs_max_runup, rel_max_runup, abs_max_drawdown, rel_max_drawdown)
+
+def numeric_difference(exact, native):
+    # Largest relative difference over trade values and extremes, relative to at least 1
+    exact_values = np.array(exact.trades_frame()[VALUE_COLUMNS].to_numpy(), dtype=np.float64)
+    native_values = np.array(native.trades_frame()[VALUE_COLUMNS].to_numpy(), dtype=np.float64)
+    error = np.max(np.abs(exact_values - native_values) / np.maximum(np.abs(exact_values), 1), initial=0)
+    return max(error, *[abs(float(a) - float(b)) / max(abs(float(a)), 1) for a, b in zip(exact.extremes(), native.extremes())])
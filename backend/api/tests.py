@@ -1,3 +1,673 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from decimal import Decimal, DefaultContext, localcontext
+from types import SimpleNamespace
+from unittest import mock
+import ccxt
+import numpy as np
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .backfill import fetch_page, fetch_range
+from .backtest import STATE_COLUMNS, Backtest, OrderBook
+from .cancellation import Cancellation, cancel_execution, cancel_key, events
+from .candlecache import CandleArrayCache
+from .candles import CandleSeries, _stream_ids, candle_cache, candle_values, contiguous_ranges, coverage_token, fetch_candle_values, read_candle_series, record_coverage, store_candles, sync_candles
+from .conditions import OrderRules
+from .etags import candles_etag, set_cache_headers
+from .exchanges import ExchangePool, clone_exchange, market_metadata
+from .indicatorcache import indicator_series, invalidate_indicator_tail
+from .indicators import INDICATORS
+from .models import Candle, CandleCoverage, CandleStream, Strategy, User
+from .partitions import create_month_partition, month_start, scanned_partitions, to_ms
+from .serializers import CandleSerializer
+from .singleflight import single_flight
+from .testing import BACKTEST_CONDITIONS, backtest_frame, legacy_backtest, legacy_order_condition_sources, numeric_difference
+from .timeframes import closed_until, timeframe_to_ms
+from .views import IndicatorView
+
+MINUTE = 60000
+
+class FakeOHLCVExchange:
+    # Serves one candle per timeframe from first to last, later pages come back empty
+    def __init__(self, first, last):
+        self.name = 'fake'
+        self.rateLimit = 0
+        self.first = first
+        self.last = last
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        step = timeframe_to_ms(timeframe)
+        start = max(self.first, -(-(since + 1) // step) * step)
+        return [[t, 1.0, 2.0, 0.5, 1.5, 10.0] for t in range(start, self.last + 1, step)][:limit]
+
+def fake_build(exchange_name, credentials):
+    return SimpleNamespace(name=exchange_name, credentials=credentials)
+
+class ExchangePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = ExchangePool(ttl=60)
+        patcher = mock.patch.object(self.pool, '_build', side_effect=fake_build)
+        self.build = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_instance_per_credentials(self):
+        first = self.pool.get('binance', {'api_key': 'a'}, owner=1)
+        self.assertIs(self.pool.get('binance', {'api_key': 'a'}, owner=1), first)
+        self.assertIsNot(self.pool.get('binance', {'api_key': 'b'}, owner=2), first)
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_expired_entries_are_rebuilt(self):
+        with mock.patch('api.exchanges.time.monotonic', return_value=0):
+            first = self.pool.get('binance', {})
+        with mock.patch('api.exchanges.time.monotonic', return_value=61):
+            self.assertIsNot(self.pool.get('binance', {}), first)
+
+    def test_invalidate_drops_owner_instance(self):
+        first = self.pool.get('binance', {'api_key': 'a'}, owner=1)
+        public = self.pool.get('binance', {})
+        self.pool.invalidate('binance', 1)
+        self.assertIsNot(self.pool.get('binance', {'api_key': 'a'}, owner=1), first)
+        self.assertIs(self.pool.get('binance', {}), public)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MarketMetadataTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('api.exchanges.markets_refresher')
+        self.refresher = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unknown_exchange_is_rejected_untracked(self):
+        with self.assertRaises(ValueError):
+            market_metadata('not-an-exchange')
+        self.refresher.track.assert_not_called()
+
+    def test_failed_load_is_not_tracked(self):
+        with mock.patch('api.exchanges.refresh_markets', side_effect=ccxt.NetworkError):
+            with self.assertRaises(ccxt.NetworkError):
+                market_metadata('binance')
+        self.refresher.track.assert_not_called()
+
+    def test_loaded_exchange_is_tracked(self):
+        with mock.patch('api.exchanges.refresh_markets', return_value={'markets': {}}):
+            market_metadata('binance')
+        self.refresher.track.assert_called_once_with('binance')
+
+class CloneExchangeTests(SimpleTestCase):
+    def test_clone_is_a_separate_instance_sharing_markets(self):
+        exchange = ccxt.binance({})
+        exchange.set_markets({'BTC/USDT': {'id': 'BTCUSDT', 'symbol': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'baseId': 'BTC', 'quoteId': 'USDT', 'spot': True, 'type': 'spot', 'precision': {}, 'limits': {}}})
+        exchange.precisionMode = ccxt.TICK_SIZE
+        exchange.roundingMode = ccxt.TRUNCATE
+        exchange.name = 'binance'
+        exchange.pool_credentials = {}
+        clone = clone_exchange(exchange)
+        self.assertIsNot(clone, exchange)
+        self.assertIs(clone.markets, exchange.markets)
+        self.assertEqual(clone.name, 'binance')
+        self.assertIsNot(clone_exchange(clone), clone)
+
+    def test_unpooled_instances_are_returned_as_is(self):
+        exchange = FakeOHLCVExchange(0, 0)
+        self.assertIs(clone_exchange(exchange), exchange)
+
+class BackfillCoverageTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('api.backfill.exchange_catalog.capabilities', return_value={'ohlcv_page_size': 100})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_complete_page_covers_its_span(self):
+        rows, fetched_end = fetch_page(FakeOHLCVExchange(0, 1000 * MINUTE), 'X', '1m', MINUTE, 0, 100 * MINUTE - 1, 100)
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(fetched_end, 100 * MINUTE - 1)
+
+    def test_page_stopping_early_covers_only_received_candles(self):
+        rows, fetched_end = fetch_page(FakeOHLCVExchange(0, 49 * MINUTE), 'X', '1m', MINUTE, 0, 100 * MINUTE - 1, 100)
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(fetched_end, 50 * MINUTE - 1)
+
+    def test_empty_pages_are_not_covered(self):
+        rows, fetched = fetch_range(FakeOHLCVExchange(0, 149 * MINUTE), 'X', '1m', 0, 300 * MINUTE - 1, MINUTE)
+        self.assertEqual(len(rows), 150)
+        self.assertEqual(fetched, [(0, 100 * MINUTE - 1), (100 * MINUTE, 150 * MINUTE - 1)])
+
+    def test_contiguous_ranges_split_on_gaps(self):
+        timestamps = [0, MINUTE, 2 * MINUTE, 10 * MINUTE, 11 * MINUTE]
+        self.assertEqual(contiguous_ranges(timestamps, MINUTE), [(0, 3 * MINUTE - 1), (10 * MINUTE, 12 * MINUTE - 1)])
+        self.assertEqual(contiguous_ranges([], MINUTE), [])
+
+def random_walk_candles(count, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    high = close + rng.uniform(0, 1, count)
+    low = close - rng.uniform(0, 1, count)
+    return CandleSeries.from_rows(np.column_stack([np.arange(count) * MINUTE, close + rng.normal(0, 0.3, count), high, low, close, rng.uniform(1, 100, count)]))
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IndicatorTailTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def series(self, indicators, timestamp_start, timestamp_end):
+        candles = CandleSeries(self.candles.values()[:, self.candles.timestamp <= timestamp_end])
+        load_candles = mock.Mock(side_effect=candles.since)
+        result = indicator_series('fake', 'X', '1m', MINUTE, 'token', indicators, timestamp_start, timestamp_end, load_candles)
+        return result, load_candles.call_args[0][0]
+
+    def test_tail_matches_full_recomputation(self):
+        self.candles = random_walk_candles(5000)
+        indicators = [(name, INDICATORS[name], params) for name, params in [
+            ('EMA', [{'key': 'length', 'value': 30}]),
+            ('RSI', []),
+            ('MACD', [{'key': 'fast_period', 'value': 5}, {'key': 'slow_period', 'value': 35}, {'key': 'signal_period', 'value': 5}]),
+            ('ATR', [{'key': 'length', 'value': 7}]),
+            ('OBV', []),
+            ('AD', []),
+            ('SAR', []),
+        ]]
+        start, middle, end = 100 * MINUTE, 4900 * MINUTE, 4999 * MINUTE
+        self.series(indicators, start, middle)
+        tails, candles_start = self.series(indicators, start, end)
+        # Only the warm-up of the slowest smoothed spec and the path dependent SAR reach back before the tail
+        self.assertEqual(candles_start, start - INDICATORS['SAR'].lookback([]) * MINUTE)
+        for (name, spec, params), (timestamps, outputs) in zip(indicators, tails):
+            window = self.candles.since(start - spec.lookback(params) * MINUTE)
+            expected = spec.compute(params, window)
+            mask = (window.timestamp >= start) & (window.timestamp <= end)
+            np.testing.assert_array_equal(timestamps, window.timestamp[mask])
+            for output, values in outputs.items():
+                np.testing.assert_allclose(values, expected[output][mask], rtol=1e-9, atol=1e-9, err_msg=name)
+
+    def test_smoothed_tail_loads_a_bounded_window(self):
+        self.candles = random_walk_candles(5000)
+        indicators = [('EMA', INDICATORS['EMA'], []), ('OBV', INDICATORS['OBV'], [])]
+        self.series(indicators, 100 * MINUTE, 4900 * MINUTE)
+        _, candles_start = self.series(indicators, 100 * MINUTE, 4999 * MINUTE)
+        self.assertEqual(candles_start, 4900 * MINUTE + 1 - INDICATORS['EMA'].warmup([]) * MINUTE)
+
+    def test_entry_written_by_a_syncing_load_is_reused(self):
+        candles = random_walk_candles(500)
+        def load_candles(timestamp_start):
+            # Syncing stores the missing candles, which logs a write for the stream
+            invalidate_indicator_tail('fake', 'X', '1m', 0)
+            return candles.since(timestamp_start)
+        load_candles = mock.Mock(side_effect=load_candles)
+        indicators = [('EMA', INDICATORS['EMA'], [])]
+        results = [indicator_series('fake', 'X', '1m', MINUTE, 'token', indicators, 100 * MINUTE, 499 * MINUTE, load_candles) for _ in range(3)]
+        self.assertEqual(load_candles.call_count, 1)
+        for [(timestamps, outputs)] in results[1:]:
+            np.testing.assert_array_equal(timestamps, results[0][0][0])
+            np.testing.assert_array_equal(outputs['ema'], results[0][0][1]['ema'])
+
+def scaled_params(spec, scale):
+    return [{'key': param.key, 'value': max(2, round(param.default * scale)) if param.cast is int else param.default * scale} for param in spec.params if param.talib]
+
+class StreamingIndicatorTests(SimpleTestCase):
+    def assert_stream_matches_talib(self, short_name, params, candles):
+        spec = INDICATORS[short_name]
+        expected = spec.compute(params, candles)
+        stream = spec.start_stream(params)
+        streamed = np.array([stream.update(*bar) for bar in zip(candles.open, candles.high, candles.low, candles.close, candles.volume)], dtype=np.float64).reshape(len(candles), -1).T
+        for output, values in zip(spec.outputs, streamed):
+            message = f"{short_name} {output} {params}"
+            # The warm-up boundary has to match exactly, NaN for NaN
+            np.testing.assert_array_equal(np.isnan(values), np.isnan(expected[output]), err_msg=message)
+            np.testing.assert_allclose(values, expected[output], rtol=1e-9, atol=1e-9, err_msg=message)
+
+    def test_streams_match_talib(self):
+        candles = random_walk_candles(1500, seed=1)
+        for short_name, spec in INDICATORS.items():
+            if spec.stream is None:
+                continue
+            for scale in (0.5, 1, 3):
+                self.assert_stream_matches_talib(short_name, scaled_params(spec, scale), candles)
+
+    def test_streams_match_talib_on_flat_prices(self):
+        # Rounded prices hit the equal high/low and unchanged close branches
+        candles = random_walk_candles(600, seed=2)
+        candles = CandleSeries(np.vstack([candles.timestamp, *(np.round(getattr(candles, column) / 5) for column in ['open', 'high', 'low', 'close']), candles.volume]))
+        for short_name, spec in INDICATORS.items():
+            if spec.stream is not None:
+                self.assert_stream_matches_talib(short_name, scaled_params(spec, 1), candles)
+
+    def test_series_shorter_than_warmup_stays_nan(self):
+        candles = random_walk_candles(20, seed=3)
+        for short_name, spec in INDICATORS.items():
+            if spec.stream is not None:
+                self.assert_stream_matches_talib(short_name, scaled_params(spec, 3), candles)
+
+CANCEL_ALL = {'type': 'cancel_all_open_orders'}
+
+def legacy_sources(order_conditions, columns):
+    # The legacy compiler rewrote the 'open' inside cancel_all_open_orders, so cancels are given the call it meant to emit
+    sources = legacy_order_condition_sources([{**rule, 'orders': [order for order in rule['orders'] if order != CANCEL_ALL]} for rule in order_conditions], columns)
+    return [(condition, "make_order('cancel_all_open_orders')\n" if CANCEL_ALL in rule['orders'] else orders) for rule, (condition, orders) in zip(order_conditions, sources)]
+
+class BacktestEngineTests(SimpleTestCase):
+    def assert_matches_legacy(self, symbol, spot, order_conditions=BACKTEST_CONDITIONS):
+        c = backtest_frame(200)
+        columns = c.columns.difference(['timestamp']).tolist()
+        arguments = (Decimal('1000'), 2, Decimal('0.001'), Decimal('0.002'))
+        # Executions run in their own thread, which starts from the default decimal context
+        with localcontext(DefaultContext):
+            legacy_trades, legacy_extremes = legacy_backtest(c.copy(), legacy_sources(order_conditions, columns), *arguments, symbol)
+            backtest = Backtest({column: c[column].to_numpy() for column in columns + ['timestamp'] if column not in STATE_COLUMNS}, OrderRules(order_conditions, columns, STATE_COLUMNS), *arguments, spot=spot)
+            backtest.run()
+        self.assertGreater(len(legacy_trades), 0)
+        self.assertEqual(backtest.trades_frame().to_dict(orient='records'), legacy_trades.to_dict(orient='records'))
+        self.assertEqual(backtest.extremes(), legacy_extremes)
+
+    def test_futures_match_legacy_loop(self):
+        self.assert_matches_legacy('BENCH/USDT:USDT', spot=False)
+
+    def test_spot_matches_legacy_loop(self):
+        self.assert_matches_legacy('BENCH/USDT', spot=True)
+
+    def test_cancelled_orders_match_legacy_loop(self):
+        cancel = {'conditions': [{'start_parenthesis': False, 'left_operand': 'MOM_10', 'operator': '<', 'right_operand': '-0.5', 'end_parenthesis': False, 'logical_operator': ''}],
+                  'orders': [CANCEL_ALL]}
+        # Cancels run both before and after the limit orders placed on the same candle
+        self.assert_matches_legacy('BENCH/USDT:USDT', spot=False, order_conditions=[cancel] + BACKTEST_CONDITIONS + [cancel])
+
+    def test_float_backend_within_tolerance_of_decimal(self):
+        c = backtest_frame(2000)
+        columns = c.columns.difference(['timestamp']).tolist()
+        rules = OrderRules(BACKTEST_CONDITIONS, columns, STATE_COLUMNS)
+        results = {}
+        with localcontext(DefaultContext):
+            for numeric in ['decimal', 'float']:
+                results[numeric] = Backtest({column: c[column].to_numpy() for column in columns + ['timestamp'] if column not in STATE_COLUMNS}, rules, Decimal('1000'), 2, Decimal('0.001'), Decimal('0.002'), spot=False, numeric=numeric)
+                results[numeric].run()
+        exact, native = results['decimal'].trades_frame(), results['float'].trades_frame()
+        self.assertGreater(len(exact), 0)
+        self.assertEqual(native[['type', 'side', 'timestamp']].to_dict('records'), exact[['type', 'side', 'timestamp']].to_dict('records'))
+        self.assertTrue(all(isinstance(timestamp, (int, np.integer)) for timestamp in native['timestamp']))
+        self.assertLessEqual(numeric_difference(results['decimal'], results['float']), 1e-9)
+
+def utc_ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+class OrderBookTests(SimpleTestCase):
+    def book(self, *orders):
+        book = OrderBook()
+        for side, price, cost in orders:
+            book.add({'side': side, 'price': Decimal(price), 'cost': Decimal(cost)})
+        return book
+
+    def test_fills_touching_orders_of_both_sides_in_placement_order(self):
+        book = self.book(('sell', '105', '1'), ('buy', '99', '2'), ('buy', '95', '3'), ('sell', '110', '4'), ('buy', '100', '5'), ('sell', '104', '-1'))
+        self.assertEqual([sequence for sequence, _ in book.fills(Decimal('99'), Decimal('105'))], [1, 2, 5, 6])
+        self.assertEqual([order['price'] for _, order in book.fills(Decimal('94'), Decimal('103'))], [Decimal('99'), Decimal('95'), Decimal('100')])
+        self.assertEqual(book.fills(Decimal('101'), Decimal('103')), [])
+
+    def test_equal_prices_fill_in_placement_order(self):
+        book = self.book(('buy', '100', '1'), ('buy', '100', '2'), ('buy', '101', '3'))
+        book.remove([1])
+        book.add({'side': 'buy', 'price': Decimal('100'), 'cost': Decimal('4')})
+        self.assertEqual([sequence for sequence, _ in book.fills(Decimal('100'), Decimal('100'))], [2, 3, 4])
+
+    def test_removed_orders_leave_the_book_and_its_committed_cost(self):
+        book = self.book(('buy', '99', '2'), ('sell', '105', '-1'), ('sell', '106', '3'))
+        self.assertEqual(book.committed(), Decimal('5'))
+        book.remove([sequence for sequence, _ in book.fills(Decimal('98'), Decimal('105'))])
+        self.assertEqual(len(book), 1)
+        self.assertEqual(book.committed(), Decimal('3'))
+        self.assertEqual([sequence for sequence, _ in book.fills(Decimal('0'), Decimal('200'))], [3])
+
+    def test_cleared_book_keeps_numbering_later_orders(self):
+        book = self.book(('buy', '99', '2'), ('sell', '105', '1'))
+        book.clear()
+        self.assertEqual((len(book), book.committed(), book.fills(Decimal('0'), Decimal('200'))), (0, 0, []))
+        book.add({'side': 'sell', 'price': Decimal('101'), 'cost': Decimal('1')})
+        self.assertEqual([sequence for sequence, _ in book.fills(Decimal('0'), Decimal('200'))], [3])
+
+def order_condition(left_operand, operator='>', right_operand='0', orders=()):
+    return {'conditions': [{'start_parenthesis': False, 'left_operand': left_operand, 'operator': operator, 'right_operand': right_operand, 'end_parenthesis': False, 'logical_operator': ''}], 'orders': list(orders)}
+
+class OrderRulesTests(SimpleTestCase):
+    columns = ['close', 'close_2', 'position_amount']
+
+    def assert_rejected(self, *operands):
+        for operand in operands:
+            with self.subTest(operand=operand):
+                with self.assertRaisesMessage(ValueError, "Invalid condition syntax in conditions"):
+                    OrderRules([order_condition(operand)], self.columns, STATE_COLUMNS)
+                with self.assertRaisesMessage(ValueError, "Invalid condition syntax in orders"):
+                    OrderRules([order_condition('close', orders=[{'type': 'market', 'side': 'buy', 'amount': operand}])], self.columns, STATE_COLUMNS)
+
+    def mask(self, rules, vectors):
+        [(test, _)] = rules.bind(vectors, lambda column, i: vectors[column][i] if column in vectors else 0, len(vectors['close']))
+        return np.array([bool(test(i)) for i in range(1, len(vectors['close']))])
+
+    def test_only_min_max_and_abs_calls_are_accepted(self):
+        OrderRules([order_condition('max(close, close_2, 1) - min(close, 2) + abs(-close)')], self.columns, STATE_COLUMNS)
+        self.assert_rejected("__import__('os')", 'len(close)', 'round(close)', 'eval(close)', 'max(close)', 'abs(close, 1)', 'max(close, key=abs)', 'max(*close)')
+
+    def test_attributes_subscripts_non_numeric_constants_and_unknown_names_are_rejected(self):
+        self.assert_rejected('close.real', 'close.__class__', 'close[0]', 'close[1:]', "'1'", 'True', 'None', 'volume', 'c', 'close_22', 'lambda: 0', 'close if close else 0', 'close == 1', 'close and 1')
+
+    def test_longer_column_names_are_substituted_first(self):
+        vectors = {'close': np.array([1., 2., 3.]), 'close_2': np.array([3., 2., 1.])}
+        rules = OrderRules([order_condition('close_2', '>', 'close')], self.columns, STATE_COLUMNS)
+        np.testing.assert_array_equal(self.mask(rules, vectors), [False, False])
+        rules = OrderRules([order_condition('close_2', '<', 'close * 2')], self.columns, STATE_COLUMNS)
+        np.testing.assert_array_equal(self.mask(rules, vectors), [True, True])
+
+    def test_cross_masks_match_the_scalar_path(self):
+        rng = np.random.default_rng(5)
+        vectors = {'close': rng.normal(0, 1, 300), 'close_2': rng.normal(0, 1, 300)}
+        vectors['close_2'][rng.choice(300, 20, replace=False)] = np.nan
+        for operator in ['crossabove', 'crossunder']:
+            with self.subTest(operator=operator):
+                # Adding a state column keeps the same values but evaluates them per candle
+                vectorized = OrderRules([order_condition('close', operator, 'close_2')], self.columns, STATE_COLUMNS)
+                scalar = OrderRules([order_condition('close + position_amount', operator, 'close_2')], self.columns, STATE_COLUMNS)
+                expected = self.mask(scalar, vectors)
+                self.assertTrue(expected.any())
+                np.testing.assert_array_equal(self.mask(vectorized, vectors), expected)
+
+class ClosedUntilTests(SimpleTestCase):
+    def test_forming_month_is_open_on_the_31st(self):
+        now = utc_ms(2026, 10, 31, 12)
+        self.assertEqual(closed_until('1M', now), utc_ms(2026, 10, 1) - 1)
+        self.assertLess(closed_until('1M', now), utc_ms(2026, 10, 1))
+        self.assertGreaterEqual(closed_until('1M', now), utc_ms(2026, 9, 1))
+
+    def test_forming_year_is_open_on_leap_year_end(self):
+        now = utc_ms(2024, 12, 31, 23)
+        self.assertEqual(closed_until('1y', now), utc_ms(2024, 1, 1) - 1)
+
+    def test_multi_month_periods_follow_the_calendar(self):
+        self.assertEqual(closed_until('3M', utc_ms(2026, 5, 20)), utc_ms(2026, 4, 1) - 1)
+
+    def test_fixed_timeframes_close_after_their_length(self):
+        self.assertEqual(closed_until('1h', 10 * 3600000), 9 * 3600000)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CandleEtagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fully_covered_closed_range_is_immutable(self):
+        record_coverage('fake', 'X', '1m', 0, 100 * MINUTE - 1)
+        etag = candles_etag('fake', 'X', '1m', 0, 99 * MINUTE, 'json')
+        self.assertIsNotNone(etag)
+        response = set_cache_headers(HttpResponse(), etag)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_closed_range_with_gaps_is_not_cached(self):
+        record_coverage('fake', 'X', '1m', 0, 40 * MINUTE - 1)
+        record_coverage('fake', 'X', '1m', 50 * MINUTE, 100 * MINUTE - 1)
+        etag = candles_etag('fake', 'X', '1m', 0, 99 * MINUTE, 'json')
+        self.assertIsNone(etag)
+        response = set_cache_headers(HttpResponse(), etag)
+        self.assertNotIn('ETag', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SINGLE_FLIGHT_LOCK_TIMEOUT=1, SINGLE_FLIGHT_WAIT_TIMEOUT=10, SINGLE_FLIGHT_POLL_INTERVAL=0.05
+)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_leader_outliving_its_lease_runs_once(self):
+        calls, started = [], threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            # Longer than the lease, which only holds because the leader renews it
+            time.sleep(2.5)
+            return 'rows'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight('range', fetch)))
+        leader.start()
+        started.wait()
+        waiter = threading.Thread(target=lambda: results.append(single_flight('range', fetch)))
+        waiter.start()
+        leader.join()
+        waiter.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['rows', 'rows'])
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, EXECUTION_CANCEL_POLL_INTERVAL=0.05)
+class CancellationTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cancel_sets_the_local_event_and_the_shared_key(self):
+        with Cancellation(7) as cancelled:
+            self.assertFalse(cancelled())
+            cancel_execution(7)
+            self.assertTrue(cancelled.event.is_set())
+            self.assertEqual(cache.get(cancel_key(7)), 1)
+            self.assertTrue(cancelled())
+        self.assertNotIn('7', events)
+
+    def test_execution_on_another_worker_stops_on_its_next_poll(self):
+        with Cancellation(8) as cancelled:
+            self.assertFalse(cancelled())
+            # The stop request landed on another worker, only the shared key is set here
+            cache.set(cancel_key(8), 1)
+            start = time.monotonic()
+            self.assertTrue(cancelled.wait(10))
+            self.assertLess(time.monotonic() - start, 1)
+
+    def test_running_loop_stops(self):
+        with Cancellation(9) as cancelled:
+            waiting = threading.Thread(target=cancelled.wait, args=(60,))
+            waiting.start()
+            cancel_execution(9)
+            waiting.join(timeout=5)
+            self.assertFalse(waiting.is_alive())
+
+    def test_running_backtest_stops(self):
+        c = backtest_frame(200)
+        columns = c.columns.difference(['timestamp']).tolist()
+        polls = []
+        with Cancellation(10) as cancelled:
+            def should_stop():
+                polls.append(1)
+                if len(polls) == 50:
+                    cancel_execution(10)
+                return cancelled()
+            with localcontext(DefaultContext):
+                backtest = Backtest({column: c[column].to_numpy() for column in columns + ['timestamp'] if column not in STATE_COLUMNS}, OrderRules(BACKTEST_CONDITIONS, columns, STATE_COLUMNS), Decimal('1000'), 2, Decimal('0.001'), Decimal('0.002'), spot=False, should_stop=should_stop)
+                self.assertFalse(backtest.run())
+        self.assertEqual(len(polls), 50)
+        self.assertEqual(backtest.i, 48)
+
+def segment(start, count):
+    return np.vstack([np.arange(start, start + count, dtype=np.float64) * MINUTE] + [np.ones(count)] * 5)
+
+class CandleArrayCacheTests(SimpleTestCase):
+    def test_least_recently_used_stream_is_evicted(self):
+        cache_ = CandleArrayCache(max_bytes=2 * segment(0, 10).nbytes)
+        for key in ['a', 'b']:
+            cache_.put(key, 0, 9 * MINUTE, segment(0, 10), 'token')
+        self.assertIsNotNone(cache_.get('a', 0, 9 * MINUTE, 'token'))
+        cache_.put('c', 0, 9 * MINUTE, segment(0, 10), 'token')
+        self.assertIsNone(cache_.get('b', 0, 9 * MINUTE, 'token'))
+        self.assertIsNotNone(cache_.get('a', 0, 9 * MINUTE, 'token'))
+        self.assertEqual(cache_.stats()['evictions'], 1)
+
+    def test_invalidate_drops_only_overlapping_segments(self):
+        cache_ = CandleArrayCache(max_bytes=10 ** 6)
+        cache_.put('a', 0, 9 * MINUTE, segment(0, 10), 'token')
+        cache_.put('a', 20 * MINUTE, 29 * MINUTE, segment(20, 10), 'token')
+        cache_.invalidate('a', 5 * MINUTE, 5 * MINUTE)
+        self.assertIsNone(cache_.get('a', 0, 9 * MINUTE, 'token'))
+        self.assertIsNotNone(cache_.get('a', 20 * MINUTE, 29 * MINUTE, 'token'))
+
+    def test_new_coverage_token_drops_the_stream(self):
+        cache_ = CandleArrayCache(max_bytes=10 ** 6)
+        cache_.put('a', 0, 9 * MINUTE, segment(0, 10), 'token')
+        self.assertIsNone(cache_.get('a', 0, 9 * MINUTE, 'other'))
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StrategyIndicatorsViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='password')
+        indicators = [{'id': 'a', 'short_name': 'SMA'}, {'id': 'b', 'short_name': 'MACD'}, {'id': 'c', 'short_name': 'RSI'}, {'id': 'd', 'short_name': 'OBV'}]
+        self.strategy = Strategy.objects.create(user=self.owner, exchange='fake', symbol='X', timeframe='1m', indicators=json.dumps(indicators))
+        candles = random_walk_candles(500)
+        patches = [
+            mock.patch('api.views.Exchange', return_value=SimpleNamespace(name='fake')),
+            mock.patch('api.views.CandleView.get_candle_series', side_effect=lambda **kwargs: candles.since(kwargs['timestamp_start'])),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse('strategy-indicators', args=[self.strategy.id]), {'timestamp_start': 100 * MINUTE, 'timestamp_end': 499 * MINUTE}, format='json')
+
+    def test_private_strategy_is_only_served_to_its_owner(self):
+        self.assertEqual(self.get(self.owner).status_code, 200)
+        self.assertEqual(self.get(self.other).status_code, 404)
+        Strategy.objects.filter(id=self.strategy.id).update(is_public=True)
+        self.assertEqual(self.get(self.other).status_code, 200)
+
+    def test_batch_matches_each_indicator_on_its_own(self):
+        response = self.get(self.owner)
+        self.assertEqual(response.status_code, 200)
+        times = response.data['time']
+        self.assertEqual([indicator['id'] for indicator in response.data['indicators']], ['a', 'b', 'c', 'd'])
+        for indicator in response.data['indicators']:
+            with self.subTest(indicator=indicator['short_name']):
+                cache.clear()
+                expected = IndicatorView().compute_indicator_data(self.owner, Strategy.objects.get(id=self.strategy.id), 100 * MINUTE, 499 * MINUTE, indicator['id'])
+                self.assertEqual(indicator['params'], expected['params'])
+                # The batch keeps warm-up candles as nulls, the single indicator drops them
+                records = [{'time': time_, **{key: values[k] for key, values in indicator['data'].items()}} for k, time_ in enumerate(times)]
+                self.assertEqual([record for record in records if None not in record.values()], expected['data'])
+
+class CandleSerializerTests(SimpleTestCase):
+    def test_prices_keep_decimal_string_format(self):
+        candles = CandleSeries.from_rows([[0, 0.1, 2.0, 0.5, 1.5, 10.0]])
+        self.assertEqual(CandleSerializer(candles.records(), many=True).data, [{
+            'time': 0,
+            'open': '0.100000000000000000',
+            'high': '2.000000000000000000',
+            'low': '0.500000000000000000',
+            'close': '1.500000000000000000',
+            'volume': '10.000000000000000000'
+        }])
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "The candle table needs PostgreSQL")
+class CandleTableTestCase(TestCase):
+    # Candle is unmanaged, so the test database only gets api_ohlcv from the command
+    def setUp(self):
+        call_command('create_candle_partitions', since='2020-01', months_ahead=0, stdout=io.StringIO())
+        self.table = Candle._meta.db_table
+        # Stream ids are memoized per process, the rows behind them are rolled back after each test
+        _stream_ids.clear()
+
+class CandlePartitionTests(CandleTableTestCase):
+
+    def test_bounded_range_scans_one_partition(self):
+        start, end = to_ms(month_start(2020, 3)), to_ms(month_start(2020, 4))
+        self.assertEqual(scanned_partitions(self.table, start, end), {f'{self.table}_p2020_03'})
+
+    def test_range_across_months_scans_both_partitions(self):
+        start, end = to_ms(month_start(2020, 3)) + MINUTE, to_ms(month_start(2020, 4)) + MINUTE
+        self.assertEqual(scanned_partitions(self.table, start, end), {f'{self.table}_p2020_03', f'{self.table}_p2020_04'})
+
+    def test_older_candles_fall_in_default_partition(self):
+        self.assertEqual(scanned_partitions(self.table, 0, MINUTE), {f'{self.table}_default'})
+
+    def test_missing_month_takes_its_rows_from_the_default_partition(self):
+        stream = CandleStream.objects.create(exchange='fake', symbol='X', timeframe='1m')
+        start = month_start(2020, 3)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {self.table}_p2020_03")
+            cursor.execute(f"INSERT INTO {self.table} VALUES (%s, %s, 1, 2, 0.5, 1.5, 10)", [stream.id, to_ms(start) + MINUTE])
+            self.assertTrue(create_month_partition(self.table, start, month_start(2020, 4)))
+            self.assertFalse(create_month_partition(self.table, start, month_start(2020, 4)))
+            cursor.execute(f"SELECT count(*) FROM {self.table}_default")
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute(f"SELECT count(*) FROM {self.table}_p2020_03")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(scanned_partitions(self.table, to_ms(start), to_ms(month_start(2020, 4))), {f'{self.table}_p2020_03'})
+
+HOUR = 60 * MINUTE
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, RESAMPLE_MATERIALIZE=True)
+class ResampleTests(CandleTableTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        patcher = mock.patch('api.backfill.exchange_catalog.capabilities', return_value={'ohlcv_page_size': 100})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 1m candles from 09:30 to 20:00 of a day in 2020, each opening at its minute index
+        self.day = utc_ms(2020, 3, 2)
+        first, last = self.day + 9 * HOUR + 30 * MINUTE, self.day + 20 * HOUR
+        store_candles('fake', 'X', '1m', [[t, float(t // MINUTE), t // MINUTE + 1.0, t // MINUTE - 1.0, t // MINUTE + 0.5, 1.0] for t in range(first, last + 1, MINUTE)])
+        record_coverage('fake', 'X', '1m', first, last + MINUTE - 1)
+
+    def test_range_starting_inside_a_bucket_resamples_whole_buckets_only(self):
+        exchange = FakeOHLCVExchange(0, 0)
+        sync_candles(exchange, 'X', '1h', self.day + 10 * HOUR + 5 * MINUTE, self.day + 18 * HOUR)
+        candles = read_candle_series('fake', 'X', '1h', self.day, self.day + 24 * HOUR)
+        self.assertEqual(candles.timestamp.tolist(), [self.day + hour * HOUR for hour in range(11, 19)])
+        first = (self.day + 11 * HOUR) // MINUTE
+        self.assertEqual(candles.open[0], first)
+        self.assertEqual(candles.close[0], first + 59 + 0.5)
+        self.assertEqual(candles.volume.tolist(), [60.0] * 8)
+        coverage = CandleCoverage.objects.get(exchange='fake', symbol='X', timeframe='1h', source_timeframe='1m')
+        self.assertEqual(coverage.timestamp_start, self.day + 11 * HOUR)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CandleValuesCacheTests(CandleTableTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        candle_cache.clear()
+        self.key = ('fake', 'X', '1m')
+
+    def store(self, start, count):
+        store_candles('fake', 'X', '1m', [[t, 1.0, 2.0, 0.5, 1.5, 10.0] for t in range(start * MINUTE, (start + count) * MINUTE, MINUTE)])
+        record_coverage('fake', 'X', '1m', start * MINUTE, (start + count) * MINUTE - 1)
+
+    def test_covered_range_is_cached_and_invalidated_by_stores(self):
+        self.store(0, 100)
+        self.assertEqual(len(candle_values('fake', 'X', '1m', 0, 99 * MINUTE)[0]), 100)
+        self.assertIsNotNone(candle_cache.get(self.key, 0, 99 * MINUTE, coverage_token(*self.key)))
+        store_candles('fake', 'X', '1m', [[50 * MINUTE, 1.0, 2.0, 0.5, 1.5, 10.0]])
+        self.assertIsNone(candle_cache.get(self.key, 0, 99 * MINUTE, coverage_token(*self.key)))
+
+    def test_gap_filled_during_the_read_is_not_cached(self):
+        self.store(0, 40)
+        self.store(60, 40)
+
+        def read_then_fill(*args):
+            values = fetch_candle_values(*args)
+            # A concurrent writer completes the range after the rows were read
+            self.store(40, 20)
+            return values
+
+        with mock.patch('api.candles.fetch_candle_values', side_effect=read_then_fill):
+            self.assertEqual(len(candle_values('fake', 'X', '1m', 0, 99 * MINUTE)[0]), 80)
+        self.assertIsNone(candle_cache.get(self.key, 0, 99 * MINUTE, coverage_token(*self.key)))
+        self.assertEqual(len(candle_values('fake', 'X', '1m', 0, 99 * MINUTE)[0]), 100)
@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+
+def timeframe_to_ms(timeframe):
+    # Months and years are approximated as 30 and 365 days, for sizing and spacing only
+    return int(pd.Timedelta(f"{int(timeframe[:-1]) * (30 if timeframe.endswith('M') else 365)}d" if timeframe.endswith(('M','y')) else timeframe).total_seconds() * 1000)
+
+def calendar_months(timeframe):
+    if not timeframe.endswith(('M', 'y')):
+        return 0
+    return int(timeframe[:-1]) * (12 if timeframe.endswith('y') else 1)
+
+def period_start(timestamp, months):
+    # Start of the UTC calendar period of that many months holding timestamp, counted from January
+    moment = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+    month = (moment.year * 12 + moment.month - 1) // months * months
+    return int(datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+def closed_until(timeframe, now):
+    # Every candle opening at or before this timestamp has closed by now
+    months = calendar_months(timeframe)
+    if months:
+        return period_start(now, months) - 1
+    return now - timeframe_to_ms(timeframe)
@@ -57,6 +57,7 @@ urlpatterns = [
     
     # Indicator
     path("v1/indicator/", views.IndicatorView.as_view(), name="indicator"),
+    path("v1/strategy/<uuid:pk>/indicators/", views.StrategyIndicatorsView.as_view(), name="strategy-indicators"),
     
     # Strategy Execution
     path("v1/strategy-execution/", views.StrategyExecutionView.as_view({"get": "list"}), name="strategy-execution-list"),
@@ -66,4 +67,7 @@ urlpatterns = [
     
     # Dashboard
     path('v1/dashboard-stats/', views.DashboardStatsView.as_view(), name='dashboard-stats'),
+    
+    # Metrics
+    path('v1/metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
@@ -2,11 +2,9 @@ import requests
 import secrets
 import string
 import json
-import re
 from types import SimpleNamespace
-import ccxt
+import numpy as np
 import pandas as pd
-import talib as ta
 import time
 import threading
 from decimal import Decimal, getcontext
@@ -25,17 +23,32 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from github import Github, Requester
 from github.ApplicationOAuth import ApplicationOAuth
 
-from .models import User, ApiKey, Strategy, StrategyExecution, Trade, Candle
-from .permissions import IsAuthenticated, IsNotAuthenticated, IsOwner, NoBody
+from .exchanges import Exchange, clone_exchange, exchange_catalog, market_metadata
+from .backfill import fetch_range
+from .backtest import STATE_COLUMNS, Backtest
+from .cancellation import Cancellation, cancel_execution
+from .conditions import OrderRules
+from .candles import CandleSeries, candle_cache, coverage_token, timeframe_to_ms, sync_candles, read_candle_series, delete_candles
+from .etags import candles_etag, indicator_etag, etag_matches, remember_strategy, set_cache_headers
+from .indicatorcache import indicator_series
+from .indicators import indicator_records, indicator_spec
+from .ingest import ingest_metrics
+from .models import User, ApiKey, Strategy, StrategyExecution, Trade
+from .permissions import IsAdmin, IsAuthenticated, IsNotAuthenticated, IsOwner, NoBody
+from .renderers import COLUMNAR_FORMATS, ColumnarJSONRenderer, MsgPackRenderer
 from .serializers import UserSerializer, LoginSerializer, GoogleLoginSerializer, GithubLoginSerializer, RecoverPasswordSerializer, ApiKeySerializer, StrategySerializer, CandleSerializer, StrategyExecutionSerializer
 
 getcontext().prec = 20
 
+EXECUTION_RESULT_FIELDS = ['timestamp_end', 'abs_net_profit', 'rel_net_profit', 'total_closed_trades', 'winning_trade_rate', 'profit_factor', 'abs_avg_trade_profit',
+                           'rel_avg_trade_profit', 'abs_max_run_up', 'rel_max_run_up', 'abs_max_drawdown', 'rel_max_drawdown']
+
 def set_auth_cookies(user, signup=False):
     refresh = RefreshToken.for_user(user)
     access_token = str(refresh.access_token)
@@ -70,23 +83,6 @@ def send_verification_code(email):
         send_mail(subject, message, from_email, [email])
     return Response({'detail': 'Verification code sent to your email'}, status=status.HTTP_200_OK)
 
-class Exchange:
-    def __new__(cls, exchange_name, user):
-        try:
-            api_key_instance = list(ApiKey.objects.filter(user=user, exchange=exchange_name).values('api_key', 'secret', 'password', 'uid'))
-            exchange = getattr(ccxt, exchange_name)(api_key_instance[0] if api_key_instance else {})
-            if exchange.has.get('fetchStatus'):
-                status_response = exchange.fetch_status()
-                if status_response.get('status') != 'ok':
-                    raise Exception('Exchange service unavailable')
-            exchange.load_markets()
-            exchange.precisionMode = ccxt.TICK_SIZE
-            exchange.roundingMode = ccxt.TRUNCATE
-            exchange.name = exchange_name
-            return exchange
-        except Exception:
-            raise Exception('Unable to initialize exchange')
-
 #@method_decorator(cache_page(60*15), name='dispatch')
 class UserView(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -402,7 +398,7 @@ class ExchangesView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        return Response([e for e in ccxt.exchanges if e not in {'alpaca','apex','bequant','bitmart','bitso','coinex','coinlist','coinsph','lbank','oceanex','onetrading','paradex','phemex','woofipro'} and all(getattr(ccxt, e)().has.get(m) for m in ['fetchOHLCV','fetchBalance','cancelAllOrders','createOrder','fetchOrder'])])
+        return Response(exchange_catalog.supported())
     
 class SymbolsView(APIView):
     permission_classes = [IsAuthenticated]
@@ -410,9 +406,9 @@ class SymbolsView(APIView):
     def get(self, request):
         try:
             exchange_name = request.query_params.get('exchange')
-            exchange = Exchange(exchange_name, request.user)
-            markets_data = exchange.markets.values() if exchange.markets else []
-            unavailable = exchange.options.get('unavailableContracts', {})
+            metadata = market_metadata(exchange_name)
+            markets_data = metadata['markets'].values() if metadata['markets'] else []
+            unavailable = metadata['unavailable_contracts']
             symbols = [
                 {
                     'symbol': x['symbol'],
@@ -424,7 +420,7 @@ class SymbolsView(APIView):
                     exchange_name == 'bitflyer' and x.get('symbol') == 'BTC/JPY:JPY'
                 )
             ]
-            timeframes = [x for x in list(exchange.timeframes.keys()) if exchange.timeframes[x]] if exchange.timeframes else []
+            timeframes = list(metadata['timeframes'].keys())
             return Response({ 'symbols': symbols, 'timeframes': timeframes })
         except Exception:
             return Response({'error': f"Failed to load {exchange_name} markets"}, status=status.HTTP_404_NOT_FOUND)
@@ -436,8 +432,7 @@ class MarketInfoView(APIView):
         try:
             exchange_name = request.query_params.get('exchange')
             symbol = request.query_params.get('symbol')
-            exchange = Exchange(exchange_name, request.user)
-            market = exchange.markets[symbol]
+            market = market_metadata(exchange_name)['markets'][symbol]
             
             taker_fee = market.get('taker')
             maker_fee = market.get('maker')
@@ -596,50 +591,30 @@ class StrategyView(viewsets.ModelViewSet):
 
 class CandleView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer, MsgPackRenderer]
     
-    def get_candles(self, exchange, symbol, timeframe, timestamp_start, timestamp_end, db_search=False, extra_candles=0):
+    def get_candle_series(self, exchange, symbol, timeframe, timestamp_start, timestamp_end, db_search=False, extra_candles=0):
         MAX_CANDLES = 50000
-        candles = pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        timeframe_ms = timeframe_to_ms(timeframe)
         if extra_candles > 0:
-            timeframe_ms = int(pd.Timedelta(f"{int(timeframe[:-1]) * (30 if timeframe.endswith('M') else 365)}d" if timeframe.endswith(('M','y')) else timeframe).total_seconds() * 1000)
             timestamp_start -= extra_candles * timeframe_ms
-        candles_count = int((timestamp_end - timestamp_start) // (pd.Timedelta(f"{int(timeframe[:-1]) * (30 if timeframe.endswith('M') else 365)}d" if timeframe.endswith(('M','y')) else timeframe).total_seconds() * 1000)) + 2
+        candles_count = int((timestamp_end - timestamp_start) // timeframe_ms) + 2
         if candles_count > MAX_CANDLES:
-            timeframe_ms = int(pd.Timedelta(f"{int(timeframe[:-1]) * (30 if timeframe.endswith('M') else 365)}d" if timeframe.endswith(('M','y')) else timeframe).total_seconds() * 1000)
             timestamp_start = timestamp_end - (MAX_CANDLES * timeframe_ms)
-            candles_count = MAX_CANDLES
-        if db_search:
-            candles = pd.DataFrame.from_records(Candle.objects.filter(
-                exchange=exchange.name,
-                symbol=symbol,
-                timeframe=timeframe,
-                timestamp__gte=timestamp_start,
-                timestamp__lte=timestamp_end
-            ).order_by('timestamp').values('timestamp', 'open', 'high', 'low', 'close', 'volume'))
-        if candles.empty:
-            if candles_count <= 0:
-                return candles
-            candles = pd.DataFrame(exchange.fetch_ohlcv(symbol=symbol, timeframe=timeframe, since=timestamp_start - 1, limit=candles_count), columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            candles = candles[candles['timestamp'].between(timestamp_start, timestamp_end, inclusive='both')]
-        if candles.empty:
-            Candle.objects.filter(
-                exchange=exchange.name,
-                symbol=symbol,
-                timeframe=timeframe,
-                timestamp__lt=timestamp_end
-            ).delete()
-            return candles
-        ts_start = int(candles['timestamp'].iloc[0])
-        ts_end = int(candles['timestamp'].iloc[-1])
-        if ts_start <= timestamp_start and ts_end >= timestamp_end:
-            return candles
-        if ts_start > timestamp_start:
-            new_candles = self.get_candles(exchange, symbol, timeframe, timestamp_start, ts_start - 1)
-            candles = pd.concat([candles, new_candles]).sort_values(by='timestamp', ascending=True).reset_index(drop=True)
-        if ts_end < timestamp_end:
-            new_candles = self.get_candles(exchange, symbol, timeframe, ts_end + 1, timestamp_end)
-            candles = pd.concat([candles, new_candles]).sort_values(by='timestamp', ascending=True).reset_index(drop=True)
-        return candles.drop_duplicates('timestamp')
+        if candles_count <= 0:
+            return CandleSeries.from_rows([])
+        if not db_search:
+            return CandleSeries.from_rows(fetch_range(exchange, symbol, timeframe, timestamp_start, timestamp_end, timeframe_ms)[0])
+        transient_rows = sync_candles(exchange, symbol, timeframe, timestamp_start, timestamp_end)
+        candles = read_candle_series(exchange.name, symbol, timeframe, timestamp_start, timestamp_end)
+        if transient_rows:
+            candles = candles.merge_rows(transient_rows)
+        if not len(candles):
+            delete_candles(exchange.name, symbol, timeframe, timestamp_end)
+        return candles
+    
+    def get_candles(self, *args, **kwargs):
+        return self.get_candle_series(*args, **kwargs).to_frame()
     
     def get(self, request):
         try:
@@ -655,7 +630,11 @@ class CandleView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            candles_df = self.get_candles(
+            etag = candles_etag(exchange, symbol, timeframe, timestamp_start, timestamp_end, request.accepted_renderer.format)
+            if etag_matches(request, etag):
+                return set_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+            
+            candles = self.get_candle_series(
                 exchange=Exchange(exchange, request.user),
                 symbol=symbol,
                 timeframe=timeframe,
@@ -663,47 +642,41 @@ class CandleView(APIView):
                 timestamp_end=timestamp_end,
                 db_search=True
             )
+            # Recomputed after the sync, a range is only marked immutable once it is fully stored
+            etag = candles_etag(exchange, symbol, timeframe, timestamp_start, timestamp_end, request.accepted_renderer.format)
+            if request.accepted_renderer.format in COLUMNAR_FORMATS:
+                return set_cache_headers(Response({
+                    'time': candles.timestamp.tolist(),
+                    **{col: getattr(candles, col).tolist() for col in ['open', 'high', 'low', 'close', 'volume']}
+                }, status=status.HTTP_200_OK), etag)
             
-            if candles_df.empty:
-                candles = Candle.objects.none()
-            else:
-                for col in ['open', 'high', 'low', 'close', 'volume']:
-                    candles_df[col] = candles_df[col].apply(lambda x: Decimal(str(x)))
-                records = candles_df.assign(
-                    exchange=exchange,
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp=candles_df['timestamp'].astype(int),
-                    open=candles_df['open'],
-                    high=candles_df['high'],
-                    low=candles_df['low'],
-                    close=candles_df['close'],
-                    volume=candles_df['volume']
-                ).to_dict(orient='records')
-                
-                Candle.objects.bulk_create([Candle(**row) for row in records], ignore_conflicts=True)
-
-                candles = Candle.objects.filter(
-                    exchange=exchange,
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp__gte=timestamp_start,
-                    timestamp__lte=timestamp_end
-                ).order_by('timestamp')
-            
-            serializer = CandleSerializer(candles, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer = CandleSerializer(candles.records(), many=True)
+            return set_cache_headers(Response(serializer.data, status=status.HTTP_200_OK), etag)
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class IndicatorView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer, MsgPackRenderer]
+    
+    def load_indicator_series(self, user, strategy, timestamp_start, timestamp_end, indicators):
+        exchange = Exchange(strategy.exchange, user)
+        load_candles = lambda candles_start: CandleView().get_candle_series(
+            exchange=exchange,
+            symbol=strategy.symbol,
+            timeframe=strategy.timeframe,
+            timestamp_start=candles_start,
+            timestamp_end=timestamp_end,
+            db_search=True
+        )
+        return indicator_series(
+            exchange.name, strategy.symbol, strategy.timeframe, timeframe_to_ms(strategy.timeframe),
+            coverage_token(exchange.name, strategy.symbol, strategy.timeframe),
+            indicators, timestamp_start, timestamp_end, load_candles
+        )
     
     def compute_indicator_data(self, user, strategy, timestamp_start, timestamp_end, indicator_id):
-        exchange = strategy.exchange
-        symbol = strategy.symbol
-        timeframe = strategy.timeframe
         indicators = json.loads(strategy.indicators)
         indicator = next((ind for ind in indicators if ind['id'] == indicator_id), None)
         if indicator is None:
@@ -712,491 +685,49 @@ class IndicatorView(APIView):
         short_name = indicator.get('short_name')
         if not short_name:
             raise LookupError("Indicator missing 'short_name' field")
-        
-        match short_name:
-            case 'RSI':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 14},
-                        {"key": "upper_limit", "value": 70},
-                        {"key": "middle_limit", "value": 50},
-                        {"key": "lower_limit", "value": 30},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-                candles_df['rsi'] = ta.RSI(candles_df['close'].astype(float).values, timeperiod=length)
-            case 'SMA':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 9},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=length
-                )
-                candles_df['sma'] = ta.SMA(candles_df['close'].astype(float).values, timeperiod=length)
-            case 'EMA':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 9},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-                candles_df['ema'] = ta.EMA(candles_df['close'].astype(float).values, timeperiod=length)
-            case 'BBANDS':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 20},
-                        {"key": "multiplier", "value": 2},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-                multiplier = float(next(p for p in indicator['params'] if p['key'] == 'multiplier')['value'])
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=length
-                )
-                candles_df['upperband'], candles_df['middleband'], candles_df['lowerband'] = ta.BBANDS(
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length,
-                    nbdevup=multiplier,
-                    nbdevdn=multiplier,
-                    matype=0
-                )
-            case 'MACD':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "fast_period", "value": 12},
-                        {"key": "slow_period", "value": 26},
-                        {"key": "signal_period", "value": 9},
-                    ]
-                fast_period = int(next(p for p in indicator['params'] if p['key'] == 'fast_period')['value'])
-                slow_period = int(next(p for p in indicator['params'] if p['key'] == 'slow_period')['value'])
-                signal_period = int(next(p for p in indicator['params'] if p['key'] == 'signal_period')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * max(fast_period, slow_period, signal_period)
-                )
-
-                candles_df['macd'], candles_df['macdsignal'], candles_df['macdhist'] = ta.MACD(
-                    candles_df['close'].astype(float).values,
-                    fastperiod=fast_period,
-                    slowperiod=slow_period,
-                    signalperiod=signal_period
-                )
-            case 'AROON':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 14},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-
-                candles_df['aroondown'], candles_df['aroonup'] = ta.AROON(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'ADX':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 14},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-
-                candles_df['adx'] = ta.ADX(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'CCI':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 20},
-                        {"key": "upper_limit", "value": 100},
-                        {"key": "lower_limit", "value": -100},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-
-                candles_df['cci'] = ta.CCI(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'MFI':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 14},
-                        {"key": "upper_limit", "value": 80},
-                        {"key": "lower_limit", "value": 20},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-
-                candles_df['mfi'] = ta.MFI(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    candles_df['volume'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'MOM':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 10},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=length
-                )
-
-                candles_df['momentum'] = ta.MOM(
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'ROC':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 9},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=length
-                )
-
-                candles_df['roc'] = ta.ROC(
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'STOCH':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "k_length", "value": 14},
-                        {"key": "k_smoothing", "value": 1},
-                        {"key": "d_smoothing", "value": 3},
-                        {"key": "upper_limit", "value": 80},
-                        {"key": "lower_limit", "value": 20},
-                    ]
-                k_length = int(next(p for p in indicator['params'] if p['key'] == 'k_length')['value'])
-                k_smoothing = int(next(p for p in indicator['params'] if p['key'] == 'k_smoothing')['value'])
-                d_smoothing = int(next(p for p in indicator['params'] if p['key'] == 'd_smoothing')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * max(k_length, k_smoothing, d_smoothing)
-                )
-
-                candles_df['slowk'], candles_df['slowd'] = ta.STOCH(
-                    high=candles_df['high'].astype(float).values,
-                    low=candles_df['low'].astype(float).values,
-                    close=candles_df['close'].astype(float).values,
-                    fastk_period=k_length,
-                    slowk_period=k_smoothing,
-                    slowk_matype=0,
-                    slowd_period=d_smoothing,
-                    slowd_matype=0
-                )
-            case 'STOCHRSI':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "rsi_length", "value": 14},
-                        {"key": "k_smoothing", "value": 3},
-                        {"key": "d_smoothing", "value": 3},
-                        {"key": "upper_limit", "value": 80},
-                        {"key": "lower_limit", "value": 20},
-                    ]
-                rsi_length = int(next(p for p in indicator['params'] if p['key'] == 'rsi_length')['value'])
-                k_smoothing = int(next(p for p in indicator['params'] if p['key'] == 'k_smoothing')['value'])
-                d_smoothing = int(next(p for p in indicator['params'] if p['key'] == 'd_smoothing')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * max(rsi_length, k_smoothing, d_smoothing)
-                )
-
-                candles_df['fastk'], candles_df['fastd'] = ta.STOCHRSI(
-                    candles_df['close'].astype(float).values,
-                    timeperiod=rsi_length,
-                    fastk_period=k_smoothing,
-                    fastd_period=d_smoothing,
-                    fastd_matype=0
-                )
-            case 'TRIX':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 18},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-
-                candles_df['trix'] = ta.TRIX(
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'ULTOSC':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length1", "value": 7},
-                        {"key": "length2", "value": 14},
-                        {"key": "length3", "value": 28},
-                    ]
-                length1 = int(next(p for p in indicator['params'] if p['key'] == 'length1')['value'])
-                length2 = int(next(p for p in indicator['params'] if p['key'] == 'length2')['value'])
-                length3 = int(next(p for p in indicator['params'] if p['key'] == 'length3')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * max(length1, length2, length3)
-                )
-
-                candles_df['ultosc'] = ta.ULTOSC(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    timeperiod1=length1,
-                    timeperiod2=length2,
-                    timeperiod3=length3
-                )
-            case 'WILLR':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 14},
-                        {"key": "upper_limit", "value": -20},
-                        {"key": "lower_limit", "value": -80},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=length
-                )
-
-                candles_df['willr'] = ta.WILLR(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'OBV':
-                if new_indicator:
-                    indicator['params'] = []
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2
-                )
-
-                candles_df['obv'] = ta.OBV(
-                    candles_df['close'].astype(float).values,
-                    candles_df['volume'].astype(float).values
-                )
-            case 'SAR':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "increment", "value": 0.02},
-                        {"key": "maximum", "value": 0.2},
-                    ]
-                increment = float(next(p for p in indicator['params'] if p['key'] == 'increment')['value'])
-                maximum = float(next(p for p in indicator['params'] if p['key'] == 'maximum')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=int(2 * max(increment, maximum))
-                )
-
-                candles_df['sar'] = ta.SAR(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    acceleration=increment,
-                    maximum=maximum
-                )
-            case 'ATR':
-                if new_indicator:
-                    indicator['params'] = [
-                        {"key": "length", "value": 14},
-                    ]
-                length = int(next(p for p in indicator['params'] if p['key'] == 'length')['value'])
-
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2 * length
-                )
-
-                candles_df['atr'] = ta.ATR(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    timeperiod=length
-                )
-            case 'AD':
-                if new_indicator:
-                    indicator['params'] = []
-                candles_df = CandleView().get_candles(
-                    exchange=Exchange(exchange, user),
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    timestamp_start=timestamp_start,
-                    timestamp_end=timestamp_end,
-                    db_search=True,
-                    extra_candles=2
-                )
-                candles_df['ad'] = ta.AD(
-                    candles_df['high'].astype(float).values,
-                    candles_df['low'].astype(float).values,
-                    candles_df['close'].astype(float).values,
-                    candles_df['volume'].astype(float).values
-                )
-
-            case _:
-                raise NotImplementedError("Indicator type not implemented")
+        spec = indicator_spec(short_name)
+        if new_indicator:
+            indicator['params'] = spec.default_params()
+        [(timestamps, outputs)] = self.load_indicator_series(user, strategy, timestamp_start, timestamp_end, [(short_name, spec, indicator['params'])])
         
         if new_indicator:
             strategy.indicators = json.dumps([{k: v for k, v in (ind.items()) if k != 'data'} if ind['id'] == indicator_id else ind for ind in indicators])
             strategy.save()
         
-        cols_map = {
-            'timestamp': ('time', int),
-            **{col: (col, None) for col in candles_df.columns if col not in {'timestamp', 'open', 'high', 'low', 'close', 'volume'}}
-        }
-        
-        indicator['data'] = [
-            {out_key: (func(row[col]) if func else row[col]) for col, (out_key, func) in cols_map.items()}
-            for _, row in candles_df.iterrows()
-            if timestamp_start <= row['timestamp'] <= timestamp_end
-            and not any(pd.isna(row[col_name]) for col_name in cols_map.keys())
-        ]
+        indicator['data'] = indicator_records(timestamps, outputs, timestamp_start, timestamp_end)
         
         return indicator
 
+    def compute_indicators(self, user, strategy, timestamp_start, timestamp_end, indicator_ids=None):
+        indicators = json.loads(strategy.indicators)
+        specs = []
+        for indicator in indicators:
+            if not indicator.get('short_name'):
+                raise LookupError("Indicator missing 'short_name' field")
+            specs.append(indicator_spec(indicator['short_name']))
+        new_indicators = [indicator for indicator in indicators if 'params' not in indicator]
+        for indicator, spec in zip(indicators, specs):
+            if 'params' not in indicator:
+                indicator['params'] = spec.default_params()
+        selected = [(indicator, spec) for indicator, spec in zip(indicators, specs) if indicator_ids is None or indicator['id'] in indicator_ids]
+        # Indicators missing from the cache share a single candle load covering the longest warm-up
+        series = self.load_indicator_series(user, strategy, timestamp_start, timestamp_end, [
+            (indicator['short_name'], spec, indicator['params']) for indicator, spec in selected
+        ])
+        if new_indicators:
+            strategy.indicators = json.dumps([{k: v for k, v in ind.items() if k != 'data'} for ind in indicators])
+            strategy.save()
+        timestamps = np.unique(np.concatenate([indicator_timestamps for indicator_timestamps, _ in series])) if series else np.empty(0, dtype=np.int64)
+        results = []
+        for (indicator, _), (indicator_timestamps, outputs) in zip(selected, series):
+            positions = np.searchsorted(timestamps, indicator_timestamps)
+            data = {}
+            for key, values in outputs.items():
+                data[key] = np.full(len(timestamps), np.nan)
+                data[key][positions] = values
+            results.append({**{k: v for k, v in indicator.items() if k != 'data'}, 'data': data})
+        return timestamps, results
+
     def get(self, request):
         try:
             strategy_id = request.query_params.get('strategy_id')
@@ -1205,10 +736,14 @@ class IndicatorView(APIView):
             timestamp_end = int(request.query_params.get('timestamp_end'))
             if not all([strategy_id, indicator_id, timestamp_start, timestamp_end]):
                 return Response({'error': 'Missing required parameters. Please provide: strategy_id, indicator_id, timestamp_start, timestamp_end'}, status=status.HTTP_400_BAD_REQUEST)
+            etag = indicator_etag(strategy_id, indicator_id, timestamp_start, timestamp_end, request.accepted_renderer.format)
+            if etag_matches(request, etag):
+                return set_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
             try:
                 strategy = Strategy.objects.get(id=strategy_id)
             except Strategy.DoesNotExist:
                 return Response({'error': 'Strategy not found'}, status=status.HTTP_404_NOT_FOUND)
+            remember_strategy(strategy)
             data = self.compute_indicator_data(
                 user=request.user,
                 strategy=strategy,
@@ -1216,7 +751,8 @@ class IndicatorView(APIView):
                 timestamp_end=timestamp_end,
                 indicator_id=indicator_id
             )
-            return Response(data, status=status.HTTP_200_OK)
+            etag = indicator_etag(strategy_id, indicator_id, timestamp_start, timestamp_end, request.accepted_renderer.format)
+            return set_cache_headers(Response(data, status=status.HTTP_200_OK), etag)
         except LookupError as e:
             return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
         except NotImplementedError as e:
@@ -1224,6 +760,40 @@ class IndicatorView(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+class StrategyIndicatorsView(APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer, MsgPackRenderer]
+
+    def get(self, request, pk):
+        try:
+            timestamp_start = int(request.query_params.get('timestamp_start'))
+            timestamp_end = int(request.query_params.get('timestamp_end'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Missing required parameters. Please provide: timestamp_start, timestamp_end'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            etag = indicator_etag(pk, '*', timestamp_start, timestamp_end, request.accepted_renderer.format)
+            if etag_matches(request, etag):
+                return set_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+            strategy = Strategy.objects.filter(Q(id=pk), Q(is_public=True) | Q(user=request.user)).first()
+            if strategy is None:
+                return Response({'error': 'Strategy not found'}, status=status.HTTP_404_NOT_FOUND)
+            remember_strategy(strategy)
+            timestamps, results = IndicatorView().compute_indicators(
+                user=request.user,
+                strategy=strategy,
+                timestamp_start=timestamp_start,
+                timestamp_end=timestamp_end
+            )
+            for result in results:
+                # NaN is not valid JSON, warm-up gaps are sent as null
+                result['data'] = {key: np.where(np.isnan(values), None, values).tolist() for key, values in result['data'].items()}
+            etag = indicator_etag(pk, '*', timestamp_start, timestamp_end, request.accepted_renderer.format)
+            return set_cache_headers(Response({'time': timestamps.tolist(), 'indicators': results}, status=status.HTTP_200_OK), etag)
+        except LookupError as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
 class StrategyExecutionView(viewsets.ModelViewSet):
     queryset = StrategyExecution.objects.all()
     serializer_class = StrategyExecutionSerializer
@@ -1259,10 +829,15 @@ class StrategyExecutionView(viewsets.ModelViewSet):
         return Response(data)
 
     def execute_strategy(self, execution_id, request):
+        with Cancellation(execution_id) as cancelled:
+            self.run_strategy(execution_id, request, cancelled)
+
+    def run_strategy(self, execution_id, request, cancelled):
         try:
             connection.close()
             execution = StrategyExecution.objects.get(id=execution_id)
-            exchange = Exchange(execution.exchange, request.user)
+            # The execution thread places private calls for as long as it runs, so it owns its instance
+            exchange = clone_exchange(Exchange(execution.exchange, request.user))
             real_trading = execution.type == 'real'
                 
             trades_df = pd.DataFrame(columns=['strategy_execution', 'type', 'side', 'timestamp', 'price', 'amount', 'cost', 'avg_entry_price', 'abs_profit', 'rel_profit', 'abs_cum_profit', 'rel_cum_profit', 'abs_hodling_profit', 'rel_hodling_profit', 'abs_runup', 'rel_runup', 'abs_drawdown', 'rel_drawdown'])
@@ -1374,7 +949,7 @@ class StrategyExecutionView(viewsets.ModelViewSet):
                             if len(orderbook['asks']) > 0:
                                 price = orderbook['asks'][0][0]
                         except: pass
-                    params = {'reduceOnly': False if c.at[i, 'position_amount'] * order_amount >= 0 else True, **({'timeInForce': 'PO'} if type == 'limit' and exchange.has.get('createPostOnlyOrder') else {'timeInForce': 'GTC'} if type == 'limit' else {})}
+                    params = {'reduceOnly': False if c.at[i, 'position_amount'] * order_amount >= 0 else True, **({'timeInForce': 'PO'} if type == 'limit' and exchange_catalog.capabilities(exchange.name).get('post_only') else {'timeInForce': 'GTC'} if type == 'limit' else {})}
                     order = exchange.create_order(symbol=symbol, type=type, side=side, amount=amount, price=price, params=params)
                     order_id = order['id']
                     order_amount = order['amount'] if side == 'buy' else -1 * order['amount']
@@ -1406,98 +981,101 @@ class StrategyExecutionView(viewsets.ModelViewSet):
                 timestamp_end=execution.timestamp_start if real_trading else execution.timestamp_end,
                 db_search=True
             )
+            c[['open', 'high', 'low', 'close', 'volume']] = c[['open', 'high', 'low', 'close', 'volume']].map(lambda x: Decimal(str(x)))
             indicators = json.loads(execution.indicators)
             
-            def calculate_indicators(timestamp_start, timestamp_end):
+            def calculate_indicators(timestamp_start, timestamp_end, pending=None):
                 nonlocal c
+                pending = indicators if pending is None else pending
                 c = c.set_index('timestamp')
                 for indicator in indicators:
                     short_name = indicator.get('short_name')
                     params = indicator.get('params', [])
                     param_str = '_'.join(str(p['value']) for p in params)
                     indicator['col_name'] = f"{short_name}_{param_str}" if param_str else short_name
-                    col_name = indicator['col_name']
-                    if col_name not in c.columns:
-                        c[col_name] = float('nan')
-                    if len(c) < 2: continue
-                    indicator_response = IndicatorView().compute_indicator_data(
+                    if indicator['col_name'] not in c.columns:
+                        c[indicator['col_name']] = float('nan')
+                if len(c) >= 2 and pending:
+                    timestamps, results = IndicatorView().compute_indicators(
                         user=request.user,
                         strategy=execution.strategy,
                         timestamp_start=int(timestamp_start),
                         timestamp_end=int(timestamp_end),
-                        indicator_id=indicator.get('id')
+                        indicator_ids={indicator.get('id') for indicator in pending}
                     )
-                    indicator_df = pd.DataFrame(indicator_response.get('data', [])).rename(columns={'time': 'timestamp'}).set_index('timestamp')
-                    if indicator_df.empty:
-                        continue
-                    if len(indicator_df.columns) == 1:
-                        indicator_values = indicator_df.rename(columns={indicator_df.columns[0]: indicator.get('col_name')})
-                    else:
-                        indicator_values = indicator_df.add_prefix(indicator.get('col_name') + "_")
-                    common_index = indicator_values.index.intersection(c.index)
-                    for col in indicator_values.columns:
-                        if col not in c.columns:
-                            c[col] = float('nan')
-                        c.loc[common_index, col] = indicator_values.loc[common_index, col]
+                    results = {result['id']: result for result in results}
+                    for indicator in pending:
+                        if indicator.get('id') not in results:
+                            raise LookupError("Indicator not found")
+                        outputs = results[indicator.get('id')]['data']
+                        valid = np.logical_and.reduce([~np.isnan(values) for values in outputs.values()])
+                        valid_timestamps = timestamps[valid]
+                        common_index = c.index.intersection(valid_timestamps)
+                        positions = np.searchsorted(valid_timestamps, common_index)
+                        for key, values in outputs.items():
+                            col = indicator['col_name'] if len(outputs) == 1 else f"{indicator['col_name']}_{key}"
+                            if col not in c.columns:
+                                c[col] = float('nan')
+                            c.loc[common_index, col] = values[valid][positions]
                 c = c.reset_index()
             
+            indicator_streams = None
+            streamed_timestamp = None
+            
+            def start_indicator_streams(timestamp_end):
+                streams = {}
+                for indicator in indicators:
+                    stream = indicator_spec(indicator['short_name']).start_stream(indicator.get('params', []))
+                    if stream is not None:
+                        streams[indicator['id']] = stream
+                if streams:
+                    # Streams replay the history once, with the same warm-up a full recomputation would load
+                    candles = CandleView().get_candle_series(
+                        exchange=exchange,
+                        symbol=symbol,
+                        timeframe=execution.timeframe,
+                        timestamp_start=int(c['timestamp'].iloc[0]),
+                        timestamp_end=timestamp_end,
+                        db_search=True,
+                        extra_candles=max(indicator_spec(indicator['short_name']).lookback(indicator.get('params', [])) for indicator in indicators if indicator['id'] in streams)
+                    )
+                    for candle in zip(candles.open.tolist(), candles.high.tolist(), candles.low.tolist(), candles.close.tolist(), candles.volume.tolist()):
+                        for stream in streams.values():
+                            stream.update(*candle)
+                return streams
+            
+            def advance_indicators():
+                # Streaming indicators take each new closed bar in constant time, the others are recomputed over the window
+                nonlocal indicator_streams, streamed_timestamp
+                timestamp_end = int(c['timestamp'].iloc[-1])
+                if indicator_streams is None:
+                    calculate_indicators(int(c['timestamp'].iloc[0]), timestamp_end)
+                    indicator_streams = start_indicator_streams(timestamp_end)
+                    streamed_timestamp = timestamp_end
+                    return
+                if timestamp_end > streamed_timestamp:
+                    row = c.index[-1]
+                    candle = [float(c.at[row, column]) for column in ['open', 'high', 'low', 'close', 'volume']]
+                    for indicator in indicators:
+                        if indicator['id'] not in indicator_streams:
+                            continue
+                        outputs = indicator_spec(indicator['short_name']).outputs
+                        values = indicator_streams[indicator['id']].update(*candle)
+                        if not np.isnan(values).any():
+                            for key, value in zip(outputs, values):
+                                c.at[row, indicator['col_name'] if len(outputs) == 1 else f"{indicator['col_name']}_{key}"] = value
+                    streamed_timestamp = timestamp_end
+                calculate_indicators(int(c['timestamp'].iloc[0]), timestamp_end, [indicator for indicator in indicators if indicator['id'] not in indicator_streams])
+            
             calculate_indicators(c.at[0, 'timestamp'] + timeframe_ms, execution.timestamp_end)
             c[['position_amount', 'position_value', 'avg_entry_price', 'remaining_tradable_value', 'unrealized_total_value', 'realized_total_value']] = None
             
             columns = c.columns.difference(['timestamp']).tolist()
-            replacements = [(col, f"c.at[i, '{col}']") for col in columns]
-            order_conditions = json.loads(execution.order_conditions)
-            conditions_str = []
-            orders_str = []
-            for order_condition in order_conditions:
-                condition_result = ""
-                curr_conditions = order_condition['conditions']
-                total_conditions = len(curr_conditions)
-                for i, condition in enumerate(curr_conditions):
-                    if condition['start_parenthesis']:
-                        condition_result += "("
-                    left_operand  = condition['left_operand']
-                    right_operand = condition['right_operand']
-                    for old, new in replacements:
-                        left_operand  = left_operand.replace(old, new)
-                        right_operand = right_operand.replace(old, new)
-                    operator = condition['operator']
-                    if operator == 'crossunder':
-                        condition_result += f"(({left_operand.replace('c.at[i, ', 'c.at[i-1, ')}) > ({right_operand.replace('c.at[i, ', 'c.at[i-1, ')}) and ({left_operand}) < ({right_operand}))"
-                    elif operator == 'crossabove':
-                        condition_result += f"(({left_operand.replace('c.at[i, ', 'c.at[i-1, ')}) < ({right_operand.replace('c.at[i, ', 'c.at[i-1, ')}) and ({left_operand}) > ({right_operand}))"
-                    else:
-                        condition_result += f"({left_operand}) {operator} ({right_operand})"
-                    if condition['end_parenthesis']:
-                        condition_result += ")"
-                    logical_operator = condition.get('logical_operator', '')
-                    if i < total_conditions - 1:
-                        if logical_operator:
-                            condition_result += f" {logical_operator.replace('xor', '^')} "
-                        else:
-                            raise ValueError("Logical operator is required between conditions")
-                if condition_result.count(':') or [w for w in re.findall(r'\b[a-zA-Z][a-zA-Z0-9_]*\b', condition_result) if w not in set(columns + ['min', 'max', 'abs', 'crossunder', 'crossabove', 'and', 'or', 'c', 'at', 'i'])]:
-                    raise ValueError("Invalid condition syntax in conditions")
-                if condition_result.count('(') != condition_result.count(')'):
-                    raise ValueError("Unmatched parentheses in conditions")
-                conditions_str.append(condition_result)
-                
-                orders_result = ""
-                for order in order_condition['orders']:
-                    orders_result += f"make_order('{order['type']}'"
-                    if order['type'] != "cancel_all_open_orders":
-                        orders_result += f", '{order['side']}', {order['amount']}"
-                        if order['type'] != "market":
-                            orders_result += f", {order['price']}"
-                    orders_result += ")\n"
-                for old, new in replacements:
-                    orders_result = orders_result.replace(old, new)
-                if ':' in orders_result or [w for w in re.findall(r'\b[a-zA-Z][a-zA-Z0-9_]*\b', orders_result) if w not in set(columns + ['min', 'max', 'abs', 'make_order', 'market', 'limit', 'buy', 'sell', 'c', 'at', 'i'])]:
-                    raise ValueError(f"Invalid condition syntax in orders")
-                orders_str.append(orders_result)
+            rules = OrderRules(json.loads(execution.order_conditions), columns, STATE_COLUMNS)
             
             if real_trading:
                 while True:
+                    if cancelled(): return
                     i = len(c) - 1
                     if i == 0:
                         c.at[i, 'position_amount'] = 0
@@ -1531,10 +1109,11 @@ class StrategyExecutionView(viewsets.ModelViewSet):
                                 trade_calculation('limit', {'id': open_order.id, 'timestamp': c.at[i, 'timestamp'], 'side': open_order.side, 'amount': open_order.amount, 'price': Decimal(open_order.price)})
                                 orders_to_drop.append(open_order.Index)
                         open_orders_df = open_orders_df.drop(orders_to_drop).reset_index(drop=True)
-                        for x, condition_result in enumerate(conditions_str):
+                        vectors = {column: c[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in columns + ['timestamp'] if column not in STATE_COLUMNS}
+                        for test, place in rules.bind(vectors, lambda column, row: c.at[row, column], len(c)):
                             try:
-                                if eval(condition_result):
-                                    exec(orders_str[x])
+                                if test(i):
+                                    place(i, make_order)
                             except Exception as e:
                                 raise ValueError("Error evaluating condition or order")
                         execution.abs_net_profit = trades_df.iloc[-1]['abs_cum_profit'] if len(trades_df) > 0 else None
@@ -1553,17 +1132,13 @@ class StrategyExecutionView(viewsets.ModelViewSet):
                         execution.rel_max_drawdown = rel_max_drawdown
                         Trade.objects.bulk_create([Trade(**row) for row in trades_df[trades_df['timestamp'] == c.at[i, 'timestamp']].to_dict(orient='records')])
                     execution.timestamp_end = int(c.at[c.index[-1], 'timestamp'])
-                    execution.save()
+                    # running is left out, so a stop saved meanwhile is not overwritten
+                    execution.save(update_fields=EXECUTION_RESULT_FIELDS)
                     last_candle_timestamp = int(c.at[c.index[-1], 'timestamp'])
                     next_candle_timestamp = int(last_candle_timestamp + timeframe_ms)
                     timestamp_wait = int(next_candle_timestamp + timeframe_ms)
                     wait_ms = timestamp_wait - int(time.time() * 1000)
-                    while wait_ms > 0:
-                        if wait_ms > 1000:
-                            time.sleep(min(wait_ms, 60000) / 1000 - 1)
-                            execution.refresh_from_db()
-                            if not execution.running: return
-                        wait_ms = timestamp_wait - int(time.time() * 1000)
+                    if wait_ms > 0 and cancelled.wait(wait_ms / 1000): return
                     new_candles = CandleView().get_candles(
                         exchange=exchange,
                         symbol=symbol,
@@ -1572,54 +1147,29 @@ class StrategyExecutionView(viewsets.ModelViewSet):
                         timestamp_end=next_candle_timestamp
                     ).reindex(columns=c.columns)
                     decimal_cols = [col for col in new_candles.columns if col != 'timestamp']
-                    new_candles[decimal_cols] = new_candles[decimal_cols].applymap(lambda x: Decimal(str(x)) if pd.notnull(x) else None)
+                    new_candles[decimal_cols] = new_candles[decimal_cols].map(lambda x: Decimal(str(x)) if pd.notnull(x) else None)
                     c = pd.concat([c, new_candles[new_candles['timestamp'] == next_candle_timestamp]], ignore_index=True)
                     if len(c) > 1000:
                         c = c.iloc[-1000:].reset_index(drop=True)
-                    calculate_indicators(int(c['timestamp'].iloc[0]), int(c['timestamp'].iloc[-1]))
+                    advance_indicators()
             else:
-                for i in c.index:
-                    execution.refresh_from_db()
-                    if not execution.running:
-                        return
-                    if i == 0:
-                        c.at[i, 'position_amount'] = 0
-                        c.at[i, 'avg_entry_price'] = 0
-                        c.at[i, 'remaining_tradable_value'] = execution.initial_tradable_value
-                    else:
-                        c.at[i, 'position_amount'] = c.at[i-1, 'position_amount']
-                        c.at[i, 'avg_entry_price'] = c.at[i-1, 'avg_entry_price']
-                        c.at[i, 'remaining_tradable_value'] = c.at[i-1, 'remaining_tradable_value']
-                    if c.at[i, 'avg_entry_price'] > 0:
-                        c.at[i, 'position_value'] = Decimal(abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] * Decimal((2 - c.at[i, 'close'] / c.at[i, 'avg_entry_price'] if c.at[i, 'position_amount'] < 0 else Decimal(c.at[i, 'close']) / c.at[i, 'avg_entry_price']) - 1 + Decimal(1 / leverage))).quantize(Decimal('1e-20'))
-                    else:
-                        c.at[i, 'position_value'] = 0
-                    if c.at[i, 'position_value'] < 0:
-                        c.at[i, 'position_value'] = 0
-                        c.at[i, 'position_amount'] = 0
-                        c.at[i, 'avg_entry_price'] = 0
-                    c.at[i, 'realized_total_value'] = abs(c.at[i, 'position_amount']) * c.at[i, 'avg_entry_price'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
-                    c.at[i, 'unrealized_total_value'] = c.at[i, 'position_value'] + c.at[i, 'remaining_tradable_value'] + open_orders_df.loc[open_orders_df['cost'] > 0, 'cost'].sum()
-                    max_ever_total_unrealized_value = max(max_ever_total_unrealized_value, c.at[i, 'unrealized_total_value'])
-                    min_ever_total_unrealized_value = min(min_ever_total_unrealized_value, c.at[i, 'unrealized_total_value'])
-                    abs_max_runup = max(abs_max_runup, c.at[i, 'unrealized_total_value'] - min_ever_total_unrealized_value)
-                    rel_max_runup = abs_max_runup / min_ever_total_unrealized_value * 100 if min_ever_total_unrealized_value != 0 else 0
-                    abs_max_drawdown = min(abs_max_drawdown, c.at[i, 'unrealized_total_value'] - max_ever_total_unrealized_value)
-                    rel_max_drawdown = abs_max_drawdown / max_ever_total_unrealized_value * 100 if max_ever_total_unrealized_value != 0 else 0
-                    if i == 0:
-                        continue
-                    orders_to_drop = []
-                    for open_order in open_orders_df.itertuples():
-                        if open_order.side == 'buy' and c.at[i, 'low'] <= open_order.price or open_order.side == 'sell' and c.at[i, 'high'] >= open_order.price:
-                            trade_calculation('limit', {'id': open_order.id, 'timestamp': c.at[i, 'timestamp'], 'side': open_order.side, 'amount': open_order.amount, 'price': Decimal(open_order.price)})
-                            orders_to_drop.append(open_order.Index)
-                    open_orders_df = open_orders_df.drop(orders_to_drop).reset_index(drop=True)
-                    for x, condition_result in enumerate(conditions_str):
-                        try:
-                            if eval(condition_result):
-                                exec(orders_str[x])
-                        except Exception as e:
-                            raise ValueError("Error evaluating condition or order")
+                backtest = Backtest(
+                    {column: c[column].to_numpy() for column in columns + ['timestamp'] if column not in STATE_COLUMNS},
+                    rules,
+                    initial_tradable_value=execution.initial_tradable_value,
+                    leverage=leverage,
+                    maker_fee=maker_fee,
+                    taker_fee=taker_fee,
+                    spot=':' not in symbol,
+                    should_stop=cancelled,
+                    numeric=settings.BACKTEST_NUMERIC_BACKEND
+                )
+                # The run only polls the cancellation, so the connection is not held across it
+                connection.close()
+                if not backtest.run():
+                    return
+                trades_df = backtest.trades_frame()
+                abs_max_runup, rel_max_runup, abs_max_drawdown, rel_max_drawdown = backtest.extremes()
                 execution.timestamp_end = c.at[c.index[-1], 'timestamp']
                 execution.abs_net_profit = trades_df.iloc[-1]['abs_cum_profit'] if len(trades_df) > 0 else None
                 execution.rel_net_profit = trades_df.iloc[-1]['rel_cum_profit'] if len(trades_df) > 0 else None
@@ -1635,12 +1185,12 @@ class StrategyExecutionView(viewsets.ModelViewSet):
                 execution.rel_max_run_up = rel_max_runup
                 execution.abs_max_drawdown = abs_max_drawdown
                 execution.rel_max_drawdown = rel_max_drawdown
-                Trade.objects.bulk_create([Trade(**row) for row in trades_df.to_dict(orient='records')])
+                Trade.objects.bulk_create([Trade(strategy_execution=execution, **row) for row in trades_df.to_dict(orient='records')])
             
             execution.running = False
             execution.save()
         except Exception as e:
-            import sys; print("ERROR: " + e, file=sys.stderr)
+            import sys; print("ERROR: " + str(e), file=sys.stderr)
             execution.running = False
             execution.save()
 
@@ -1682,7 +1232,7 @@ class StrategyExecutionView(viewsets.ModelViewSet):
             timestamp_end = last_timestamp
             timestamp_start = last_timestamp
             try:
-                exchange = Exchange(strategy.exchange, request.user)
+                exchange = clone_exchange(Exchange(strategy.exchange, request.user))
                 exchange.fetch_balance()
             except Exception:
                 return Response({"detail": "API keys are invalid or missing."}, status=status.HTTP_400_BAD_REQUEST)
@@ -1726,6 +1276,7 @@ class StrategyExecutionView(viewsets.ModelViewSet):
         instance = self.get_object()
         instance.running = False
         instance.save()
+        cancel_execution(instance.id)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -1734,6 +1285,7 @@ class StrategyExecutionView(viewsets.ModelViewSet):
         if instance.running:
             instance.running = False
             instance.save()
+            cancel_execution(instance.id)
         return super().destroy(request, *args, **kwargs)
 
 class DashboardStatsView(APIView):
@@ -1807,3 +1359,9 @@ class DashboardStatsView(APIView):
             "recent_trades": recent_trades
         }
         return Response(data)
+
+class MetricsView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response({'ingest': ingest_metrics(), 'candle_cache': candle_cache.stats()}, status=status.HTTP_200_OK)
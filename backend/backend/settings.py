@@ -137,6 +137,7 @@ CACHES = {
         "LOCATION": "redis://redis:6379/0" if DEBUG else "rediss://redis:6380/0",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
             "PASSWORD": REDIS_PASSWORD,
             "CONNECTION_POOL_KWARGS": {
                 "ssl_certfile": "/etc/ssl/certs/redis.crt",
@@ -241,6 +242,35 @@ AUTH_USER_MODEL = 'api.User'
 ACCESS_TOKEN_MAX_AGE = 3600 # 1 hour
 REFRESH_TOKEN_MAX_AGE = 604800 # 7 days
 
+EXCHANGE_POOL_TTL = 900 # 15 minutes
+MARKETS_REFRESH_INTERVAL = 3600 # 1 hour
+MARKETS_CACHE_TIMEOUT = 86400 # 1 day
+EXCHANGE_CATALOG_PATH = os.getenv('EXCHANGE_CATALOG_PATH', default=os.path.join(BASE_DIR, 'data', 'exchange_catalog.json')) # Generated at container start
+BACKFILL_MAX_WORKERS = 4
+BACKFILL_RETRIES = 3
+INGEST_HISTORY_CANDLES = 5000
+INGEST_MAX_WORKERS = 8
+INGEST_EXCHANGE_CONCURRENCY = 2 # Streams of the same exchange synced at once
+INGEST_POLL_INTERVAL = 1
+INGEST_TRACK_INTERVAL = 60 # Reload tracked streams every minute
+INGEST_CLOSE_DELAY = 2 # Seconds after a bar closes before it is fetched
+INGEST_RETRY_DELAY = 30
+CANDLE_PARTITION_INTERVAL = 3600 # Seconds between checks for upcoming monthly candle partitions
+CANDLE_PARTITION_MONTHS_AHEAD = 3
+SINGLE_FLIGHT_LOCK_TIMEOUT = 60 # Lease of the worker fetching a range, renewed while it runs and expires if it dies
+SINGLE_FLIGHT_WAIT_TIMEOUT = 45 # Longest a waiting request blocks before fetching by itself
+SINGLE_FLIGHT_RESULT_TIMEOUT = 30
+SINGLE_FLIGHT_POLL_INTERVAL = 1
+RESAMPLE_MATERIALIZE = True # Store candles built from finer timeframes instead of rebuilding them per request
+CANDLE_CACHE_MAX_BYTES = 64 * 2**20 # Per process
+CANDLE_READ_CHUNK_SIZE = 10000
+INDICATOR_CACHE_TIMEOUT = 86400 # 1 day
+INDICATOR_CACHE_MAX_REVISIONS = 1000 # Entries further behind the candle writes of their stream are recomputed
+EXECUTION_CANCEL_POLL_INTERVAL = 1 # Seconds between shared cache checks of a running execution
+EXECUTION_CANCEL_TIMEOUT = 3600 # 1 hour
+BACKTEST_NUMERIC_BACKEND = os.getenv('BACKTEST_NUMERIC_BACKEND', default='decimal') # 'float' runs backtest accounting in float64, see api/backtest.py
+CLOSED_RANGE_MAX_AGE = 31536000 # 1 year
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(seconds=ACCESS_TOKEN_MAX_AGE), 
     'REFRESH_TOKEN_LIFETIME': timedelta(seconds=REFRESH_TOKEN_MAX_AGE),